@@ -1 +1,8 @@
-# Empty init
+import os
+import sys
+
+# shared/ (code used by both the API and the legacy app) lives at the repo root; in the
+# Docker image it is copied next to the backend code instead.
+_REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if os.path.isdir(os.path.join(_REPO_ROOT, "shared")) and _REPO_ROOT not in sys.path:
+    sys.path.append(_REPO_ROOT)
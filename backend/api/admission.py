@@ -0,0 +1,211 @@
+"""
+Admission control: separate weighted concurrency pools for interactive, heavy and upload work.
+
+Interactive requests (dashboard, charts, filters) take one unit each in the interactive
+pool, admitted by AdmissionMiddleware. Heavy routes (PDFs, exports, item details, RFM)
+and uploads admit themselves with `async with admit(pool, cost)`. Cost is estimated
+from the tenant's cached rows inside the requested date window times a factor per
+report type. A request that cannot get its units within the pool's wait budget, or
+finds the queue full, gets 429 with a Retry-After estimated from recent hold times.
+Cheap calls therefore never queue behind a burst of PDF renders.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from . import metrics
+
+# Units of heavy work per this many rows in the requested window
+ROWS_PER_UNIT = int(os.environ.get("ADMISSION_ROWS_PER_UNIT", "200000"))
+
+# Relative cost per report type (multiplied by row units)
+COST_FACTORS = {
+    "pdf": 2.0,
+    "dynamic_pdf": 2.0,
+    "export_csv": 1.0,
+    "export_parquet": 1.0,
+    "export_xlsx": 3.0,
+    "item_details": 1.0,
+    "rfm": 1.0,
+}
+
+# Paths that admit themselves into the heavy/upload pools, or only queue an upload job
+# (bounded by the job queue, see jobs.py); the middleware skips them
+SELF_ADMITTED_PATHS = {
+    "/api/reports/download",
+    "/api/reports/dynamic",
+    "/api/export/data",
+    "/api/reports/item-details",
+    "/api/customers/rfm",
+    "/api/upload",
+    "/api/v1/upload_batch",
+}
+# Chunked upload: parts are plain disk writes, completion queues an upload job
+SELF_ADMITTED_PREFIXES = ("/api/upload/chunked/",)
+# Long-lived streams never hold an interactive slot
+EXEMPT_PATHS = {"/api/events"}
+
+ADMISSION_REJECTED = metrics.counter("admission_rejected_total", "Requests answered 429 by admission control.", ("pool",))
+ADMISSION_WAIT = metrics.histogram("admission_wait_seconds", "Time requests waited for admission.", ("pool",))
+
+
+class WeightedPool:
+    """FIFO weighted semaphore with a wait budget and a bounded queue."""
+
+    def __init__(self, name: str, capacity: int, max_wait: float, max_queue: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.in_use = 0
+        self._waiters: deque = deque()
+        self._avg_hold = 1.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, fut in self._waiters if not fut.done())
+
+    def retry_after(self) -> int:
+        """Seconds until enough capacity is likely free: average hold time x queued work / capacity."""
+        ahead = self.in_use + sum(cost for cost, fut in self._waiters if not fut.done())
+        return max(1, math.ceil(self._avg_hold * ahead / self.capacity))
+
+    def _reject(self):
+        ADMISSION_REJECTED.inc(pool=self.name)
+        return HTTPException(
+            status_code=429,
+            detail=f"Server is busy ({self.name} work). Please retry shortly.",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    def _wake(self) -> None:
+        while self._waiters:
+            cost, fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + cost > self.capacity:
+                return
+            self._waiters.popleft()
+            self.in_use += cost
+            fut.set_result(True)
+
+    async def acquire(self, cost: int) -> int:
+        cost = min(max(1, int(cost)), self.capacity)
+        if not self._waiters and self.in_use + cost <= self.capacity:
+            self.in_use += cost
+            ADMISSION_WAIT.observe(0.0, pool=self.name)
+            return cost
+        if self.queued >= self.max_queue:
+            raise self._reject()
+        start = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, fut))
+        try:
+            await asyncio.wait_for(fut, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._wake()
+            raise self._reject()
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                # Granted just as we were cancelled: hand the units back
+                self.release(cost, 0.0)
+            raise
+        finally:
+            ADMISSION_WAIT.observe(time.perf_counter() - start, pool=self.name)
+        return cost
+
+    def release(self, cost: int, held: float) -> None:
+        self.in_use = max(0, self.in_use - cost)
+        if held > 0:
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+        self._wake()
+
+
+POOLS = {
+    "interactive": WeightedPool(
+        "interactive",
+        capacity=int(os.environ.get("ADMISSION_INTERACTIVE_SLOTS", "32")),
+        max_wait=float(os.environ.get("ADMISSION_INTERACTIVE_WAIT", "10")),
+        max_queue=int(os.environ.get("ADMISSION_INTERACTIVE_QUEUE", "200")),
+    ),
+    "heavy": WeightedPool(
+        "heavy",
+        capacity=int(os.environ.get("ADMISSION_HEAVY_UNITS", "8")),
+        max_wait=float(os.environ.get("ADMISSION_HEAVY_WAIT", "5")),
+        max_queue=int(os.environ.get("ADMISSION_HEAVY_QUEUE", "16")),
+    ),
+    "upload": WeightedPool(
+        "upload",
+        capacity=int(os.environ.get("ADMISSION_UPLOAD_SLOTS", "2")),
+        max_wait=float(os.environ.get("ADMISSION_UPLOAD_WAIT", "5")),
+        max_queue=int(os.environ.get("ADMISSION_UPLOAD_QUEUE", "8")),
+    ),
+}
+
+metrics.callback("admission_in_flight_units", "Units currently admitted per pool.", lambda: {k: p.in_use for k, p in POOLS.items()}, labels=("pool",))
+metrics.callback("admission_queue_depth", "Requests waiting for admission per pool.", lambda: {k: p.queued for k, p in POOLS.items()}, labels=("pool",))
+metrics.callback("admission_capacity_units", "Configured capacity per pool.", lambda: {k: p.capacity for k, p in POOLS.items()}, labels=("pool",))
+
+
+def estimate_rows(tenant_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[int]:
+    """Rows of the cached tenant frame inside the date window (None if the tenant is not cached yet)."""
+    from .db import tenant_cache
+
+    df = tenant_cache.get((tenant_id,))
+    if df is None:
+        return None
+    if not (start_date and end_date) or "DATE" not in df.columns:
+        return len(df)
+    try:
+        from .comparison import parse_bounds, window_slice
+
+        return len(window_slice(df, *parse_bounds(start_date, end_date)))
+    except Exception:
+        return len(df)
+
+
+def estimate_cost(kind: str, tenant_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> int:
+    """Heavy-pool units for a request: row units in the date window x the report type's factor."""
+    rows = estimate_rows(tenant_id, start_date, end_date)
+    units = 1.0 if rows is None else max(1.0, rows / ROWS_PER_UNIT)
+    return max(1, math.ceil(units * COST_FACTORS.get(kind, 1.0)))
+
+
+@asynccontextmanager
+async def admit(pool: str, cost: int = 1):
+    """Hold `cost` units of `pool` for the block; raises 429 (with Retry-After) when saturated."""
+    p = POOLS[pool]
+    units = await p.acquire(cost)
+    start = time.perf_counter()
+    try:
+        yield units
+    finally:
+        p.release(units, time.perf_counter() - start)
+
+
+class AdmissionMiddleware:
+    """Pure ASGI: one interactive-pool unit per /api request, except routes that admit themselves."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or scope.get("method") == "OPTIONS" or not path.startswith("/api/") or path in SELF_ADMITTED_PATHS or path in EXEMPT_PATHS or path.startswith(SELF_ADMITTED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        try:
+            async with admit("interactive"):
+                await self.app(scope, receive, send)
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=429, headers=e.headers)(scope, receive, send)
@@ -0,0 +1,207 @@
+"""
+Statistical anomaly detection over monthly revenue series.
+
+Every customer, state and material group gets a monthly series from one pivot: a single
+bincount over (entity, month) keys for all dimensions at once. Each of the latest months
+is scored against the rolling median of the preceding months with a robust z-score
+((value - median) / (1.4826 * MAD)). All of this is array math over an (entities x
+window) view. Results are ranked by |z| across dimensions.
+
+Scoring runs in a background thread after each upload (and on first use), keyed on the
+cached tenant frame, so the alerts endpoint only slices a precomputed list. Any reload
+of the frame (upload, cache expiry, legacy ETL writes picked up from the DB) yields a
+new frame object and so a recomputation.
+"""
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+DIMENSIONS = {"customer": "CUSTOMER_NAME", "state": "STATE", "material_group": None}
+# Months of history forming each baseline, and how many recent months are scored
+WINDOW_MONTHS = int(os.environ.get("ANOMALY_WINDOW_MONTHS", "6"))
+EVAL_MONTHS = int(os.environ.get("ANOMALY_EVAL_MONTHS", "3"))
+# |z| above this is reported (3.5 is the usual cut-off for modified z-scores)
+MIN_Z = 3.5
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+def _dimension_columns(df: pd.DataFrame) -> Dict[str, str]:
+    from .routes import _material_group_column
+
+    cols = {}
+    for dim, col in DIMENSIONS.items():
+        col = col or _material_group_column(df)
+        if col and col in df.columns:
+            cols[dim] = col
+    return cols
+
+
+def monthly_pivot(df: pd.DataFrame, dims: Dict[str, str]):
+    """
+    (values, entities, months): values is an (entities x months) revenue matrix for all
+    dimensions stacked; entities is a list of (dimension, value); months are datetime64[M].
+    """
+    dates = pd.to_datetime(df["DATE"], errors="coerce").to_numpy(dtype="datetime64[M]")
+    valid = ~np.isnat(dates)
+    if not valid.any():
+        return np.zeros((0, 0)), [], np.array([], dtype="datetime64[M]")
+    first = dates[valid].min()
+    month_idx = (dates - first).astype("int64")
+    n_months = int(month_idx[valid].max()) + 1
+    amounts = np.nan_to_num(pd.to_numeric(df["AMOUNT"], errors="coerce").to_numpy(dtype="float64"))
+
+    keys, weights, entities = [], [], []
+    offset = 0
+    for dim, col in dims.items():
+        codes, uniques = pd.factorize(df[col])
+        ok = valid & (codes >= 0)
+        keys.append(offset + codes[ok].astype("int64") * n_months + month_idx[ok])
+        weights.append(amounts[ok])
+        entities.extend((dim, u) for u in uniques)
+        offset += len(uniques) * n_months
+    flat = np.bincount(np.concatenate(keys), weights=np.concatenate(weights), minlength=offset)
+    months = first + np.arange(n_months).astype("timedelta64[M]")
+    return flat.reshape(len(entities), n_months), entities, months
+
+
+def score_months(values: np.ndarray, window: int = WINDOW_MONTHS, eval_months: int = EVAL_MONTHS):
+    """
+    Robust z-scores for the last `eval_months` columns, each against the `window` columns
+    before it. Returns (z, median, target) arrays of shape (entities, eval_months) or None.
+    """
+    n_entities, n_months = values.shape
+    eval_months = min(eval_months, n_months - window)
+    if n_entities == 0 or eval_months <= 0:
+        return None
+    # windows[:, i] covers the `window` months before target column n_months - eval_months + i
+    windows = sliding_window_view(values[:, :-1], window, axis=1)[:, -eval_months:, :]
+    target = values[:, -eval_months:]
+    median = np.median(windows, axis=-1)
+    dev = np.abs(windows - median[..., None])
+    scale = MAD_SCALE * np.median(dev, axis=-1)
+    # MAD is 0 when most baseline months are equal (often all zero); fall back to mean deviation
+    fallback = MEAN_AD_SCALE * dev.mean(axis=-1)
+    scale = np.where(scale > 0, scale, fallback)
+    active = (windows > 0).sum(axis=-1) >= max(1, window // 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where((scale > 0) & active, (target - median) / scale, np.nan)
+    return z, median, target
+
+
+def _complete_months(df: pd.DataFrame, months: np.ndarray, values: np.ndarray):
+    """Drop the last month when the data ends part-way through it (it would always look like a drop)."""
+    last_date = pd.to_datetime(df["DATE"], errors="coerce").max()
+    if len(months) and not pd.isna(last_date) and not last_date.is_month_end:
+        return months[:-1], values[:, :-1]
+    return months, values
+
+
+def detect(df: pd.DataFrame, min_z: float = MIN_Z) -> List[dict]:
+    """Ranked anomalies (highest |z| first) across all dimensions for the latest months."""
+    if df is None or df.empty or "DATE" not in df.columns or "AMOUNT" not in df.columns:
+        return []
+    dims = _dimension_columns(df)
+    if not dims:
+        return []
+    values, entities, months = monthly_pivot(df, dims)
+    months, values = _complete_months(df, months, values)
+    scored = score_months(values)
+    if scored is None:
+        return []
+    z, median, target = scored
+    eval_months = months[-z.shape[1]:]
+
+    rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) >= min_z)
+    order = np.argsort(-np.abs(z[rows, cols]), kind="stable")
+    out = []
+    for r, c in zip(rows[order], cols[order]):
+        dim, entity = entities[r]
+        base = float(median[r, c])
+        value = float(target[r, c])
+        out.append({
+            "dimension": dim,
+            "entity": entity,
+            "month": str(eval_months[c]),
+            "value": value,
+            "baseline": base,
+            "z_score": round(float(z[r, c]), 2),
+            "direction": "spike" if value > base else "drop",
+            "change_pct": round((value - base) / base * 100, 1) if base > 0 else None,
+        })
+    return out
+
+
+# tenant_id -> (weakref to the cached frame it was scored from, {"computed_at", "anomalies"})
+_results: Dict[str, tuple] = {}
+_refreshing: set = set()
+_lock = threading.Lock()
+
+
+def _frame(tenant_id: str) -> pd.DataFrame:
+    from .db import get_cached_tenant_df
+
+    return get_cached_tenant_df(tenant_id)
+
+
+def refresh(tenant_id: str) -> Optional[dict]:
+    """Recompute a tenant's anomalies from its cached frame and store them against that frame."""
+    try:
+        df = _frame(tenant_id)
+        anomalies = detect(df)
+    except Exception as e:
+        logging.error("anomaly refresh failed for %s: %s", tenant_id, e)
+        return None
+    result = {"computed_at": time.time(), "anomalies": anomalies}
+    with _lock:
+        _results[tenant_id] = (weakref.ref(df), result)
+    return result
+
+
+def _is_current(tenant_id: str) -> bool:
+    entry = _results.get(tenant_id)
+    try:
+        return entry is not None and entry[0]() is _frame(tenant_id)
+    except Exception:
+        return True
+
+
+def schedule_refresh(tenant_id: str) -> None:
+    """Refresh in a daemon thread (called after uploads); at most one refresh per tenant at a time."""
+    with _lock:
+        if tenant_id in _refreshing:
+            return
+        _refreshing.add(tenant_id)
+
+    def run():
+        try:
+            # Re-run if the frame was replaced (another upload) while we were scoring
+            while True:
+                if refresh(tenant_id) is None or _is_current(tenant_id):
+                    break
+        finally:
+            with _lock:
+                _refreshing.discard(tenant_id)
+
+    threading.Thread(target=run, name=f"anomalies-{tenant_id}", daemon=True).start()
+
+
+def get_anomalies(tenant_id: str) -> Optional[dict]:
+    """
+    Precomputed result for the tenant. A result scored from an earlier frame is returned
+    (flagged stale) while a refresh runs; only the very first request computes inline.
+    """
+    entry = _results.get(tenant_id)
+    if entry is None:
+        return refresh(tenant_id)
+    if not _is_current(tenant_id):
+        schedule_refresh(tenant_id)
+        return {**entry[1], "stale": True}
+    return entry[1]
@@ -1,11 +1,41 @@
-import pandas as pd
+"""
+Rule-based chat over a tenant's sales frame.
+
+One SalesQueryEngine (entity index over states, customers and products) is kept per
+tenant, built from the cached tenant frame without copying it, so a chat message no
+longer rebuilds the index. The engine is tied to that frame object: whenever the tenant
+cache holds a different one (upload, TTL reload from the DB, warm restore) the next
+message builds a fresh engine. The engine only holds the frame weakly, so a frame the
+cache dropped is not kept alive by chat. Answers are cached per (engine generation, date
+range, normalized question) in an LRU, so repeated questions skip the frame entirely.
+"""
+import itertools
+import os
 import re
+import threading
+import weakref
+
+import pandas as pd
+from cachetools import LRUCache
+
+# Tenants whose engine is kept (matches the tenant frame cache) and answers remembered
+CHAT_ENGINE_TENANTS = int(os.environ.get("CHAT_ENGINE_TENANTS", "10"))
+CHAT_ANSWER_CACHE_SIZE = int(os.environ.get("CHAT_ANSWER_CACHE_SIZE", "2048"))
+
+_generations = itertools.count(1)
+
 
 class SalesQueryEngine:
     def __init__(self, df):
-        self.df = df
+        self._frame = weakref.ref(df)
+        self.generation = next(_generations)
         self.index = {}
         self.prepare_indices()
+
+    @property
+    def df(self):
+        """The frame the index was built from (None once nothing else references it)."""
+        return self._frame()
     
     def prepare_indices(self):
         """Builds a reverse index for fast entity lookup."""
@@ -56,9 +86,10 @@ class SalesQueryEngine:
             
         return filters
 
-    def process_query(self, query):
+    def process_query(self, query, df=None):
+        """Answer over `df` (default: the whole frame; e.g. a date-filtered slice of it). Filters never modify it."""
         query = query.lower().strip()
-        df_filtered = self.df.copy()
+        df_filtered = self.df if df is None else df
         
         # 1. Apply Filters
         detected_filters = self.extract_filters(query)
@@ -97,7 +128,7 @@ class SalesQueryEngine:
             # Grouping inference
             group_col = "CUSTOMER_NAME"
             if "customer" in query: group_col = "CUSTOMER_NAME"
-            elif "product" in query or "item" in query: group_col = "MATERIALGROUP" if "MATERIALGROUP" in self.df.columns else "ITEMNAME"
+            elif "product" in query or "item" in query: group_col = "MATERIALGROUP" if "MATERIALGROUP" in df_filtered.columns else "ITEMNAME"
             elif "state" in query or "region" in query: group_col = "STATE"
             
             # Aggregation
@@ -129,13 +160,65 @@ class SalesQueryEngine:
         
         return response
 
-# Singleton
-engine = None
-def process_query(query, df):
-    global engine
-    if engine is None or engine.df is not df:
+_engines: LRUCache = LRUCache(maxsize=CHAT_ENGINE_TENANTS)  # tenant -> engine
+_answers: LRUCache = LRUCache(maxsize=CHAT_ANSWER_CACHE_SIZE)
+_lock = threading.Lock()
+# Serializes engine builds, so concurrent first messages build a tenant's index once
+_build_lock = threading.Lock()
+
+
+def _tenant_frame(tenant_id):
+    from .db import get_cached_tenant_df
+
+    try:
+        df = get_cached_tenant_df(tenant_id)
+    except Exception:
+        df = None
+    return df if isinstance(df, pd.DataFrame) else pd.DataFrame()
+
+
+def get_engine(tenant_id, df):
+    """Engine over `df`, the tenant's current cached frame (rebuilt when the cache holds another frame)."""
+    with _lock:
+        engine = _engines.get(tenant_id)
+    if engine is not None and engine.df is df:
+        return engine
+    with _build_lock:
+        with _lock:
+            engine = _engines.get(tenant_id)
+        if engine is not None and engine.df is df:
+            return engine
         engine = SalesQueryEngine(df)
+        with _lock:
+            _engines[tenant_id] = engine
+    return engine
+
+
+def answer(query, tenant_id, start_date=None, end_date=None):
+    """Chat reply for a tenant's question within an optional date range (cached until its frame changes)."""
+    from . import warmup
+    from .db import filter_by_date
+
+    warmup.record_access(tenant_id)
+    df = _tenant_frame(tenant_id)
+    engine = get_engine(tenant_id, df)
+    key = (tenant_id, engine.generation, start_date, end_date, " ".join(query.lower().split()))
+    with _lock:
+        cached = _answers.get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = engine.process_query(query, filter_by_date(df, start_date, end_date))
+    except Exception as e:
+        return f"🤖 Error: {str(e)}"
+    with _lock:
+        _answers[key] = response
+    return response
+
+
+def process_query(query, df):
+    """Answer over an arbitrary frame (builds a throwaway engine; tenants go through answer())."""
     try:
-        return engine.process_query(query)
+        return SalesQueryEngine(df).process_query(query)
     except Exception as e:
         return f"🤖 Error: {str(e)}"
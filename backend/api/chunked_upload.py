@@ -0,0 +1,202 @@
+"""
+Chunked, resumable uploads spooled to local disk.
+
+Protocol (routes in routes.py, all under /api/upload/chunked):
+  POST   /init                    {filename, size, tenant_id, chunk_size?} -> upload_id, chunk_size, total_parts
+  PUT    /{upload_id}/parts/{n}   raw bytes of part n (0-based), optional X-Part-SHA256
+  GET    /{upload_id}             received / missing parts (resume after a dropped connection)
+  POST   /{upload_id}/complete    parse the spooled file and ingest it like /upload
+  DELETE /{upload_id}             abort
+
+Each part is streamed straight to its offset in one preallocated data file, so the request
+body is never held in memory and completing needs no concatenation: the parser reads the
+data file from disk. Part state is kept in a small meta.json next to it, so an upload can
+be resumed (re-send the missing parts) even after an API restart if the spool dir persists.
+Parts are idempotent: re-sending a part overwrites it.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Optional
+
+from fastapi import HTTPException
+
+SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "elettro_uploads"))
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Unfinished uploads older than this are removed
+SPOOL_TTL_SECONDS = int(os.environ.get("UPLOAD_SPOOL_TTL", str(24 * 3600)))
+ALLOWED_EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+_locks: dict = {}
+_locks_guard = threading.Lock()
+
+
+def _dir(upload_id: str) -> str:
+    if not _ID_RE.match(upload_id or ""):
+        raise HTTPException(status_code=404, detail="Unknown upload.")
+    return os.path.join(SPOOL_DIR, upload_id)
+
+
+def data_path(upload_id: str) -> str:
+    return os.path.join(_dir(upload_id), "data")
+
+
+def _lock(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def _write_meta(meta: dict) -> None:
+    path = os.path.join(_dir(meta["upload_id"]), "meta.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def load(upload_id: str) -> dict:
+    try:
+        with open(os.path.join(_dir(upload_id), "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=404, detail="Unknown or expired upload.")
+
+
+def status(meta: dict) -> dict:
+    received = set(meta["received"])
+    missing = [i for i in range(meta["total_parts"]) if i not in received]
+    return {
+        "upload_id": meta["upload_id"],
+        "filename": meta["filename"],
+        "tenant_id": meta["tenant_id"],
+        "size": meta["size"],
+        "chunk_size": meta["chunk_size"],
+        "total_parts": meta["total_parts"],
+        "received": sorted(received),
+        "missing": missing,
+        "complete": not missing,
+    }
+
+
+def part_length(meta: dict, index: int) -> int:
+    start = index * meta["chunk_size"]
+    return min(meta["chunk_size"], meta["size"] - start)
+
+
+def expire_stale() -> None:
+    """Remove spool dirs of uploads not touched for SPOOL_TTL_SECONDS."""
+    cutoff = time.time() - SPOOL_TTL_SECONDS
+    try:
+        entries = os.listdir(SPOOL_DIR)
+    except OSError:
+        return
+    for name in entries:
+        path = os.path.join(SPOOL_DIR, name)
+        try:
+            if _ID_RE.match(name) and os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def init(filename: str, size: int, tenant_id: str, chunk_size: Optional[int] = None) -> dict:
+    """Create a spool dir with a preallocated data file and return the upload's status."""
+    filename = os.path.basename(filename or "")
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail=f"Unsupported file type. Use {', '.join(ALLOWED_EXTENSIONS)}.")
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty.")
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit.")
+    chunk_size = min(max(int(chunk_size or DEFAULT_CHUNK_SIZE), MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+    expire_stale()
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_dir(upload_id), exist_ok=True)
+    with open(data_path(upload_id), "wb") as f:
+        f.truncate(size)
+    meta = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "tenant_id": tenant_id,
+        "size": size,
+        "chunk_size": chunk_size,
+        "total_parts": (size + chunk_size - 1) // chunk_size,
+        "received": [],
+        "created": time.time(),
+    }
+    _write_meta(meta)
+    return status(meta)
+
+
+async def write_part(upload_id: str, index: int, body: AsyncIterator[bytes], sha256: Optional[str] = None) -> dict:
+    """Stream one part from the request body to its offset in the data file."""
+    from starlette.concurrency import run_in_threadpool
+
+    meta = load(upload_id)
+    if not 0 <= index < meta["total_parts"]:
+        raise HTTPException(status_code=400, detail=f"Part index must be 0..{meta['total_parts'] - 1}.")
+    expected = part_length(meta, index)
+    offset = index * meta["chunk_size"]
+    digest = hashlib.sha256()
+    written = 0
+    fd = os.open(data_path(upload_id), os.O_WRONLY)
+    try:
+        async for chunk in body:
+            if not chunk:
+                continue
+            if written + len(chunk) > expected:
+                raise HTTPException(status_code=400, detail=f"Part {index} is larger than {expected} bytes.")
+            await run_in_threadpool(os.pwrite, fd, chunk, offset + written)
+            digest.update(chunk)
+            written += len(chunk)
+    finally:
+        os.close(fd)
+    if written != expected:
+        raise HTTPException(status_code=400, detail=f"Part {index} has {written} bytes, expected {expected}.")
+    if sha256 and digest.hexdigest() != sha256.strip().lower():
+        raise HTTPException(status_code=400, detail=f"Part {index} checksum mismatch.")
+
+    with _lock(upload_id):
+        meta = load(upload_id)
+        if index not in meta["received"]:
+            meta["received"].append(index)
+        _write_meta(meta)
+    return status(meta)
+
+
+def claim(upload_id: str) -> None:
+    """Mark the upload as being completed; a concurrent or repeated complete gets 409."""
+    with _lock(upload_id):
+        meta = load(upload_id)
+        if meta.get("completing"):
+            raise HTTPException(status_code=409, detail="Upload is already being completed.")
+        meta["completing"] = True
+        _write_meta(meta)
+
+
+def release(upload_id: str) -> None:
+    """Undo claim() after a failed completion so the client can retry."""
+    with _lock(upload_id):
+        try:
+            meta = load(upload_id)
+        except HTTPException:
+            return
+        meta["completing"] = False
+        _write_meta(meta)
+
+
+def discard(upload_id: str) -> None:
+    shutil.rmtree(_dir(upload_id), ignore_errors=True)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
@@ -0,0 +1,180 @@
+"""
+Period-over-period comparison engine.
+
+One request names a current window and any number of comparison windows
+(previous_period, last_year, prev_fytd). Window bounds are found with searchsorted on the
+date-sorted tenant frame (frames are sorted by DATE at load), the row slices are
+concatenated with a window label, and each KPI / dimension breakdown is a single grouped
+reduction over that stacked frame. Deltas are aligned per KPI and per dimension key.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from fastapi import HTTPException
+
+WINDOWS = ("previous_period", "last_year", "prev_fytd")
+FY_START_MONTH = 4  # April; same convention as shared.ingest.fiscal_year
+KPIS = ("revenue", "orders", "customers", "average_order_value")
+
+
+def parse_bounds(start_date: Optional[str], end_date: Optional[str], df: Optional[pd.DataFrame] = None) -> Tuple[pd.Timestamp, pd.Timestamp]:
+    """[start, end) for the current window. Date-only end dates include the whole end day; missing bounds come from the frame."""
+    start = pd.to_datetime(start_date) if start_date else None
+    end = pd.to_datetime(end_date) if end_date else None
+    if start is not None and start.tz is not None:
+        start = start.tz_localize(None)
+    if end is not None and end.tz is not None:
+        end = end.tz_localize(None)
+    if (start is None or end is None) and df is not None and "DATE" in df.columns and not df.empty:
+        start = start if start is not None else df["DATE"].min()
+        end = end if end is not None else df["DATE"].max()
+    if start is None or end is None or pd.isna(start) or pd.isna(end):
+        raise HTTPException(status_code=400, detail="start_date and end_date are required for comparisons.")
+    if len(str(end_date or "").strip()) <= 10:
+        end = end.normalize() + pd.Timedelta(days=1)
+    else:
+        end = end + pd.Timedelta(microseconds=1)
+    return start, end
+
+
+def _fy_start(ts: pd.Timestamp) -> pd.Timestamp:
+    year = ts.year if ts.month >= FY_START_MONTH else ts.year - 1
+    return pd.Timestamp(year=year, month=FY_START_MONTH, day=1)
+
+
+def resolve_windows(start: pd.Timestamp, end: pd.Timestamp, names: List[str]) -> Dict[str, Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Bounds ([start, end)) of the current window plus each named comparison window."""
+    out = {"current": (start, end)}
+    for name in names:
+        if name == "previous_period":
+            # Same length, ending where the current window starts
+            out[name] = (start - (end - start), start)
+        elif name == "last_year":
+            out[name] = (start - pd.DateOffset(years=1), end - pd.DateOffset(years=1))
+        elif name == "prev_fytd":
+            # Previous fiscal year from its start to the same day last year
+            last_end = end - pd.DateOffset(years=1)
+            out[name] = (_fy_start(last_end - pd.Timedelta(microseconds=1)), last_end)
+        else:
+            raise HTTPException(status_code=400, detail=f"Unknown comparison window '{name}'. Use: {', '.join(WINDOWS)}.")
+    return out
+
+
+def date_sorted(df: pd.DataFrame) -> pd.DataFrame:
+    """df ordered by DATE with NaT last (no-op for tenant frames, which are sorted at load)."""
+    dates = df["DATE"]
+    n_valid = int(dates.notna().sum())
+    if dates.iloc[:n_valid].is_monotonic_increasing and dates.iloc[n_valid:].isna().all():
+        return df
+    return df.sort_values("DATE", kind="mergesort", na_position="last")
+
+
+def _positions(df: pd.DataFrame, windows: Dict[str, Tuple[pd.Timestamp, pd.Timestamp]]) -> Dict[str, Tuple[int, int]]:
+    dates = df["DATE"].to_numpy(dtype="datetime64[ns]")
+    valid = dates[: int(df["DATE"].notna().sum())]
+    out = {}
+    for name, (lo, hi) in windows.items():
+        bounds = np.array([lo, hi], dtype="datetime64[ns]")
+        a, b = np.searchsorted(valid, bounds, side="left")
+        out[name] = (int(a), int(b))
+    return out
+
+
+def window_slice(df: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """Rows of a date-sorted frame in [start, end), as a positional slice."""
+    if df is None or df.empty or "DATE" not in df.columns:
+        return df
+    df = date_sorted(df)
+    a, b = _positions(df, {"w": (start, end)})["w"]
+    return df.iloc[a:b]
+
+
+def _pct(cur: float, prev: float) -> Optional[float]:
+    return round((cur - prev) / prev * 100, 1) if prev > 0 else None
+
+
+def _kpis(stacked: pd.DataFrame, names: List[str]) -> Dict[str, dict]:
+    agg = {"revenue": ("AMOUNT", "sum")}
+    if "INVOICE_NO" in stacked.columns:
+        agg["orders"] = ("INVOICE_NO", "nunique")
+    if "CUSTOMER_NAME" in stacked.columns:
+        agg["customers"] = ("CUSTOMER_NAME", "nunique")
+    g = stacked.groupby("_window", observed=False).agg(**agg).reindex(names).fillna(0)
+    out = {}
+    for name, row in g.iterrows():
+        revenue = float(row["revenue"])
+        orders = int(row.get("orders", 0))
+        out[name] = {
+            "revenue": revenue,
+            "orders": orders,
+            "customers": int(row.get("customers", 0)),
+            "average_order_value": revenue / orders if orders > 0 else 0,
+        }
+    return out
+
+
+def _breakdown(stacked: pd.DataFrame, col: str, names: List[str], top: Optional[int]) -> List[dict]:
+    pivot = stacked.groupby([col, "_window"], observed=False)["AMOUNT"].sum().unstack("_window")
+    pivot = pivot.reindex(columns=names).fillna(0.0).sort_values("current", ascending=False)
+    if top:
+        pivot = pivot.head(top)
+    rows = []
+    cur = pivot["current"].to_numpy()
+    for name in names[1:]:
+        prev = pivot[name].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = np.where(prev > 0, np.round((cur - prev) / prev * 100, 1), np.nan)
+        pivot[f"{name}_delta"] = cur - prev
+        pivot[f"{name}_pct"] = pct
+    for key, rec in zip(pivot.index, pivot.to_dict("records")):
+        rows.append({"key": key, **{k: (None if isinstance(v, float) and np.isnan(v) else v) for k, v in rec.items()}})
+    return rows
+
+
+def compare(
+    df: pd.DataFrame,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    windows: List[str],
+    dimensions: Optional[Dict[str, str]] = None,
+    top: Optional[int] = 20,
+) -> dict:
+    """
+    KPIs and dimension breakdowns for the current window and each comparison window.
+    `df` is the filtered tenant frame without a date filter; `dimensions` maps output
+    names to columns (e.g. {"customer": "CUSTOMER_NAME"}).
+    """
+    bounds = resolve_windows(start, end, windows)
+    names = list(bounds)
+    result = {
+        "windows": {n: {"start": s.isoformat(), "end": e.isoformat()} for n, (s, e) in bounds.items()},
+        "kpis": {n: {k: 0 for k in KPIS} for n in names},
+        "deltas": {},
+        "breakdowns": {},
+    }
+    if df is None or df.empty or "DATE" not in df.columns or "AMOUNT" not in df.columns:
+        return result
+
+    df = date_sorted(df)
+    pos = _positions(df, bounds)
+    take = np.concatenate([np.arange(a, b) for a, b in pos.values()])
+    labels = np.repeat(np.arange(len(names)), [b - a for a, b in pos.values()])
+    cols = ["AMOUNT"] + [c for c in ("INVOICE_NO", "CUSTOMER_NAME") if c in df.columns]
+    cols += [c for c in (dimensions or {}).values() if c in df.columns and c not in cols]
+    stacked = df[cols].iloc[take].reset_index(drop=True)
+    stacked["_window"] = pd.Categorical.from_codes(labels, categories=names)
+
+    kpis = _kpis(stacked, names)
+    result["kpis"] = kpis
+    cur = kpis["current"]
+    for name in names[1:]:
+        prev = kpis[name]
+        result["deltas"][name] = {
+            **{f"{k}_delta": cur[k] - prev[k] for k in KPIS},
+            **{f"{k}_pct": _pct(cur[k], prev[k]) for k in KPIS},
+        }
+    for dim, col in (dimensions or {}).items():
+        if col in stacked.columns:
+            result["breakdowns"][dim] = _breakdown(stacked, col, names, top)
+    return result
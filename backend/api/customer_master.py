@@ -0,0 +1,90 @@
+"""
+Customer masters per tenant, persisted in the database and indexed in memory.
+
+An uploaded master is stored as one row per normalized customer name in the
+customer_master table, so it survives restarts and every API worker sees the same one.
+Each process keeps the tenant's CustomerIndex (shared/ingest.py: hash index on the
+normalized name) and reloads it only when the stored master's `updated` stamp changes;
+checking the stamp is a single indexed MAX() per upload. The cached index also keeps the
+fuzzy name matches made so far, so a tenant's recurring misspellings are scored once. Without a database the master
+is kept in this process only (as before).
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from .db import _connect, get_engine
+
+TABLE = "customer_master"
+# Stored fields: ingest.CustomerIndex column -> table column
+_FIELDS = {"STATE": "state", "CITY": "city"}
+
+_cache: Dict[str, Tuple[float, object]] = {}
+_lock = threading.Lock()
+
+
+def _stamp(conn, tenant_id: str) -> Optional[float]:
+    from sqlalchemy import inspect, text
+
+    if not inspect(conn).has_table(TABLE):
+        return None
+    return conn.execute(text(f"SELECT MAX(updated) FROM {TABLE} WHERE tenant_id = :tid"), {"tid": tenant_id}).scalar()
+
+
+def save(tenant_id: str, master):
+    """Index a standardized master frame and replace the tenant's stored master with it; returns the CustomerIndex."""
+    from sqlalchemy import text
+    from shared.ingest import CustomerIndex
+
+    index = CustomerIndex.from_frame(master)
+    if index is None:
+        raise ValueError("Customer master needs a customer name column and a state or city column.")
+    stamp = time.time()
+    eng = get_engine()
+    if eng is not None:
+        rows = index.to_frame().rename(columns={"CUSTOMER_KEY": "customer_key", **_FIELDS})
+        for col in _FIELDS.values():
+            if col not in rows.columns:
+                rows[col] = None
+        rows.insert(0, "tenant_id", tenant_id)
+        rows["updated"] = stamp
+        with _connect(eng) as conn:
+            if _stamp(conn, tenant_id) is not None:
+                conn.execute(text(f"DELETE FROM {TABLE} WHERE tenant_id = :tid"), {"tid": tenant_id})
+            rows.to_sql(TABLE, conn, if_exists="append", index=False, method="multi", chunksize=10_000)
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_tenant ON {TABLE} (tenant_id, updated)"))
+            conn.commit()
+    with _lock:
+        _cache[tenant_id] = (stamp, index)
+    return index
+
+
+def get(tenant_id: str):
+    """The tenant's CustomerIndex (None when no master was uploaded); reloaded when another worker replaced it."""
+    import pandas as pd
+    from sqlalchemy import text
+    from shared.ingest import CustomerIndex
+
+    with _lock:
+        cached = _cache.get(tenant_id)
+    eng = get_engine()
+    if eng is None:
+        return cached[1] if cached else None
+    try:
+        with _connect(eng) as conn:
+            stamp = _stamp(conn, tenant_id)
+            if stamp is None:
+                return None
+            if cached and cached[0] == stamp:
+                return cached[1]
+            cols = ", ".join(["customer_key", *_FIELDS.values()])
+            rows = pd.read_sql(text(f"SELECT {cols} FROM {TABLE} WHERE tenant_id = :tid"), conn, params={"tid": tenant_id})
+    except Exception as e:
+        logging.warning("customer master: could not load for %s: %s", tenant_id, e)
+        return cached[1] if cached else None
+    values = {field: rows[col].to_numpy(dtype=object) for field, col in _FIELDS.items()}
+    index = CustomerIndex(pd.Index(rows["customer_key"].to_numpy()), values)
+    with _lock:
+        _cache[tenant_id] = (stamp, index)
+    return index
@@ -1,10 +1,17 @@
+from __future__ import annotations
+
+# pandas and sqlalchemy are imported inside the functions that use them: importing them
+# here would put ~0.6s on every cold start (budget enforced by tests/test_startup.py)
 import os
-import pandas as pd
-from sqlalchemy import create_engine, text
 import logging
+import threading
+import time
+from contextlib import contextmanager
 from typing import Optional
 from cachetools import TTLCache, cached
 
+from . import events, metrics, timing
+
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,6 +27,8 @@ def get_engine():
     global _engine
     if _engine is not None:
         return _engine
+    from sqlalchemy import create_engine
+
     try:
         _engine = create_engine(
             DATABASE_URL,
@@ -33,32 +42,74 @@ def get_engine():
         logging.error(f"Failed to initialize PostgreSQL engine in Backend: {e}")
         return None
 
+@contextmanager
+def _connect(eng):
+    """eng.connect() with the pool checkout wait recorded in metrics."""
+    start = time.perf_counter()
+    conn = eng.connect()
+    metrics.DB_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _pool_checked_out():
+    if _engine is None:
+        return None
+    return _engine.pool.checkedout()
+
+
+metrics.callback("db_pool_checked_out", "Connections currently checked out of the DB pool.", _pool_checked_out)
+
 # Cache up to 10 tenants' full DataFrames (4h TTL to reduce Supabase egress)
 tenant_cache = TTLCache(maxsize=10, ttl=4 * 3600)
 
 
+# Per-tenant data version: bumped whenever the tenant's cached frame is invalidated, so
+# derived caches (paged tables, indexes, ...) keyed on (tenant, version) go stale together.
+_tenant_versions: dict = {}
+_tenant_versions_lock = threading.Lock()
+
+
+def get_tenant_version(tenant_id: str) -> int:
+    """Current data version for a tenant (0 until its first upload/clear in this process)."""
+    return _tenant_versions.get(tenant_id, 0)
+
+
+def _bump_tenant_version(tenant_id: str) -> int:
+    with _tenant_versions_lock:
+        version = _tenant_versions.get(tenant_id, 0) + 1
+        _tenant_versions[tenant_id] = version
+    # Connected dashboards drop their cached responses for this tenant
+    events.publish(tenant_id, "version", {"version": version})
+    return version
+
+
 def invalidate_tenant_cache(tenant_id: str) -> None:
     """Call after upload so the next dashboard/API request gets fresh data from DB."""
+    _bump_tenant_version(tenant_id)
     try:
         key = (tenant_id,)
         if key in tenant_cache:
             del tenant_cache[key]
     except Exception:
         pass
-
-
-def _fy_from_date(date):
-    """Same as routes.calculate_fy: April = start of FY. Used for read-time enrichment."""
-    if pd.isna(date):
-        return "UNKNOWN"
     try:
-        d = pd.to_datetime(date)
-        if hasattr(d, "month"):
-            y = d.year % 100
-            return f"FY{y}-{(d.year + 1) % 100}" if d.month >= 4 else f"FY{y - 1}-{y}"
+        from .snapshot import discard_warm_snapshot
+        discard_warm_snapshot(tenant_id)
     except Exception:
         pass
-    return "UNKNOWN"
+
+
+def prime_tenant_cache(tenant_id: str, df: pd.DataFrame) -> None:
+    """Install a frame restored elsewhere (boot warm-up snapshot) as the tenant's cached frame."""
+    tenant_cache[(tenant_id,)] = df
+    try:
+        from .filter_index import rebuild
+        rebuild(tenant_id, df, get_tenant_version(tenant_id))
+    except Exception as e:
+        logging.warning("filter index build failed for %s: %s", tenant_id, e)
 
 
 def _tenant_query_date_filter() -> str:
@@ -73,16 +124,42 @@ def _tenant_query_date_filter() -> str:
         return ""
 
 
-@cached(cache=tenant_cache)
+@cached(cache=tenant_cache, info=True)
 def get_cached_tenant_df(tenant_id: str) -> pd.DataFrame:
     """Internal cached helper to fetch full tenant dataset from DB. Enriches FINANCIAL_YEAR and MONTH from DATE when missing."""
+    version = get_tenant_version(tenant_id)
+    with metrics.TENANT_CACHE_LOAD.time():
+        df = _load_tenant_df(tenant_id)
+    try:
+        from .filter_index import rebuild
+        rebuild(tenant_id, df, version)
+    except Exception as e:
+        logging.warning("filter index build failed for %s: %s", tenant_id, e)
+    try:
+        from .snapshot import schedule_warm_snapshot
+        schedule_warm_snapshot(tenant_id, df, version)
+    except Exception:
+        pass
+    return df
+
+
+metrics.callback("tenant_cache_hits_total", "Tenant frame cache hits.", lambda: get_cached_tenant_df.cache_info().hits, kind="counter")
+metrics.callback("tenant_cache_misses_total", "Tenant frame cache misses (DB loads).", lambda: get_cached_tenant_df.cache_info().misses, kind="counter")
+metrics.callback("tenant_cache_size", "Tenant frames currently cached.", lambda: get_cached_tenant_df.cache_info().currsize)
+
+
+def _load_tenant_df(tenant_id: str) -> pd.DataFrame:
+    import pandas as pd
+    from sqlalchemy import text
+
     eng = get_engine()
     if eng is None:
         return pd.DataFrame()
     try:
         date_filter = _tenant_query_date_filter()
         query = text(f"SELECT * FROM sales_master WHERE tenant_id = :tid{date_filter}")
-        df = pd.read_sql(query, eng, params={"tid": tenant_id})
+        with _connect(eng) as conn:
+            df = pd.read_sql(query, conn, params={"tid": tenant_id})
         if df.empty:
             return df
         try:
@@ -95,10 +172,13 @@ def get_cached_tenant_df(tenant_id: str) -> pd.DataFrame:
                 df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
                 if hasattr(df[date_col].dtype, "tz") and df[date_col].dtype.tz is not None:
                     df[date_col] = df[date_col].dt.tz_localize(None)
+                from shared.ingest import fiscal_year, month_label
                 if "FINANCIAL_YEAR" not in df.columns:
-                    df["FINANCIAL_YEAR"] = df[date_col].apply(_fy_from_date)
+                    df["FINANCIAL_YEAR"] = fiscal_year(df[date_col])
                 if "MONTH" not in df.columns:
-                    df["MONTH"] = df[date_col].dt.strftime("%b-%y").str.upper()
+                    df["MONTH"] = month_label(df[date_col])
+                # Date-sorted frames let window lookups (comparison.py) use searchsorted
+                df = df.sort_values(date_col, kind="mergesort", na_position="last", ignore_index=True)
         except Exception as e:
             logging.warning("get_cached_tenant_df: enrich/coerce failed, returning raw df: %s", e)
         return df
@@ -106,49 +186,67 @@ def get_cached_tenant_df(tenant_id: str) -> pd.DataFrame:
         logging.error(f"Error fetching data from DB: {e}")
         return pd.DataFrame()
 
+def filter_by_date(df: pd.DataFrame, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """Restrict a tenant frame to [start_date, end_date]. Date-only end dates include the whole end day."""
+    import pandas as pd
+
+    if df.empty or "DATE" not in df.columns:
+        return df
+    if start_date:
+        start_dt = pd.to_datetime(start_date)
+        if getattr(start_dt, "tz", None) is not None:
+            start_dt = start_dt.tz_localize(None)
+        df = df[df["DATE"] >= start_dt]
+    if end_date:
+        end_dt = pd.to_datetime(end_date)
+        if getattr(end_dt, "tz", None) is not None:
+            end_dt = end_dt.tz_localize(None)
+        # Date-only (e.g. "2025-03-05") → include full end day
+        if len(str(end_date).strip()) <= 10:
+            end_dt = end_dt + pd.Timedelta(days=1)
+            df = df[df["DATE"] < end_dt]
+        else:
+            df = df[df["DATE"] <= end_dt]
+    return df
+
+
 def get_tenant_data(tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
     """
     Fetches the sales_master data for a specific SaaS tenant, with optional date filtering.
     Leverages in-memory caching to avoid hitting Supabase on every API request.
     Never raises: returns empty DataFrame on any error.
     """
-    try:
-        raw = get_cached_tenant_df(tenant_id)
-        df = raw.copy() if raw is not None and isinstance(raw, pd.DataFrame) else pd.DataFrame()
-    except Exception as e:
-        logging.error(f"get_tenant_data: %s", e)
-        df = pd.DataFrame()
+    import pandas as pd
 
-    try:
-        if not df.empty and "DATE" in df.columns:
-            if start_date:
-                start_dt = pd.to_datetime(start_date)
-                if getattr(start_dt, "tz", None) is not None:
-                    start_dt = start_dt.tz_localize(None)
-                df = df[df["DATE"] >= start_dt]
-            if end_date:
-                end_dt = pd.to_datetime(end_date)
-                if getattr(end_dt, "tz", None) is not None:
-                    end_dt = end_dt.tz_localize(None)
-                # Date-only (e.g. "2025-03-05") → include full end day
-                if len(str(end_date).strip()) <= 10:
-                    end_dt = end_dt + pd.Timedelta(days=1)
-                    df = df[df["DATE"] < end_dt]
-                else:
-                    df = df[df["DATE"] <= end_dt]
-    except Exception as e:
-        logging.error(f"get_tenant_data date filter: %s", e)
-        df = pd.DataFrame()
+    from . import warmup
+
+    warmup.record_access(tenant_id)
+    with timing.stage("load") as st:
+        try:
+            raw = get_cached_tenant_df(tenant_id)
+            df = raw.copy() if raw is not None and isinstance(raw, pd.DataFrame) else pd.DataFrame()
+        except Exception as e:
+            logging.error(f"get_tenant_data: %s", e)
+            df = pd.DataFrame()
+
+        try:
+            df = filter_by_date(df, start_date, end_date)
+        except Exception as e:
+            logging.error(f"get_tenant_data date filter: %s", e)
+            df = pd.DataFrame()
+        st.rows = len(df)
     return df
 
 
 def clear_tenant_data(tenant_id: str = "default_elettro") -> int:
     """Delete all rows for a tenant so data can be re-uploaded with enrichment (e.g. after adding customer master)."""
+    from sqlalchemy import text
+
     eng = get_engine()
     if eng is None:
         return 0
     try:
-        with eng.connect() as conn:
+        with _connect(eng) as conn:
             result = conn.execute(text("DELETE FROM sales_master WHERE tenant_id = :tid"), {"tid": tenant_id})
             conn.commit()
             invalidate_tenant_cache(tenant_id)
@@ -158,58 +256,93 @@ def clear_tenant_data(tenant_id: str = "default_elettro") -> int:
         return 0
 
 
-def update_database(new_df: pd.DataFrame, tenant_id: str = "default_elettro") -> int:
-    """Updates the PostgreSQL database with new records for the specific tenant."""
-    if new_df is None or new_df.empty:
-        return 0
+def tenant_has_rows(tenant_id: str) -> Optional[bool]:
+    """Whether any sales rows are stored for the tenant (False without a sales_master table; None without a database or on DB errors)."""
+    from sqlalchemy import inspect, text
 
+    eng = get_engine()
+    if eng is None:
+        return None
+    try:
+        with _connect(eng) as conn:
+            if not inspect(conn).has_table("sales_master"):
+                return False
+            return conn.execute(
+                text("SELECT 1 FROM sales_master WHERE tenant_id = :tid LIMIT 1"), {"tid": tenant_id}
+            ).first() is not None
+    except Exception as e:
+        logging.warning("tenant_has_rows(%s): %s", tenant_id, e)
+        return None
+
+
+# Postgres allows at most 65535 bind parameters per statement; multi-row INSERTs are sized to fit
+MAX_BIND_PARAMS = 65535
+
+
+def insert_sales(new_df: pd.DataFrame, tenant_id: str = "default_elettro") -> pd.DataFrame:
+    """
+    Insert rows whose INVOICE_NO is not yet stored for the tenant; returns the inserted rows
+    (original index kept). The duplicate check and the insert run in one transaction with
+    multi-row INSERTs, so a batch is stored completely or not at all. Raises on DB errors.
+    """
+    from sqlalchemy import text
+
+    if new_df is None or new_df.empty:
+        return new_df
     eng = get_engine()
     if eng is None:
         logging.error("Database engine not initialized. Cannot update.")
-        return 0
+        return new_df.iloc[0:0]
 
     # Inject multi-tenant ID
     new_df["tenant_id"] = tenant_id
+    chunksize = max(1, MAX_BIND_PARAMS // len(new_df.columns) - 1)
 
-    try:
-        with eng.connect() as conn:
-            # Check if table exists
-            has_table = conn.execute(text(
-                "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_schema = 'public' AND table_name = 'sales_master')"
-            )).scalar()
-
-            new_records_count = 0
-
-            if not has_table:
-                # First time creation
-                new_df.to_sql("sales_master", eng, if_exists="replace", index=False)
-                new_records_count = len(new_df)
-                logging.info(f"Created new Postgres table with {new_records_count} records for tenant {tenant_id}.")
+    with _connect(eng) as conn:
+        # Check if table exists
+        has_table = conn.execute(text(
+            "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_schema = 'public' AND table_name = 'sales_master')"
+        )).scalar()
+
+        if not has_table:
+            # First time creation
+            to_insert = new_df
+            to_insert.to_sql("sales_master", conn, if_exists="replace", index=False, method="multi", chunksize=chunksize)
+            logging.info(f"Created new Postgres table with {len(to_insert)} records for tenant {tenant_id}.")
+        else:
+            # Deduplication logic per tenant
+            existing = {row[0] for row in conn.execute(
+                text("SELECT DISTINCT \"INVOICE_NO\" FROM sales_master WHERE tenant_id = :tid"), {"tid": tenant_id}
+            )}
+            if "INVOICE_NO" in new_df.columns:
+                to_insert = new_df[~new_df["INVOICE_NO"].isin(existing)]
             else:
-                # Deduplication logic per tenant
-                existing_invoices = pd.read_sql(
-                    text("SELECT \"INVOICE_NO\" FROM sales_master WHERE tenant_id = :tid"), 
-                    conn, params={"tid": tenant_id}
-                )
-                existing_set = set(existing_invoices["INVOICE_NO"])
-                
-                if "INVOICE_NO" in new_df.columns:
-                    to_insert = new_df[~new_df["INVOICE_NO"].isin(existing_set)]
-                else:
-                    logging.warning("INVOICE_NO missing in new data. Appending all.")
-                    to_insert = new_df
-
-                new_records_count = len(to_insert)
-
-                if new_records_count > 0:
-                    to_insert.to_sql("sales_master", eng, if_exists="append", index=False)
-                    logging.info(f"Appended {new_records_count} new records to Postgres for tenant {tenant_id}.")
-                else:
-                    logging.info("No new records to append to Postgres DB.")
-
-            if new_records_count > 0:
-                invalidate_tenant_cache(tenant_id)
-            return new_records_count
+                logging.warning("INVOICE_NO missing in new data. Appending all.")
+                to_insert = new_df
+
+            if len(to_insert) > 0:
+                to_insert.to_sql("sales_master", conn, if_exists="append", index=False, method="multi", chunksize=chunksize)
+                logging.info(f"Appended {len(to_insert)} new records to Postgres for tenant {tenant_id}.")
+            else:
+                logging.info("No new records to append to Postgres DB.")
+        conn.commit()
+
+    if len(to_insert) > 0:
+        old_version = get_tenant_version(tenant_id)
+        invalidate_tenant_cache(tenant_id)
+        from .filter_index import extend
+        extend(tenant_id, to_insert, old_version, get_tenant_version(tenant_id))
+        from .anomalies import schedule_refresh
+        schedule_refresh(tenant_id)
+    return to_insert
+
+
+def update_database(new_df: pd.DataFrame, tenant_id: str = "default_elettro") -> int:
+    """Updates the PostgreSQL database with new records for the specific tenant; returns rows inserted (0 on failure)."""
+    if new_df is None or new_df.empty:
+        return 0
+    try:
+        return len(insert_sales(new_df, tenant_id))
     except Exception as e:
         logging.error(f"Failed to update Postgres database: {e}")
         return 0
@@ -0,0 +1,205 @@
+"""
+Single pure-ASGI edge middleware: CORS, request timeout and gzip in one layer.
+
+Replaces TimeoutMiddleware, CorsAllMiddleware (both BaseHTTPMiddleware), CORSMiddleware
+and GZipMiddleware. BaseHTTPMiddleware runs every request through an extra task and a
+memory stream and buffers streaming responses; this layer only wraps `send`.
+
+- CORS: any origin, no credentials. Preflight (OPTIONS) is answered here; every other
+  response gets the allow/expose headers.
+- Timeout: a response must start within REQUEST_TIMEOUT_SECONDS or the client gets a 504.
+  Once headers are sent the body may stream for as long as it needs, as before.
+  Long-lived streams (SSE) are exempt.
+- Compression: gzip when the client accepts it, for bodies of at least GZIP_MIN_SIZE.
+  Streaming bodies are compressed chunk by chunk with a sync flush so each chunk reaches
+  the client immediately. Responses that already carry Content-Encoding (the
+  precompressed response cache), event streams and already-compressed media pass through.
+"""
+import json
+import math
+import os
+import zlib
+
+import anyio
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "60"))
+TIMEOUT_EXEMPT_PATHS = {"/api/events"}
+TIMEOUT_DETAIL = "Request timed out. Please try again with a smaller dataset or narrower filters."
+
+GZIP_MIN_SIZE = 500
+GZIP_LEVEL = 6
+# Single-shot bodies above this size are compressed in a worker thread
+GZIP_THREAD_MIN_SIZE = 128 * 1024
+NO_COMPRESS_TYPES = (
+    "text/event-stream",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    # Already compressed: Parquet pages (snappy), XLSX (a zip container), PDF content streams (deflate)
+    "application/vnd.apache.parquet",
+    "application/vnd.openxmlformats-officedocument.",
+    "application/pdf",
+    "image/",
+    "audio/",
+    "video/",
+    "font/woff",
+)
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, PUT, DELETE, OPTIONS"),
+    (b"access-control-allow-headers", b"*"),
+    (b"access-control-expose-headers", b"Content-Disposition"),
+]
+PREFLIGHT_HEADERS = CORS_HEADERS + [(b"access-control-max-age", b"86400"), (b"content-length", b"0")]
+_CORS_NAMES = {name for name, _ in CORS_HEADERS}
+
+
+def _accepts_gzip(scope) -> bool:
+    """True when Accept-Encoding allows gzip with q > 0 (listed itself, or via "*")."""
+    for name, value in scope.get("headers", ()):
+        if name == b"accept-encoding":
+            accepted = {}
+            for part in value.decode("latin-1").lower().split(","):
+                token, *params = (p.strip() for p in part.split(";"))
+                q = 1.0
+                for param in params:
+                    if param.startswith("q="):
+                        try:
+                            q = float(param[2:])
+                        except ValueError:
+                            q = 0.0
+                if token:
+                    accepted[token] = q
+            return accepted.get("gzip", accepted.get("x-gzip", accepted.get("*", 0.0))) > 0
+    return False
+
+
+class _Responder:
+    """Per-request `send` wrapper: adds CORS headers and gzip-compresses the body when worthwhile."""
+
+    __slots__ = ("send", "gzip_ok", "started", "start_message", "compressor")
+
+    def __init__(self, send, gzip_ok: bool):
+        self.send = send
+        self.gzip_ok = gzip_ok
+        self.started = False
+        self.start_message = None
+        self.compressor = None
+
+    async def __call__(self, message):
+        kind = message["type"]
+        if kind == "http.response.start":
+            self.started = True
+            headers = [(k, v) for k, v in message.get("headers", []) if k.lower() not in _CORS_NAMES]
+            headers.extend(CORS_HEADERS)
+            message = {**message, "headers": headers}
+            if self.gzip_ok and self._compressible(message):
+                # Hold the start until the first body chunk decides whether to compress
+                self.start_message = message
+                return
+            await self.send(message)
+            return
+        if kind != "http.response.body" or (self.start_message is None and self.compressor is None):
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if not more:
+                if len(body) < GZIP_MIN_SIZE:
+                    await self.send(start)
+                    await self.send(message)
+                    return
+                if len(body) >= GZIP_THREAD_MIN_SIZE:
+                    compressed = await anyio.to_thread.run_sync(self._compress_all, body)
+                else:
+                    compressed = self._compress_all(body)
+                await self.send(self._with_encoding(start, len(compressed)))
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            # Streaming body: compress incrementally, flushing every chunk
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            await self.send(self._with_encoding(start, None))
+
+        if more:
+            data = self.compressor.compress(body) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        else:
+            data = self.compressor.compress(body) + self.compressor.flush()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more})
+
+    @staticmethod
+    def _compress_all(body: bytes) -> bytes:
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return c.compress(body) + c.flush()
+
+    @staticmethod
+    def _compressible(message) -> bool:
+        if message["status"] in (204, 206, 304):
+            return False
+        for name, value in message.get("headers", []):
+            name = name.lower()
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.decode("latin-1").lower()
+                if content_type.startswith(NO_COMPRESS_TYPES):
+                    return False
+        return True
+
+    @staticmethod
+    def _with_encoding(message, length):
+        headers = [(k, v) for k, v in message["headers"] if k.lower() != b"content-length"]
+        headers.append((b"content-encoding", b"gzip"))
+        vary = [i for i, (k, _) in enumerate(headers) if k.lower() == b"vary"]
+        if vary:
+            k, v = headers[vary[0]]
+            if b"accept-encoding" not in v.lower():
+                headers[vary[0]] = (k, v + b", Accept-Encoding")
+        else:
+            headers.append((b"vary", b"Accept-Encoding"))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return {**message, "headers": headers}
+
+
+class EdgeMiddleware:
+    """Pure ASGI CORS + timeout + gzip (see module docstring)."""
+
+    def __init__(self, app, timeout: float = REQUEST_TIMEOUT_SECONDS):
+        self.app = app
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope.get("method") == "OPTIONS":
+            await send({"type": "http.response.start", "status": 200, "headers": PREFLIGHT_HEADERS})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        responder = _Responder(send, _accepts_gzip(scope))
+        if scope.get("path") in TIMEOUT_EXEMPT_PATHS or not self.timeout:
+            await self.app(scope, receive, responder)
+            return
+
+        # The deadline only covers the time to first byte: it is lifted once headers go out
+        with anyio.CancelScope(deadline=anyio.current_time() + self.timeout) as deadline:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    deadline.deadline = math.inf
+                await responder(message)
+
+            await self.app(scope, receive, send_wrapper)
+        if deadline.cancelled_caught and not responder.started:
+            body = json.dumps({"detail": TIMEOUT_DETAIL}).encode()
+            await responder({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await responder({"type": "http.response.body", "body": body})
@@ -0,0 +1,92 @@
+"""
+In-process pub/sub for tenant data events, streamed to browsers over SSE (/api/events).
+
+Events: "version" (tenant data version bumped: upload, clear, cache invalidation) and
+"upload" (progress of an upload: received, parsed, inserting, done, failed). Publishers
+may run in worker threads; each subscriber's queue is fed on its own event loop. A short
+per-tenant history lets a reconnecting EventSource resume from Last-Event-ID.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+from typing import AsyncIterator, Dict, Optional
+
+from . import metrics
+
+HEARTBEAT_SECONDS = 15
+HISTORY = 50
+QUEUE_SIZE = 100
+
+_ids = itertools.count(1)
+_subscribers: Dict[str, set] = {}
+_history: Dict[str, deque] = {}
+_lock = threading.Lock()
+
+
+def _subscriber_count() -> int:
+    with _lock:
+        return sum(len(s) for s in _subscribers.values())
+
+
+metrics.callback("sse_subscribers", "Open server-sent event streams.", _subscriber_count)
+
+
+def _format(event_id: Optional[int], event: str, data: dict) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode("utf-8")
+
+
+def publish(tenant_id: str, event: str, data: dict) -> None:
+    """Send an event to every subscriber of the tenant. Safe to call from any thread."""
+    message = (next(_ids), event, {"tenant_id": tenant_id, **data})
+    with _lock:
+        _history.setdefault(tenant_id, deque(maxlen=HISTORY)).append(message)
+        subscribers = list(_subscribers.get(tenant_id, ()))
+    for loop, queue in subscribers:
+        try:
+            loop.call_soon_threadsafe(_offer, queue, message)
+        except RuntimeError:
+            # Subscriber's loop is closed; its stream's cleanup will unregister it
+            pass
+
+
+def _offer(queue: asyncio.Queue, message) -> None:
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # Slow client: drop the oldest event rather than block publishers
+        queue.get_nowait()
+        queue.put_nowait(message)
+
+
+async def stream(tenant_id: str, last_event_id: Optional[int] = None, hello: Optional[dict] = None) -> AsyncIterator[bytes]:
+    """SSE byte stream for a tenant: replay after last_event_id, then live events and heartbeats."""
+    queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    entry = (asyncio.get_running_loop(), queue)
+    with _lock:
+        _subscribers.setdefault(tenant_id, set()).add(entry)
+        backlog = [m for m in _history.get(tenant_id, ()) if last_event_id is not None and m[0] > last_event_id]
+    try:
+        yield b"retry: 5000\n\n"
+        if hello is not None:
+            # No id: a reconnect must resume from the last real event, not from the greeting
+            yield _format(None, "hello", {"tenant_id": tenant_id, **hello})
+        for message in backlog:
+            yield _format(*message)
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield b": ping\n\n"
+                continue
+            yield _format(*message)
+    finally:
+        with _lock:
+            subs = _subscribers.get(tenant_id)
+            if subs is not None:
+                subs.discard(entry)
+                if not subs:
+                    _subscribers.pop(tenant_id, None)
@@ -0,0 +1,161 @@
+"""
+Streaming export writers for /export/data.
+
+Each writer is a generator that yields encoded byte chunks built from slices of the
+filtered frame, so peak memory stays at the frame plus one chunk instead of the frame
+plus the full CSV string plus its bytes.
+"""
+import io
+import os
+import tempfile
+import zlib
+from typing import Iterator
+
+import pandas as pd
+
+# Rows encoded per chunk; large enough to amortise to_csv overhead, small enough to keep
+# the first byte quick and memory flat.
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", "20000"))
+# Size of reads when streaming a finished temp file (XLSX, worker-built exports) back to the client.
+FILE_READ_BYTES = 256 * 1024
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+def _row_chunks(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """CSV in chunks. First chunk carries the UTF-8 BOM and header (Excel opens it correctly)."""
+    if df is None or df.empty:
+        return
+    first = True
+    for part in _row_chunks(df, chunk_rows):
+        text = part.to_csv(index=False, header=first)
+        yield text.encode("utf-8-sig" if first else "utf-8")
+        first = False
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream on the fly into a single gzip member."""
+    comp = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file object for pyarrow; bytes are drained by the generator after each row group."""
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._buf += b
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = bytes(self._buf)
+        self._buf.clear()
+        return out
+
+
+def iter_parquet(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Parquet with one row group per chunk, streamed as each row group is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = df if df is not None else pd.DataFrame()
+    schema = pa.Schema.from_pandas(df.head(0), preserve_index=False)
+    sink = _DrainSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for part in _row_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(part, schema=schema, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _xlsx_value(v):
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v
+
+
+def iter_xlsx(df: pd.DataFrame, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """
+    XLSX via openpyxl write-only mode (rows are flushed to disk as they are appended, so
+    memory stays constant). The zip container needs a seekable file, so the workbook is
+    saved to a temp file and then streamed back.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Export")
+    df = df if df is not None else pd.DataFrame()
+    ws.append([str(c) for c in df.columns])
+    for part in _row_chunks(df, chunk_rows):
+        for row in part.itertuples(index=False, name=None):
+            ws.append([_xlsx_value(v) for v in row])
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        wb.save(path)
+    except Exception:
+        _remove(path)
+        raise
+    yield from iter_file(path, delete=True)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def iter_file(path: str, delete: bool = False) -> Iterator[bytes]:
+    """Stream a file from disk in fixed-size blocks, optionally deleting it afterwards."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(FILE_READ_BYTES)
+                if not block:
+                    break
+                yield block
+    finally:
+        if delete:
+            _remove(path)
+
+
+def export_stream(df: pd.DataFrame, fmt: str, compress: bool = False) -> Iterator[bytes]:
+    """Pick the writer for `fmt` (csv | parquet | xlsx); `compress` (gzip) only applies to CSV."""
+    if fmt == "parquet":
+        return iter_parquet(df)
+    if fmt == "xlsx":
+        return iter_xlsx(df)
+    chunks = iter_csv(df)
+    return gzip_stream(chunks) if compress else chunks
@@ -0,0 +1,149 @@
+"""
+Per-tenant index of sidebar filter values for /filters/options.
+
+The index is built once when a tenant frame is loaded into the cache and rolled forward
+with just the appended rows after an upload, so the endpoint never rescans the frame.
+Exclusion rules and month parsing run once per distinct value, not per row. The sorted
+JSON payload and its ETag are rendered once per change and served as-is.
+"""
+import hashlib
+import json
+import threading
+from typing import Dict, Optional
+
+import pandas as pd
+
+FIELDS = ("states", "cities", "customers", "material_groups", "fiscal_years", "months")
+
+
+def _keep_state(v) -> bool:
+    # "State Not Found" / "STATE NOT FOUND ⚠️" placeholders are not real states
+    return bool(str(v).strip()) and "NOT FOUND" not in str(v).upper()
+
+
+def _keep_city(v) -> bool:
+    s = str(v).upper()
+    return "NOT FOUND" not in s and "UNKNOWN" not in s
+
+
+class FilterIndex:
+    """Distinct filter values for one tenant plus the rendered payload (rebuilt lazily on change)."""
+
+    def __init__(self):
+        self.values: Dict[str, set] = {f: set() for f in FIELDS}
+        self._month_keys: Dict[str, pd.Timestamp] = {}
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Merge the distinct values of `df` (a full frame or just appended rows)."""
+        if df is None or df.empty:
+            return
+        from .routes import _material_group_column
+
+        found = {}
+        if "STATE" in df.columns:
+            found["states"] = {v for v in df["STATE"].dropna().unique() if _keep_state(v)}
+        if "CITY" in df.columns:
+            found["cities"] = {v for v in df["CITY"].dropna().unique() if _keep_city(v)}
+        if "CUSTOMER_NAME" in df.columns:
+            found["customers"] = set(df["CUSTOMER_NAME"].dropna().unique())
+        grp_col = _material_group_column(df)
+        if grp_col:
+            found["material_groups"] = set(df[grp_col].dropna().unique())
+        months = None
+        if "FINANCIAL_YEAR" in df.columns:
+            found["fiscal_years"] = set(df["FINANCIAL_YEAR"].dropna().unique())
+        if "MONTH" in df.columns:
+            months = df["MONTH"].dropna().unique()
+        elif "DATE" in df.columns:
+            # Appended rows may not carry MONTH yet (the DB read derives it from DATE)
+            months = pd.to_datetime(df["DATE"], errors="coerce").dropna().dt.strftime("%b-%y").str.upper().unique()
+        if months is not None:
+            found["months"] = set(months)
+
+        with self._lock:
+            changed = False
+            for field, vals in found.items():
+                new = vals - self.values[field]
+                if new:
+                    self.values[field] |= new
+                    changed = True
+            new_months = [m for m in found.get("months", ()) if m not in self._month_keys]
+            if new_months:
+                keys = pd.to_datetime(pd.Series(new_months, dtype=object), format="%b-%y", errors="coerce")
+                self._month_keys.update(zip(new_months, keys))
+            if changed:
+                self._body = None
+                self._etag = None
+
+    def _month_sort_key(self, month):
+        # Chronological; unparseable labels go last, in label order
+        ts = self._month_keys.get(month)
+        if ts is None or pd.isna(ts):
+            return (1, pd.Timestamp.min, str(month))
+        return (0, ts, str(month))
+
+    def _render(self) -> None:
+        payload = {f: sorted(self.values[f], key=str) for f in FIELDS if f != "months"}
+        payload["months"] = sorted(self.values["months"], key=self._month_sort_key)
+        payload = {f: payload[f] for f in FIELDS}
+        self._body = json.dumps(payload, default=str).encode("utf-8")
+        self._etag = '"fo-%s"' % hashlib.sha1(self._body).hexdigest()[:20]
+
+    def payload(self):
+        """(json_bytes, etag) for the current values."""
+        with self._lock:
+            if self._body is None:
+                self._render()
+            return self._body, self._etag
+
+
+EMPTY_BODY = json.dumps({f: [] for f in FIELDS}).encode("utf-8")
+
+# tenant_id -> (data version, FilterIndex)
+_indexes: Dict[str, tuple] = {}
+_indexes_lock = threading.Lock()
+
+
+def rebuild(tenant_id: str, df: pd.DataFrame, version: int) -> FilterIndex:
+    """Full build from a freshly loaded tenant frame."""
+    index = FilterIndex()
+    index.add(df)
+    with _indexes_lock:
+        _indexes[tenant_id] = (version, index)
+    return index
+
+
+def extend(tenant_id: str, appended: pd.DataFrame, old_version: int, new_version: int) -> None:
+    """Roll the index forward with rows appended between two versions; drop it if it was not current."""
+    with _indexes_lock:
+        entry = _indexes.get(tenant_id)
+        if entry is None or entry[0] != old_version:
+            _indexes.pop(tenant_id, None)
+            return
+        index = entry[1]
+        _indexes[tenant_id] = (new_version, index)
+    try:
+        index.add(appended)
+    except Exception:
+        with _indexes_lock:
+            _indexes.pop(tenant_id, None)
+
+
+def get_filter_index(tenant_id: str) -> Optional[FilterIndex]:
+    """Index for the tenant's current data version, building it from the cached frame if needed."""
+    from .db import get_cached_tenant_df, get_tenant_version
+
+    version = get_tenant_version(tenant_id)
+    entry = _indexes.get(tenant_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    df = get_cached_tenant_df(tenant_id)
+    entry = _indexes.get(tenant_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    if df is None or df.empty:
+        return None
+    return rebuild(tenant_id, df, version)
@@ -0,0 +1,386 @@
+"""
+Background jobs for uploads, journaled in SQLite.
+
+POST /upload (and chunked-upload complete) spool the file to JOBS_SPOOL_DIR, record a job
+and return its id at once; UPLOAD_JOB_WORKERS threads run queued jobs in order (parse ->
+standardize -> enrich -> tax -> load) and write stage, percent and throughput to the
+journal, which GET /jobs/{id} reads. At most UPLOAD_QUEUE_SIZE jobs wait; beyond that
+submit() answers 503 so clients back off instead of piling files onto the disk.
+
+The journal is a local SQLite file, so job state survives a restart: jobs that were
+queued or running are queued again on startup if their spooled file is still there
+(the load step is idempotent: rows whose INVOICE_NO is stored are skipped), otherwise
+they are marked failed. Handlers are registered per job kind (routes.py registers "upload").
+
+The journal also makes re-uploads idempotent. The outcome of every loaded file is stored
+under its content hash (per tenant), so submitting the same file again returns a finished
+job with that outcome without parsing anything. The hashes of the parsed rows are stored
+as well; a near-identical file then only sends its new or changed rows through the
+pipeline (known_rows / record_rows).
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from . import metrics
+
+JOBS_DB = os.environ.get("UPLOAD_JOBS_DB", os.path.join(tempfile.gettempdir(), "elettro_jobs.sqlite3"))
+JOBS_SPOOL_DIR = os.environ.get("UPLOAD_JOBS_DIR", os.path.join(tempfile.gettempdir(), "elettro_upload_jobs"))
+UPLOAD_JOB_WORKERS = int(os.environ.get("UPLOAD_JOB_WORKERS", "1"))
+UPLOAD_QUEUE_SIZE = int(os.environ.get("UPLOAD_QUEUE_SIZE", "20"))
+# Finished jobs are kept in the journal this long
+JOB_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Pipeline stages and where each one starts on the 0-100 progress scale
+STAGES = {"queued": 0, "parse": 5, "standardize": 45, "enrich": 55, "tax": 65, "load": 75, "done": 100}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    tenant_id TEXT NOT NULL,
+    filename TEXT,
+    source_path TEXT,
+    status TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    percent REAL NOT NULL DEFAULT 0,
+    rows_parsed INTEGER,
+    rows_per_second REAL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    updated REAL NOT NULL,
+    file_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    tenant_id TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    filename TEXT,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (tenant_id, file_hash)
+);
+CREATE TABLE IF NOT EXISTS upload_rows (
+    tenant_id TEXT NOT NULL,
+    row_hash INTEGER NOT NULL,
+    PRIMARY KEY (tenant_id, row_hash)
+) WITHOUT ROWID;
+"""
+_COLUMNS = ("id", "kind", "tenant_id", "filename", "source_path", "status", "stage", "percent", "rows_parsed",
+            "rows_per_second", "result", "error", "created", "started", "finished", "updated", "file_hash")
+
+_conn: Optional[sqlite3.Connection] = None
+_db_lock = threading.Lock()
+_queue: "queue.Queue[str]" = queue.Queue()
+_handlers: Dict[str, Callable] = {}
+_started = False
+_start_lock = threading.Lock()
+
+metrics.callback("upload_jobs_queued", "Upload jobs waiting for a worker.", lambda: _queue.qsize())
+
+
+def register(kind: str, handler: Callable) -> None:
+    """handler(job: dict, progress: Callable[[stage, **fields], None]) -> result dict."""
+    _handlers[kind] = handler
+
+
+# ─── journal ───
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(JOBS_DB) or ".", exist_ok=True)
+        _conn = sqlite3.connect(JOBS_DB, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(_SCHEMA)
+        # Journals created before uploads were hashed
+        if "file_hash" not in {row[1] for row in _conn.execute("PRAGMA table_info(jobs)")}:
+            _conn.execute("ALTER TABLE jobs ADD COLUMN file_hash TEXT")
+    return _conn
+
+
+def _row(values) -> dict:
+    job = dict(zip(_COLUMNS, values))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def _update(job_id: str, **fields) -> None:
+    fields["updated"] = time.time()
+    if "result" in fields:
+        fields["result"] = json.dumps(fields["result"], default=str)
+    assignments = ", ".join(f"{k} = ?" for k in fields)
+    with _db_lock:
+        _db().execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def get(job_id: str) -> Optional[dict]:
+    with _db_lock:
+        row = _db().execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row(row) if row else None
+
+
+def recent(tenant_id: str, limit: int = 20) -> list:
+    with _db_lock:
+        rows = _db().execute(
+            f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE tenant_id = ? ORDER BY created DESC LIMIT ?", (tenant_id, limit)
+        ).fetchall()
+    return [_row(r) for r in rows]
+
+
+def public(job: dict) -> dict:
+    """Job as returned by the API (no server paths)."""
+    out = {k: v for k, v in job.items() if k != "source_path"}
+    out["job_id"] = out.pop("id")
+    out["queue_position"] = _position(job["id"]) if job["status"] == "queued" else None
+    return out
+
+
+def _position(job_id: str) -> Optional[int]:
+    with _queue.mutex:
+        waiting = list(_queue.queue)
+    return waiting.index(job_id) + 1 if job_id in waiting else None
+
+
+# ─── submit / run ───
+
+def spool_path(filename: Optional[str]) -> str:
+    """A fresh path in the job spool dir (keeps the upload's extension, which selects the parser)."""
+    os.makedirs(JOBS_SPOOL_DIR, exist_ok=True)
+    return os.path.join(JOBS_SPOOL_DIR, uuid.uuid4().hex + os.path.splitext(filename or "")[1].lower())
+
+
+def ensure_capacity() -> None:
+    """503 (with Retry-After) when UPLOAD_QUEUE_SIZE jobs are already waiting."""
+    if _queue.qsize() >= UPLOAD_QUEUE_SIZE:
+        raise HTTPException(status_code=503, detail="Upload queue is full. Please retry shortly.", headers={"Retry-After": "30"})
+
+
+def submit(kind: str, tenant_id: str, filename: Optional[str], source_path: str,
+           file_hash: Optional[str] = None, result: Optional[dict] = None) -> dict:
+    """
+    Journal and enqueue a job for a spooled file (which the job then owns). 503 when the queue is full.
+    With a result (the stored outcome of an identical upload, see find_upload) the job is journaled
+    as done and the file removed; nothing is queued.
+    """
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    if result is not None:
+        _remove(source_path)
+        with _db_lock:
+            _db().execute(
+                "INSERT INTO jobs (id, kind, tenant_id, filename, status, stage, percent, rows_parsed, result, "
+                "created, started, finished, updated, file_hash) VALUES (?, ?, ?, ?, 'done', 'done', 100, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, tenant_id, filename, result.get("rows_parsed"), json.dumps(result, default=str),
+                 now, now, now, now, file_hash),
+            )
+        return get(job_id)
+    try:
+        ensure_capacity()
+    except HTTPException:
+        _remove(source_path)
+        raise
+    with _db_lock:
+        _db().execute(
+            "INSERT INTO jobs (id, kind, tenant_id, filename, source_path, status, stage, percent, created, updated, file_hash) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', 'queued', 0, ?, ?, ?)",
+            (job_id, kind, tenant_id, filename, source_path, now, now, file_hash),
+        )
+    start()
+    _queue.put(job_id)
+    return get(job_id)
+
+
+def _remove(path: Optional[str]) -> None:
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _run(job_id: str) -> None:
+    job = get(job_id)
+    if job is None or job["status"] not in ("queued", "running"):
+        return
+    started = time.time()
+    _update(job_id, status="running", stage="parse", percent=STAGES["parse"], started=started, error=None)
+
+    def progress(stage: str, rows: Optional[int] = None) -> None:
+        fields = {"stage": stage, "percent": STAGES.get(stage, 0)}
+        if rows is not None:
+            fields["rows_parsed"] = rows
+            fields["rows_per_second"] = round(rows / max(time.time() - started, 1e-6), 1)
+        _update(job_id, **fields)
+
+    try:
+        handler = _handlers[job["kind"]]
+        result = handler(job, progress)
+        finished = time.time()
+        rows = (result or {}).get("rows_parsed")
+        _update(
+            job_id, status="done", stage="done", percent=100, result=result, finished=finished,
+            **({"rows_per_second": round(rows / max(finished - started, 1e-6), 1)} if rows else {}),
+        )
+    except Exception as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        logging.error("upload job %s failed: %s", job_id, detail)
+        _update(job_id, status="failed", error=str(detail), finished=time.time())
+    finally:
+        _remove(job["source_path"])
+
+
+def _worker() -> None:
+    while True:
+        job_id = _queue.get()
+        try:
+            _run(job_id)
+        except Exception as e:  # journal errors must not kill the worker
+            logging.error("upload job worker: %s", e)
+        finally:
+            _queue.task_done()
+
+
+def recover() -> int:
+    """Re-queue jobs interrupted by a restart (their file must still exist); drop old finished jobs. Returns jobs re-queued."""
+    now = time.time()
+    with _db_lock:
+        db = _db()
+        db.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (now - JOB_RETENTION_SECONDS,))
+        pending = db.execute(
+            "SELECT id, source_path FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+        ).fetchall()
+    requeued = 0
+    for job_id, path in pending:
+        if path and os.path.exists(path):
+            _update(job_id, status="queued", stage="queued", percent=0)
+            _queue.put(job_id)
+            requeued += 1
+        else:
+            _update(job_id, status="failed", error="Interrupted by a restart; please upload the file again.", finished=now)
+    # Spooled files no job refers to (e.g. the process died between spooling and journaling)
+    if os.path.isdir(JOBS_SPOOL_DIR):
+        with _db_lock:
+            owned = {row[0] for row in _db().execute("SELECT source_path FROM jobs WHERE status IN ('queued', 'running')")}
+        for name in os.listdir(JOBS_SPOOL_DIR):
+            path = os.path.join(JOBS_SPOOL_DIR, name)
+            if path not in owned and os.path.getmtime(path) < now - 3600:
+                _remove(path)
+    return requeued
+
+
+def start() -> None:
+    """Recover the journal and start the worker threads (once)."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    try:
+        requeued = recover()
+        if requeued:
+            logging.info("upload jobs: re-queued %d job(s) interrupted by a restart", requeued)
+    except Exception as e:
+        logging.error("upload jobs: journal recovery failed: %s", e)
+    for i in range(max(1, UPLOAD_JOB_WORKERS)):
+        threading.Thread(target=_worker, name=f"upload-job-{i}", daemon=True).start()
+
+
+# ─── idempotent uploads ───
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a spooled file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def find_upload(tenant_id: str, file_hash: str) -> Optional[dict]:
+    """Stored outcome of a file with this content already loaded for the tenant (None if new)."""
+    with _db_lock:
+        row = _db().execute(
+            "SELECT result FROM uploads WHERE tenant_id = ? AND file_hash = ?", (tenant_id, file_hash)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def record_upload(tenant_id: str, file_hash: str, filename: Optional[str], result: dict) -> None:
+    with _db_lock:
+        _db().execute(
+            "INSERT OR REPLACE INTO uploads (tenant_id, file_hash, filename, result, created) VALUES (?, ?, ?, ?, ?)",
+            (tenant_id, file_hash, filename, json.dumps(result, default=str), time.time()),
+        )
+
+
+def known_rows(tenant_id: str, hashes):
+    """Boolean mask: which row hashes (uint64 array) were already loaded for the tenant."""
+    import numpy as np
+
+    signed = np.asarray(hashes, dtype=np.uint64).view(np.int64)
+    if not len(signed):
+        return np.zeros(0, dtype=bool)
+    with _db_lock:
+        db = _db()
+        # Join against a temp table: cost follows the upload's size, not the tenant's history
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS upload_probe (row_hash INTEGER PRIMARY KEY)")
+        db.execute("BEGIN")
+        try:
+            db.execute("DELETE FROM upload_probe")
+            db.executemany("INSERT OR IGNORE INTO upload_probe VALUES (?)", ((h,) for h in signed.tolist()))
+            found = [row[0] for row in db.execute(
+                "SELECT p.row_hash FROM upload_probe p JOIN upload_rows r ON r.tenant_id = ? AND r.row_hash = p.row_hash",
+                (tenant_id,),
+            )]
+            db.execute("DELETE FROM upload_probe")
+        finally:
+            db.execute("COMMIT")
+    return np.isin(signed, np.asarray(found, dtype=np.int64))
+
+
+def record_rows(tenant_id: str, hashes) -> None:
+    """Remember row hashes (uint64 array) as loaded for the tenant."""
+    import numpy as np
+
+    signed = np.asarray(hashes, dtype=np.uint64).view(np.int64)
+    with _db_lock:
+        db = _db()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "INSERT OR IGNORE INTO upload_rows (tenant_id, row_hash) VALUES (?, ?)",
+                ((tenant_id, h) for h in signed.tolist()),
+            )
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+
+def forget_uploads(tenant_id: str) -> None:
+    """Drop the tenant's file and row hashes (its sales were cleared, so everything must load again)."""
+    with _db_lock:
+        db = _db()
+        db.execute("DELETE FROM uploads WHERE tenant_id = ?", (tenant_id,))
+        db.execute("DELETE FROM upload_rows WHERE tenant_id = ?", (tenant_id,))
+
+
+def move_into_spool(path: str, filename: Optional[str]) -> str:
+    """Move an already spooled file (e.g. a completed chunked upload) into the job spool."""
+    target = spool_path(filename)
+    shutil.move(path, target)
+    return target
@@ -0,0 +1,255 @@
+"""
+In-process instrumentation exposed on /metrics in Prometheus text format (no external
+collector or client library needed).
+
+Counters, gauges and histograms are kept in a module-level registry; values are per
+process (one uvicorn worker = one scrape target). Callback metrics read live values
+(cache stats, pool occupancy) at scrape time.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (100, 500, 1000, 5000, 10000, 25000, 50000, 100000, 250000, 500000)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def collect(self) -> Iterable[str]:
+        yield from self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, v in items:
+            yield f"{self.name}{_fmt_labels(self.label_names, key)} {_fmt_value(v)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[idx] += 1
+            row[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def collect(self) -> Iterable[str]:
+        yield from self.header()
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        for key, row in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_fmt_labels(self.label_names, key, ('le', _fmt_value(bound)))} {cumulative}"
+            yield f"{self.name}_sum{_fmt_labels(self.label_names, key)} {_fmt_value(row[-1])}"
+            yield f"{self.name}_count{_fmt_labels(self.label_names, key)} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, hist: Histogram, labels: dict):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class CallbackMetric(_Metric):
+    """Value(s) read at scrape time: fn() returns a number or {label_value_tuple: number}."""
+
+    def __init__(self, name, help, kind: str, fn: Callable, labels=()):
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self.fn = fn
+
+    def collect(self) -> Iterable[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        yield from self.header()
+        if isinstance(value, dict):
+            for key, v in value.items():
+                key = key if isinstance(key, tuple) else (key,)
+                yield f"{self.name}{_fmt_labels(self.label_names, key)} {_fmt_value(v)}"
+        elif value is not None:
+            yield f"{self.name} {_fmt_value(value)}"
+
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge(name, help, labels))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def callback(name: str, help: str, fn: Callable, kind: str = "gauge", labels: Sequence[str] = ()) -> CallbackMetric:
+    return _register(CallbackMetric(name, help, kind, fn, labels))
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for m in metrics:
+        lines.extend(m.collect())
+    return "\n".join(lines) + "\n"
+
+
+# ─── Metrics shared across modules ───
+
+HTTP_REQUESTS = counter("http_requests_total", "HTTP requests by route template, method and status.", ("method", "route", "status"))
+HTTP_ERRORS = counter("http_request_errors_total", "HTTP requests answered with 5xx or an unhandled exception.", ("method", "route"))
+HTTP_LATENCY = histogram("http_request_duration_seconds", "Request latency by route template.", ("method", "route"))
+TENANT_CACHE_LOAD = histogram("tenant_cache_load_seconds", "Time to load a tenant frame from the database on a cache miss.")
+DB_CHECKOUT_WAIT = histogram("db_pool_checkout_seconds", "Time waiting to check a connection out of the DB pool.")
+UPLOAD_ROWS = counter("upload_rows_total", "Rows parsed from uploaded files.", ("endpoint",))
+UPLOAD_ROWS_PER_SECOND = histogram("upload_rows_per_second", "Upload processing throughput per file (parse to DB insert).", ("endpoint",), buckets=RATE_BUCKETS)
+INGEST_STAGE_SECONDS = histogram("ingest_stage_seconds", "Time spent in each upload transform stage (shared/ingest.py).", ("stage",))
+PDF_RENDER = histogram("pdf_render_seconds", "PDF report generation time, including data preparation.", ("report_type",))
+
+
+def route_template(scope) -> str:
+    """Matched route template incl. router prefix (e.g. /api/customers/all), or "unmatched"."""
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        # Unmatched paths share one label so 404 scans cannot blow up cardinality
+        return "unmatched"
+    rendered = template
+    for k, v in (scope.get("path_params") or {}).items():
+        rendered = rendered.replace("{%s}" % k, str(v)).replace("{%s:path}" % k, str(v))
+    path = scope.get("path", "")
+    # Some FastAPI versions report the route path without the include_router prefix
+    if path != rendered and path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route request counts, latency and errors (route template, not raw path)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            template = route_template(scope)
+            method = scope.get("method", "")
+            code = status["code"]
+            HTTP_LATENCY.observe(time.perf_counter() - start, method=method, route=template)
+            HTTP_REQUESTS.inc(method=method, route=template, status=str(code))
+            if code >= 500:
+                HTTP_ERRORS.inc(method=method, route=template)
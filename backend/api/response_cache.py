@@ -0,0 +1,243 @@
+"""
+Precompressed response cache for the read-only analytical endpoints.
+
+A 200 JSON response is stored once per (tenant data version, path, normalized query)
+together with its compressed variants: gzip always, plus brotli and zstd when the
+optional `brotli` / `zstandard` packages are installed. A repeat request is answered
+straight from the cache with the best variant its Accept-Encoding allows, skipping
+both the handler and the edge gzip layer. Variants are built lazily, the first time a
+client asks for that encoding. An upload bumps the tenant version, so stale entries
+are never served and simply age out of the LRU.
+
+Requests with ?explain=1 bypass the cache (their timings must be live).
+"""
+import gzip
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from cachetools import TTLCache
+
+from . import metrics, warmup
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Total bytes of cached bodies (all variants), and how long an entry may live
+MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_BYTES", str(256 * 1024 * 1024)))
+TTL_SECONDS = int(os.environ.get("RESPONSE_CACHE_TTL", "1800"))
+GZIP_LEVEL = 9
+BROTLI_QUALITY = int(os.environ.get("RESPONSE_CACHE_BROTLI_QUALITY", "9"))
+ZSTD_LEVEL = int(os.environ.get("RESPONSE_CACHE_ZSTD_LEVEL", "10"))
+# Compress in a worker thread above this size so the event loop is not blocked
+THREAD_MIN_BYTES = 128 * 1024
+
+CACHEABLE_PATHS = {
+    "/api/dashboard/summary",
+    "/api/metrics/summary",
+    "/api/charts/trend",
+    "/api/charts/material-groups",
+    "/api/charts/top-customers",
+    "/api/sales/monthly",
+    "/api/sales/daily",
+    "/api/sales/growth",
+    "/api/customers/all",
+    "/api/customers/rfm",
+    "/api/geographic/states",
+    "/api/geographic/cities",
+    "/api/materials/performance",
+    "/api/materials/pareto",
+    "/api/reports/item-details",
+    "/api/analytics/anomalies",
+    "/api/analytics/compare",
+}
+# Comma-separated filter lists: order does not change the result
+LIST_PARAMS = {"states", "cities", "customers", "material_groups", "fiscal_years", "months", "dimensions"}
+# Response headers that belong to one transfer, not to the cached body
+_DROP_HEADERS = {b"content-length", b"content-encoding", b"vary", b"server-timing", b"timing-allow-origin"}
+
+RESPONSE_CACHE_REQUESTS = metrics.counter("response_cache_requests_total", "Cacheable requests by outcome.", ("result",))
+
+
+def _compress_br(body: bytes) -> bytes:
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _compress_zstd(body: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+
+
+def _compress_gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# Server preference order among what the client accepts
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS["br"] = _compress_br
+if zstandard is not None:
+    ENCODERS["zstd"] = _compress_zstd
+ENCODERS["gzip"] = _compress_gzip
+
+
+class _Entry:
+    __slots__ = ("headers", "route", "variants", "size")
+
+    def __init__(self, headers: List[Tuple[bytes, bytes]], route, body: bytes):
+        self.headers = headers
+        self.route = route
+        self.variants: Dict[str, bytes] = {"identity": body}
+        self.size = len(body)
+
+
+_cache: TTLCache = TTLCache(maxsize=MAX_BYTES, ttl=TTL_SECONDS, getsizeof=lambda e: e.size)
+
+metrics.callback("response_cache_bytes", "Bytes held by the precompressed response cache.", lambda: _cache.currsize)
+
+
+def normalize_query(query_string: bytes) -> Tuple[Tuple[str, str], ...]:
+    """Sorted (name, value) pairs with blanks dropped and list filters sorted, so equivalent URLs share an entry."""
+    pairs = []
+    for name, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=False):
+        value = value.strip()
+        if not value:
+            continue
+        if name in LIST_PARAMS:
+            value = ",".join(sorted(v.strip() for v in value.split(",") if v.strip()))
+        pairs.append((name, value))
+    return tuple(sorted(pairs))
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Best available encoding the client accepts (honoring q=0), else identity."""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token] = q
+    for enc in ENCODERS:
+        q = accepted.get(enc, accepted.get("*", 0.0))
+        if q > 0:
+            return enc
+    return "identity"
+
+
+async def _variant(entry: _Entry, encoding: str) -> bytes:
+    body = entry.variants.get(encoding)
+    if body is None:
+        raw = entry.variants["identity"]
+        encoder = ENCODERS[encoding]
+        if len(raw) >= THREAD_MIN_BYTES:
+            import anyio.to_thread
+
+            body = await anyio.to_thread.run_sync(encoder, raw)
+        else:
+            body = encoder(raw)
+        if encoding not in entry.variants:
+            entry.variants[encoding] = body
+            entry.size += len(body)
+    return body
+
+
+class ResponseCacheMiddleware:
+    """Pure ASGI: serve cacheable GETs from the precompressed cache; store 200 JSON responses on a miss."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") != "GET" or scope.get("path") not in CACHEABLE_PATHS:
+            await self.app(scope, receive, send)
+            return
+        query = normalize_query(scope.get("query_string", b""))
+        if any(name == "explain" and value not in ("0", "false") for name, value in query):
+            RESPONSE_CACHE_REQUESTS.inc(result="bypass")
+            await self.app(scope, receive, send)
+            return
+
+        from .db import get_tenant_version
+
+        tenant_id = dict(query).get("tenant_id", "default_elettro")
+        # Version read before computing: a concurrent upload can only make this entry unreachable, never stale
+        key = (tenant_id, get_tenant_version(tenant_id), scope["path"], query)
+        accept = ""
+        for name, value in scope.get("headers", ()):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = choose_encoding(accept)
+
+        start = time.perf_counter()
+        entry = _cache.get(key)
+        if entry is not None:
+            RESPONSE_CACHE_REQUESTS.inc(result="hit")
+            # Hits skip get_tenant_data, which counts accesses for the boot warm-up
+            warmup.record_access(tenant_id)
+            if entry.route is not None:
+                scope["route"] = entry.route
+            await self._send(send, entry, encoding, key=key, start=start)
+            return
+
+        RESPONSE_CACHE_REQUESTS.inc(result="miss")
+        captured = {"start": None, "chunks": [], "passthrough": False}
+
+        async def capture(message):
+            if captured["passthrough"]:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = next((v for k, v in headers if k == b"content-type"), b"")
+                if (
+                    message["status"] != 200
+                    or not content_type.startswith(b"application/json")
+                    or any(k in (b"set-cookie", b"content-encoding") for k, _ in headers)
+                ):
+                    captured["passthrough"] = True
+                    await send(message)
+                    return
+                captured["start"] = message
+                return
+            captured["chunks"].append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            start_message = captured["start"]
+            stored = [(k, v) for k, v in start_message.get("headers", []) if k not in _DROP_HEADERS]
+            new_entry = _Entry(stored, scope.get("route"), b"".join(captured["chunks"]))
+            timing_headers = [(k, v) for k, v in start_message.get("headers", []) if k in (b"server-timing", b"timing-allow-origin")]
+            await self._send(send, new_entry, encoding, extra=timing_headers)
+            if new_entry.size <= MAX_BYTES // 4:
+                _cache[key] = new_entry
+
+        await self.app(scope, receive, capture)
+
+    async def _send(self, send, entry: _Entry, encoding: str, key=None, start: Optional[float] = None, extra=()):
+        before = entry.size
+        body = await _variant(entry, encoding)
+        headers = list(entry.headers) + list(extra)
+        headers.append((b"content-length", str(len(body)).encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        if encoding != "identity":
+            headers.append((b"content-encoding", encoding.encode()))
+        if key is not None:
+            ms = round((time.perf_counter() - start) * 1000, 2)
+            headers.append((b"server-timing", f'total;dur={ms};desc="path=response-cache"'.encode()))
+            headers.append((b"timing-allow-origin", b"*"))
+            if entry.size != before:
+                # Re-insert so the byte budget accounts for the new variant
+                _cache[key] = entry
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
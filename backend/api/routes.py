@@ -1,35 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, UploadFile, File, Form, Response
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Query, Request, UploadFile, File, Form, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List
 import logging
-import pandas as pd
 import json
-import io
 import os
+import time
 from datetime import datetime, timedelta
 
+from . import metrics, timing
 from .db import get_tenant_data
 
 router = APIRouter()
 
-# Keyword-based exclusion: row excluded if material group CONTAINS any of these (case-insensitive).
-# Kept in sync with legacy/config.py EXCLUDE_KEYWORDS.
-EXCLUDE_KEYWORDS = [
-    "SERVICE", "AIR VENT", "PACKING", "RAW", "BRASS", "PANEL",
-    "SALES ACCOUNT", "MASTER BATCH", "SEMI", "PPCP", "FIXED",
-    "PROTECTION", "HIPS", "ABS", "INDIRECT", "NYLOAN", "PP BLACK",
-    "NASER MILES PARIS", "DOCUMENT HOLDER",
-    "SWISS MILITARY MODLE MAZE",
-    "SELF ADHESIVE TIE MOUNT", "SCREW TYPE TIE MOUNT",
-    "FINISHED GOOD",
-]
-
-# Rename mappings: regex pattern → standardized name (applied before exclusion)
-MATERIAL_GROUP_MAPPINGS = {
-    r"CONDUIT.*GLAND": "POLYAMIDE CONDUIT GLAND",
-    r"REVER": "REVERSE FORWARD",
-    r"REVERSE FORWORD": "REVERSE FORWARD",
-}
+# Upload transform stages (column mapping, material-group rules, taxes) live in shared/ingest.py
 
 
 # ─── AUTH (minimal: mock login + role for UI) ───
@@ -55,14 +42,16 @@ def serialize_df(df: pd.DataFrame) -> list:
     """Helper to cleanly serialize pandas dataframes to JSON. Returns [] on error to avoid 500s."""
     if df is None or df.empty:
         return []
-    try:
-        raw = df.to_json(orient="records", date_format="iso")
-        # pandas can output NaN which is invalid JSON; replace so json.loads works
-        if raw.find("NaN") != -1:
-            raw = raw.replace("NaN", "null")
-        return json.loads(raw)
-    except Exception:
-        return []
+    with timing.stage("serialize") as st:
+        st.rows = len(df)
+        try:
+            raw = df.to_json(orient="records", date_format="iso")
+            # pandas can output NaN which is invalid JSON; replace so json.loads works
+            if raw.find("NaN") != -1:
+                raw = raw.replace("NaN", "null")
+            return json.loads(raw)
+        except Exception:
+            return []
 
 def _date_amount_columns(df: pd.DataFrame):
     """Return (date_col, amount_col) with case-insensitive match so trend works when DB returns lowercase."""
@@ -74,53 +63,19 @@ def _date_amount_columns(df: pd.DataFrame):
 
 def _material_group_column(df: pd.DataFrame):
     """Return the material group column name if present (any common casing)."""
-    candidates = [
-        "ITEM_NAME_GROUP", "MATERIALGROUP", "MATERIAL_GROUP", "PRODUCT_CATEGORY", "CATEGORY", "ITEM_GROUP",
-        "item_name_group", "materialgroup", "material_group", "product_category", "category", "item_group",
-    ]
-    for col in candidates:
-        if col in df.columns:
-            return col
-    return None
-
-def _apply_material_mappings(df: pd.DataFrame) -> pd.DataFrame:
-    """Rename/standardize material groups using regex patterns (same as legacy ETL)."""
-    if df is None or df.empty:
-        return df
-    grp_col = _material_group_column(df)
-    if grp_col is None:
-        return df
-    for pattern, replacement in MATERIAL_GROUP_MAPPINGS.items():
-        mask = df[grp_col].astype(str).str.contains(pattern, case=False, na=False)
-        df.loc[mask, grp_col] = replacement
-    return df
-
-
-def _exclude_material_groups(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Remove non-sales material groups using keyword/substring matching (same as legacy ETL).
-    Row excluded if material group CONTAINS any keyword (case-insensitive).
-    """
-    if df is None or df.empty:
-        return df
-    grp_col = _material_group_column(df)
-    if grp_col is None:
-        return df
-    norm = (
-        df[grp_col]
-        .astype(str)
-        .str.replace("\u00a0", " ", regex=False)
-        .str.replace(r"\s+", " ", regex=True)
-        .str.strip()
-        .str.upper()
-    )
-    mask = pd.Series(False, index=df.index)
-    for keyword in EXCLUDE_KEYWORDS:
-        mask = mask | norm.str.contains(keyword, case=False, na=False)
-    return df[~mask]
+    from shared.ingest import material_group_column
+    return material_group_column(df)
 
 def apply_filters(df: pd.DataFrame, states=None, cities=None, customers=None, material_groups=None, fiscal_years=None, months=None) -> pd.DataFrame:
     """Apply granular filters to a dataframe. Ignores empty or whitespace-only filter strings."""
+    with timing.stage("filter") as st:
+        out = _filter_frame(df, states, cities, customers, material_groups, fiscal_years, months)
+        st.rows = len(out)
+    return out
+
+def _filter_frame(df: pd.DataFrame, states=None, cities=None, customers=None, material_groups=None, fiscal_years=None, months=None) -> pd.DataFrame:
+    import pandas as pd
+
     if df is None or not isinstance(df, pd.DataFrame):
         return pd.DataFrame()
     if df.empty:
@@ -161,210 +116,301 @@ def apply_filters(df: pd.DataFrame, states=None, cities=None, customers=None, ma
             df = df[df["MONTH"].isin(month_list)]
     return df
 
-# Single canonical placeholder for missing state/region (avoids "State Not Found" vs "STATE NOT FOUND ⚠️")
-STATE_PLACEHOLDER = "State Not Found"
+# ─── UPLOAD PIPELINE ───
 
-# Helper functions adapted from etl_pipeline
-def standardize(df):
-    """Standardize column names and fuzzy-match to canonical names (synced with legacy ETL)."""
-    if df.empty:
-        return df
-    df.columns = df.columns.str.strip().str.upper()
-    df.columns = df.columns.str.replace(".", "", regex=False).str.replace(" ", "_")
+def _record_upload(endpoint: str, rows: int, started: float) -> None:
+    """Upload throughput metrics: rows parsed and rows/sec from parse start to DB insert."""
+    elapsed = time.perf_counter() - started
+    metrics.UPLOAD_ROWS.inc(rows, endpoint=endpoint)
+    if rows and elapsed > 0:
+        metrics.UPLOAD_ROWS_PER_SECOND.observe(rows / elapsed, endpoint=endpoint)
 
-    for col in list(df.columns):
-        cu = col.upper()
 
-        # CITY synonyms
-        if any(x in cu for x in ["CITY", "TOWN", "DISTRICT", "LOCATION", "STATION", "DESTINATION", "PLACE"]):
-            if "CITY" not in df.columns:
-                df.rename(columns={col: "CITY"}, inplace=True)
+def _upload_progress(tenant_id: str, upload_id: str, stage: str, **data) -> None:
+    """Publish an upload progress event (receiving, received, parsed, inserting, done, failed) to the tenant's SSE stream."""
+    from . import events
+    events.publish(tenant_id, "upload", {"upload_id": upload_id, "stage": stage, **data})
 
-        # STATE synonyms
-        elif any(x in cu for x in ["STATE", "REGION", "PROVINCE", "TERRITORY", "POS", "SUPPLY"]):
-            if "STATE" not in df.columns:
-                df.rename(columns={col: "STATE"}, inplace=True)
 
-        # CUSTOMER synonyms
-        elif any(x in cu for x in ["CUSTOMER", "PARTY", "BILL TO", "BUYER", "DEBTOR"]):
-            if "CUSTOMER_NAME" not in df.columns:
-                df.rename(columns={col: "CUSTOMER_NAME"}, inplace=True)
+@router.post("/data/clear")
+def clear_data(tenant_id: str = Form("default_elettro")):
+    """Clear all sales data for a tenant so it can be re-uploaded with enrichment."""
+    from . import jobs
+    from .db import clear_tenant_data
+    deleted = clear_tenant_data(tenant_id)
+    # Re-uploading the same files must load them again
+    jobs.forget_uploads(tenant_id)
+    return {"deleted_rows": deleted, "tenant": tenant_id}
 
-        # ITEM synonyms (but not GROUP columns)
-        elif any(x in cu for x in ["ITEM", "MATERIAL", "PRODUCT", "DESCRIPTION", "PART"]):
-            if "ITEMNAME" not in df.columns and "GROUP" not in cu:
-                df.rename(columns={col: "ITEMNAME"}, inplace=True)
 
-        # INVOICE synonyms
-        elif cu in ("NO", "NO.") or any(x in cu for x in ["INVOICE", "BILL_NO", "DOC_NO", "VOUCHER"]):
-            if "INVOICE_NO" not in df.columns and "DATE" not in cu:
-                df.rename(columns={col: "INVOICE_NO"}, inplace=True)
+@router.post("/upload/customer-master")
+async def upload_customer_master(file: UploadFile = File(...), tenant_id: str = Form("default_elettro")):
+    """
+    Upload a customer master Excel/CSV. Stored per tenant (customer_master.py) and used to enrich
+    STATE/CITY on subsequent sales uploads, matched on the normalized customer name.
+    """
+    from shared import excel, ingest
+    from . import customer_master
 
-    return df
+    try:
+        # Only the columns standardize() can map to CUSTOMER_NAME / STATE / CITY are read
+        wanted = excel.column_filter(ingest.MASTER_COLUMN_KEYWORDS)
+        master = await run_in_threadpool(excel.read_table, file.file, file.filename, wanted)
+        master = ingest.standardize(master)
+        index = await run_in_threadpool(customer_master.save, tenant_id, master)
+        cols = list(master.columns)
+        return {"filename": file.filename, "rows": len(master), "customers": len(index), "columns": cols, "tenant": tenant_id}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to process customer master: {str(e)}")
 
-def _coalesce_state_region(df: pd.DataFrame) -> pd.DataFrame:
-    """One STATE column: merge REGION/PROVINCE/TERRITORY into STATE where STATE is empty, then drop extras."""
-    if df is None or df.empty:
-        return df
-    region_cols = [c for c in ["REGION", "PROVINCE", "TERRITORY"] if c in df.columns]
-    if not region_cols:
-        if "STATE" not in df.columns:
-            df["STATE"] = STATE_PLACEHOLDER
-        else:
-            df["STATE"] = df["STATE"].fillna("").astype(str).str.strip()
-            df.loc[df["STATE"].astype(str).str.strip() == "", "STATE"] = STATE_PLACEHOLDER
-        return df
-    if "STATE" not in df.columns:
-        df["STATE"] = df[region_cols[0]].fillna("").astype(str).str.strip()
-    for rc in region_cols:
-        mask = (df["STATE"].fillna("").astype(str).str.strip() == "") | (df["STATE"].astype(str).str.upper().str.contains("NOT FOUND", na=False))
-        df.loc[mask, "STATE"] = df.loc[mask, rc].fillna("").astype(str).str.strip()
-        df.drop(columns=[rc], inplace=True, errors="ignore")
-    df["STATE"] = df["STATE"].fillna("").astype(str).str.strip()
-    df.loc[df["STATE"] == "", "STATE"] = STATE_PLACEHOLDER
-    return df
 
-def calculate_fy(date):
-    if pd.isna(date): return "UNKNOWN"
-    if date.month >= 4: return f"FY{date.year % 100}-{(date.year + 1) % 100}"
-    else: return f"FY{(date.year - 1) % 100}-{date.year % 100}"
+def _read_upload_frame(source, filename: Optional[str]) -> pd.DataFrame:
+    """Parse an uploaded CSV/Excel from a path or an (already spooled) file object, without copying its bytes."""
+    from shared import excel
+    return excel.read_table(source, filename)
 
 
-COMPANY_STATE = "MAHARASHTRA"
-TAX_RATE = 0.18
+def _prepare_sales_frame(df: pd.DataFrame, master=None, on_stage=None):
+    """
+    Upload ETL (shared/ingest.py sales pipeline): standardize, enrich (customer master index, geo,
+    dates, material group mapping/exclusion), taxes. Returns (frame, per-stage stats).
+    on_stage(step) is called as "standardize", "enrich" and "tax" begin.
+    """
+    from shared import ingest
+    return ingest.sales_pipeline(master).run(df, on_step=on_stage)
 
-def calculate_taxes(df: pd.DataFrame) -> pd.DataFrame:
-    """Calculate IGST/CGST/SGST based on STATE (same as legacy ETL)."""
-    if df is None or df.empty or "AMOUNT" not in df.columns:
-        return df
 
-    cols_to_drop = [
-        "TOTALAMOUNT", "TAX", "IGST", "CGST", "SGST",
-        "IGST_RATE", "CGST_RATE", "SGST_RATE",
-        "GRAND_TOTAL", "NET_AMOUNT", "TOTAL_TAX", "ROUND_OFF",
-    ]
-    df = df.drop(columns=[c for c in cols_to_drop if c in df.columns], errors="ignore")
+def _record_stages(stats: list) -> None:
+    for s in stats:
+        metrics.INGEST_STAGE_SECONDS.observe(s["seconds"], stage=s["stage"])
 
-    df["IGST"] = 0.0
-    df["CGST"] = 0.0
-    df["SGST"] = 0.0
-    df["TAX"] = 0.0
-    df["TOTALAMOUNT"] = 0.0
 
-    state_series = df["STATE"].copy() if "STATE" in df.columns else pd.Series(["Unknown"] * len(df), index=df.index)
-    state_series = state_series.fillna("Unknown").astype(str).str.upper().str.strip()
+def _upload_hashes_usable(tenant_id: str) -> bool:
+    """
+    Upload hashes (jobs.py) stand for rows stored in sales_master, so they are only used with a
+    reachable database, and are forgotten once the tenant has no rows (cleared here or by the
+    legacy app). A DB error only skips them for this upload.
+    """
+    from . import jobs
+    from .db import tenant_has_rows
 
-    intra = state_series.isin([COMPANY_STATE, "UNKNOWN", "STATE NOT FOUND"])
-    inter = ~intra
+    has_rows = tenant_has_rows(tenant_id)
+    if has_rows is None:
+        return False
+    if not has_rows:
+        jobs.forget_uploads(tenant_id)
+    return True
 
-    df.loc[inter, "IGST"] = df.loc[inter, "AMOUNT"] * TAX_RATE
-    df.loc[intra, "CGST"] = df.loc[intra, "AMOUNT"] * (TAX_RATE / 2)
-    df.loc[intra, "SGST"] = df.loc[intra, "AMOUNT"] * (TAX_RATE / 2)
 
-    df["TAX"] = df["IGST"] + df["CGST"] + df["SGST"]
-    df["TOTALAMOUNT"] = df["AMOUNT"] + df["TAX"]
+def _ingest_sales_file(source, filename: Optional[str], tenant_id: str, upload_id: str, endpoint: str, merge_master: bool = True, on_stage=None, skip_known_rows: bool = False) -> dict:
+    """
+    Parse, clean and insert one sales file (path or file object); returns rows parsed / skipped /
+    clean / inserted, plus the per-stage stats. 400 when the file has no rows. Blocking: runs in an upload job worker.
+    on_stage(stage, rows=None) is called as each pipeline stage begins. With skip_known_rows, rows
+    whose hash was loaded for the tenant before (jobs.known_rows) are not processed again.
+    """
+    from shared import ingest
+    from . import jobs
+
+    on_stage = on_stage or (lambda stage, rows=None: None)
+    started = time.perf_counter()
+    on_stage("parse")
+    df = _read_upload_frame(source, filename)
+    rows_parsed = len(df)
+    _upload_progress(tenant_id, upload_id, "parsed", filename=filename, rows=rows_parsed)
+    if df.empty:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    new_hashes = None
+    if skip_known_rows:
+        hashes = ingest.row_hashes(df)
+        known = jobs.known_rows(tenant_id, hashes)
+        new_hashes = hashes[~known]
+        if known.any():
+            df = df[~known]
+    rows_skipped = rows_parsed - len(df)
+    stages = []
+    if not df.empty:
+        from . import customer_master
+        master = customer_master.get(tenant_id) if merge_master else None
+        df, stages = _prepare_sales_frame(df, master, on_stage=lambda stage: on_stage(stage, rows_parsed))
+        _record_stages(stages)
+
+    # 6. Insert into database
+    from .db import insert_sales
+    on_stage("load", rows_parsed)
+    _upload_progress(tenant_id, upload_id, "inserting", filename=filename, rows=len(df))
+    rows_clean = len(df)
+    # A DB error propagates: the job is marked failed instead of done with 0 rows
+    rows_inserted = len(insert_sales(df, tenant_id)) if rows_clean else 0
+    if new_hashes is not None and len(new_hashes):
+        jobs.record_rows(tenant_id, new_hashes)
+    _record_upload(endpoint, rows_parsed, started)
+    _upload_progress(tenant_id, upload_id, "done", filename=filename, rows_inserted=rows_inserted)
+    return {
+        "rows_parsed": rows_parsed, "rows_skipped": rows_skipped, "rows_clean": rows_clean,
+        "rows_inserted": rows_inserted, "stages": stages,
+    }
 
-    return df
 
+def _run_upload_job(job: dict, progress) -> dict:
+    """Upload job handler (see jobs.py): parse -> standardize -> enrich -> tax -> load the spooled file."""
+    from . import jobs
 
-# ─── UPLOAD PIPELINE ───
+    tenant_id, filename, file_hash = job["tenant_id"], job["filename"], job.get("file_hash")
+    try:
+        hashed = bool(file_hash) and _upload_hashes_usable(tenant_id)
+        counts = _ingest_sales_file(
+            job["source_path"], filename, tenant_id, job["id"], job["kind"], on_stage=progress, skip_known_rows=hashed,
+        )
+    except Exception as e:
+        _upload_progress(tenant_id, job["id"], "failed", filename=filename, error=str(e.detail if isinstance(e, HTTPException) else e))
+        raise
+    result = {"filename": filename, "tenant": tenant_id, **counts}
+    # Only reached when the insert succeeded (a DB error fails the job above)
+    if hashed:
+        jobs.record_upload(tenant_id, file_hash, filename, result)
+    return result
 
-# In-memory customer master per tenant (uploaded via /upload/customer-master)
-_customer_masters: dict[str, pd.DataFrame] = {}
 
+def _register_upload_jobs() -> None:
+    from . import jobs
+    jobs.register("upload", _run_upload_job)
+    jobs.register("chunked", _run_upload_job)
 
-def _merge_customer_master(df: pd.DataFrame, tenant_id: str) -> pd.DataFrame:
-    """Enrich sales data with STATE/CITY from the customer master if available."""
-    master = _customer_masters.get(tenant_id)
-    if master is None or master.empty:
-        return df
-    if "CUSTOMER_NAME" not in df.columns or "CUSTOMER_NAME" not in master.columns:
-        return df
-    master_cols = [c for c in ["CUSTOMER_NAME", "STATE", "CITY"] if c in master.columns]
-    if len(master_cols) < 2:
-        return df
-    merged = pd.merge(df, master[master_cols], on="CUSTOMER_NAME", how="left", suffixes=("_raw", "_master"))
-    for col in ["STATE", "CITY"]:
-        mc = f"{col}_master"
-        rc = f"{col}_raw"
-        if mc in merged.columns and rc in merged.columns:
-            merged[col] = merged[mc].fillna(merged[rc])
-            merged.drop(columns=[mc, rc], inplace=True)
-        elif mc in merged.columns:
-            merged.rename(columns={mc: col}, inplace=True)
-        elif rc in merged.columns:
-            merged.rename(columns={rc: col}, inplace=True)
-    return merged
 
+_register_upload_jobs()
 
-@router.post("/data/clear")
-def clear_data(tenant_id: str = Form("default_elettro")):
-    """Clear all sales data for a tenant so it can be re-uploaded with enrichment."""
-    from .db import clear_tenant_data
-    deleted = clear_tenant_data(tenant_id)
-    return {"deleted_rows": deleted, "tenant": tenant_id}
 
+def _job_accepted(job: dict) -> dict:
+    """202 body for a queued upload; poll GET /jobs/{job_id}. A re-uploaded file is already done (with its result)."""
+    return {
+        "job_id": job["id"],
+        "upload_id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "tenant": job["tenant_id"],
+        "status_url": f"/api/jobs/{job['id']}",
+        **({"result": job["result"]} if job["status"] == "done" else {}),
+    }
 
-@router.post("/upload/customer-master")
-async def upload_customer_master(file: UploadFile = File(...), tenant_id: str = Form("default_elettro")):
-    """Upload a customer master Excel/CSV. Stored in memory; used to enrich STATE/CITY on subsequent sales uploads."""
-    try:
-        content = await file.read()
-        if file.filename and file.filename.endswith(".csv"):
-            master = pd.read_csv(io.BytesIO(content))
-        else:
-            master = pd.read_excel(io.BytesIO(content))
-        master = standardize(master)
-        _customer_masters[tenant_id] = master
-        cols = list(master.columns)
-        return {"filename": file.filename, "rows": len(master), "columns": cols, "tenant": tenant_id}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process customer master: {str(e)}")
+
+def _previous_upload(path: str, tenant_id: str):
+    """(content hash, stored outcome of an identical file already loaded for the tenant or None). Blocking."""
+    from . import jobs
+
+    if not _upload_hashes_usable(tenant_id):
+        return None, None
+    file_hash = jobs.file_digest(path)
+    previous = jobs.find_upload(tenant_id, file_hash)
+    return file_hash, ({**previous, "rows_inserted": 0, "duplicate": True} if previous else None)
+
+
+def _submit_upload(kind: str, tenant_id: str, filename: Optional[str], path: str, size: Optional[int]) -> dict:
+    """Journal the upload job for a spooled file and announce it; an identical earlier upload finishes it at once."""
+    from . import jobs
+
+    file_hash, previous = _previous_upload(path, tenant_id)
+    job = jobs.submit(kind, tenant_id, filename, path, file_hash=file_hash, result=previous)
+    _upload_progress(tenant_id, job["id"], "received", filename=filename, bytes=size)
+    if previous:
+        _upload_progress(tenant_id, job["id"], "done", filename=filename, rows_inserted=0, duplicate=True)
+    return job
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202)
 async def handle_data_upload(file: UploadFile = File(...), tenant_id: str = Form("default_elettro")):
-    try:
-        content = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(content))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
-            
-        if df.empty:
-            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    """Queue a sales file for ingestion and return its job id at once; progress via GET /jobs/{job_id} or SSE."""
+    from . import jobs
 
-        # 1. Clean & Standardize
-        df = standardize(df)
-        df = _coalesce_state_region(df)
+    jobs.ensure_capacity()
+    # The multipart parser already spooled the file (to disk when large); the job gets its own copy
+    path = await run_in_threadpool(_spool_to_path, file, jobs.spool_path(file.filename))
+    job = await run_in_threadpool(_submit_upload, "upload", tenant_id, file.filename, path, file.size)
+    return _job_accepted(job)
 
-        # 2. Enrich from customer master (STATE/CITY)
-        df = _merge_customer_master(df, tenant_id)
 
-        # 3. Enrich Dates
-        if "DATE" in df.columns:
-            df["DATE"] = pd.to_datetime(df["DATE"], errors='coerce')
-            df["FINANCIAL_YEAR"] = df["DATE"].apply(calculate_fy)
-            df["MONTH"] = df["DATE"].dt.strftime("%b-%y").str.upper()
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Upload job state: status (queued/running/done/failed), stage, percent, rows/sec, and the final counts in result."""
+    from . import jobs
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return jobs.public(job)
 
-        if "CITY" not in df.columns: df["CITY"] = "City Not Found"
-        if "STATE" not in df.columns: df["STATE"] = STATE_PLACEHOLDER
 
-        # 4. Standardize material group names, then exclude non-sales rows (ETL rule)
-        df = _apply_material_mappings(df)
-        df = _exclude_material_groups(df)
+@router.get("/jobs")
+def list_jobs(tenant_id: str = "default_elettro", limit: int = Query(20, ge=1, le=100)):
+    """A tenant's most recent upload jobs, newest first."""
+    from . import jobs
+    return [jobs.public(j) for j in jobs.recent(tenant_id, limit)]
 
-        # 5. Calculate taxes (IGST/CGST/SGST based on state)
-        df = calculate_taxes(df)
 
-        # 6. Insert into database
-        from .db import update_database
-        rows_inserted = update_database(df, tenant_id)
+# ─── Chunked, resumable upload (large files; see chunked_upload.py) ───
 
-        return {"filename": file.filename, "rows_inserted": rows_inserted, "tenant": tenant_id}
+class ChunkedUploadInit(BaseModel):
+    filename: str
+    size: int
+    tenant_id: str = "default_elettro"
+    chunk_size: Optional[int] = None
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+
+@router.post("/upload/chunked/init")
+def chunked_upload_init(req: ChunkedUploadInit):
+    """Start a chunked upload: returns upload_id, chunk_size and total_parts. Parts are then PUT in any order."""
+    from . import chunked_upload
+    return chunked_upload.init(req.filename, req.size, req.tenant_id, req.chunk_size)
+
+
+@router.put("/upload/chunked/{upload_id}/parts/{index}")
+async def chunked_upload_part(upload_id: str, index: int, request: Request):
+    """Raw bytes of part `index` (0-based). Streamed to disk; re-sending a part overwrites it."""
+    from . import chunked_upload
+    state = await chunked_upload.write_part(upload_id, index, request.stream(), request.headers.get("x-part-sha256"))
+    _upload_progress(
+        state["tenant_id"], upload_id, "receiving", filename=state["filename"],
+        parts_received=len(state["received"]), total_parts=state["total_parts"],
+    )
+    return state
+
+
+@router.get("/upload/chunked/{upload_id}")
+def chunked_upload_status(upload_id: str):
+    """Received and missing parts, so a client can resume after a dropped connection."""
+    from . import chunked_upload
+    return chunked_upload.status(chunked_upload.load(upload_id))
+
+
+@router.post("/upload/chunked/{upload_id}/complete", status_code=202)
+async def chunked_upload_complete(upload_id: str):
+    """All parts received: hand the spooled file to an upload job (no copy) and return the job id."""
+    from . import chunked_upload, jobs
+
+    state = chunked_upload.status(chunked_upload.load(upload_id))
+    if not state["complete"]:
+        raise HTTPException(status_code=409, detail=f"Upload incomplete: {len(state['missing'])} part(s) missing.")
+    tenant_id, filename = state["tenant_id"], state["filename"]
+    # Before moving the file: on 503 the parts stay in place and complete can simply be retried
+    jobs.ensure_capacity()
+    chunked_upload.claim(upload_id)
+    try:
+        path = await run_in_threadpool(jobs.move_into_spool, chunked_upload.data_path(upload_id), filename)
+    except Exception:
+        chunked_upload.release(upload_id)
+        raise
+    chunked_upload.discard(upload_id)
+    job = await run_in_threadpool(_submit_upload, "chunked", tenant_id, filename, path, state["size"])
+    return _job_accepted(job)
+
+
+@router.delete("/upload/chunked/{upload_id}")
+def chunked_upload_abort(upload_id: str):
+    """Abort a chunked upload and delete its spooled parts."""
+    from . import chunked_upload
+    chunked_upload.discard(upload_id)
+    return {"upload_id": upload_id, "aborted": True}
 
 
 # ─── Legacy Streamlit compatibility (v1) ───
@@ -376,40 +422,136 @@ def v1_data(tenant_id: str = Query("default_elettro")):
     return serialize_df(df)
 
 
+# Parse time allowed per batch file in a worker process
+UPLOAD_PARSE_TIMEOUT = float(os.environ.get("UPLOAD_PARSE_TIMEOUT", "300"))
+
+
+def _parse_upload_task(source, filename: Optional[str], master=None):
+    """
+    Batch worker task: parse and clean one file. Returns (frame, rows_parsed, seconds, stage stats).
+    master: the tenant's CustomerIndex, loaded once by the API process and pickled to the worker.
+    """
+    started = time.perf_counter()
+    df = _read_upload_frame(source, filename)
+    rows_parsed = len(df)
+    stages = []
+    if not df.empty:
+        df, stages = _prepare_sales_frame(df, master)
+    return df, rows_parsed, time.perf_counter() - started, stages
+
+
+def _spool_to_path(file: UploadFile, path: Optional[str] = None) -> str:
+    """Copy an upload's temp file to a named file (default: a new temp file) that a worker can open; disk to disk, no in-memory copy."""
+    import shutil
+    import tempfile
+
+    file.file.seek(0)
+    if path is None:
+        suffix = os.path.splitext(file.filename or "")[1]
+        with tempfile.NamedTemporaryFile(prefix="elettro_batch_", suffix=suffix, delete=False) as out:
+            path = out.name
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file.file, out, 1024 * 1024)
+    return path
+
+
+def _merge_batch(frames: list):
+    """Concatenate cleaned batch files, dropping INVOICE_NOs already seen in an earlier file (shared/ingest.py merge_files)."""
+    from shared import ingest
+    return ingest.merge_files(frames)
+
+
 @router.post("/v1/upload_batch")
-async def v1_upload_batch(files: List[UploadFile] = File(...), tenant_id: str = Form("default_elettro")):
-    """Legacy Streamlit: accept multiple files, process each like /upload; return last result."""
+async def v1_upload_batch(request: Request, files: List[UploadFile] = File(...), tenant_id: str = Form("default_elettro")):
+    """
+    Legacy Streamlit: accept multiple files. They are parsed and cleaned concurrently (worker
+    processes when the pool is enabled), merged, deduplicated across files, and inserted in one
+    transaction: either every file of the batch is stored or none. Reports per-file counts and timings.
+    """
     if not files:
         raise HTTPException(status_code=400, detail="No files provided.")
-    last_result = None
-    for file in files:
-        try:
-            content = await file.read()
-            if file.filename and file.filename.endswith(".csv"):
-                df = pd.read_csv(io.BytesIO(content))
-            else:
-                df = pd.read_excel(io.BytesIO(content))
-            if df.empty:
-                continue
-            df = standardize(df)
-            df = _coalesce_state_region(df)
-            if "DATE" in df.columns:
-                df["DATE"] = pd.to_datetime(df["DATE"], errors="coerce")
-                df["FINANCIAL_YEAR"] = df["DATE"].apply(calculate_fy)
-                df["MONTH"] = df["DATE"].dt.strftime("%b-%y").str.upper()
-            if "CITY" not in df.columns:
-                df["CITY"] = "City Not Found"
-            if "STATE" not in df.columns:
-                df["STATE"] = STATE_PLACEHOLDER
-            df = _apply_material_mappings(df)
-            df = _exclude_material_groups(df)
-            df = calculate_taxes(df)
-            from .db import update_database
-            rows = update_database(df, tenant_id)
-            last_result = {"filename": file.filename, "rows_inserted": rows, "tenant": tenant_id}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed on {file.filename}: {str(e)}")
-    return last_result or {"filename": None, "rows_inserted": 0, "tenant": tenant_id}
+    import asyncio
+    import uuid
+    import numpy as np
+    from . import customer_master
+    from .admission import admit
+    from .workers import get_pool
+    upload_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    pool = get_pool()
+
+    async def parse(index: int, file: UploadFile):
+        progress = {"file_index": index, "files": len(files)}
+        _upload_progress(tenant_id, upload_id, "received", filename=file.filename, bytes=file.size, **progress)
+        if pool is None:
+            result = await run_in_threadpool(_parse_upload_task, file.file, file.filename, master)
+        else:
+            path = await run_in_threadpool(_spool_to_path, file)
+            try:
+                result = await pool.run(_parse_upload_task, path, file.filename, master, timeout=UPLOAD_PARSE_TIMEOUT, request=request)
+            finally:
+                os.unlink(path)
+        _upload_progress(tenant_id, upload_id, "parsed", filename=file.filename, rows=result[1], **progress)
+        return result
+
+    async with admit("upload"):
+        master = await run_in_threadpool(customer_master.get, tenant_id)
+        results = await asyncio.gather(*(parse(i, f) for i, f in enumerate(files)), return_exceptions=True)
+        failed = [(f.filename, r) for f, r in zip(files, results) if isinstance(r, BaseException)]
+        if failed:
+            for filename, e in failed:
+                _upload_progress(tenant_id, upload_id, "failed", filename=filename, error=str(e))
+            detail = "; ".join(f"{name}: {e.detail if isinstance(e, HTTPException) else e}" for name, e in failed)
+            raise HTTPException(status_code=500, detail=f"Failed on {detail}")
+        parse_seconds = time.perf_counter() - started
+
+        frames = [df for df, _, _, _ in results]
+        merged, file_idx, dropped = _merge_batch(frames)
+        rows_parsed = sum(rows for _, rows, _, _ in results)
+        for *_, stages in results:
+            _record_stages(stages)
+        inserted_per_file = [0] * len(files)
+        insert_started = time.perf_counter()
+        if not merged.empty:
+            from .db import insert_sales
+            _upload_progress(tenant_id, upload_id, "inserting", rows=len(merged), files=len(files))
+            try:
+                inserted = await run_in_threadpool(insert_sales, merged, tenant_id)
+            except Exception as e:
+                _upload_progress(tenant_id, upload_id, "failed", error=str(e))
+                raise HTTPException(status_code=500, detail=f"Failed to store batch: {str(e)}")
+            positions = merged.index.get_indexer(inserted.index)
+            inserted_per_file = np.bincount(file_idx[positions], minlength=len(files)).tolist() if len(positions) else inserted_per_file
+        insert_seconds = time.perf_counter() - insert_started
+        rows_inserted = sum(inserted_per_file)
+        _record_upload("upload_batch", rows_parsed, started)
+        _upload_progress(tenant_id, upload_id, "done", rows_inserted=rows_inserted, files=len(files))
+
+    report = [
+        {
+            "filename": f.filename,
+            "rows_parsed": rows,
+            "rows_clean": len(df),
+            "duplicates_dropped": dropped[i],
+            "rows_inserted": inserted_per_file[i],
+            "parse_seconds": round(seconds, 3),
+            "stages": stages,
+        }
+        for i, (f, (df, rows, seconds, stages)) in enumerate(zip(files, results))
+    ]
+    return {
+        # filename/rows_inserted/tenant kept for older clients (was the last file's result)
+        "filename": files[-1].filename,
+        "rows_inserted": rows_inserted,
+        "tenant": tenant_id,
+        "upload_id": upload_id,
+        "files": report,
+        "timings": {
+            "parse_seconds": round(parse_seconds, 3),
+            "insert_seconds": round(insert_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+        },
+    }
 
 
 # ─── DATA QUALITY / HEALTH ───
@@ -488,8 +630,102 @@ def test_pdf():
     return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": 'attachment; filename="test.pdf"'})
 
 
+# Report types generate_pdf_report / the strategy report know; anything else is
+# labelled "other" in metrics so client input cannot grow the label set.
+PDF_REPORT_TYPES = {
+    "Executive Summary", "Distributor Strategy Report", "Customer Wise", "City Wise",
+    "Material Wise", "Material Group Wise", "Month Wise", "State Wise",
+}
+
+
+def _pdf_report_task(
+    source, tenant_id, start_date, end_date, report_type, specific_entity,
+    filter_customer, filter_state, filter_material,
+    states, cities, customers, material_groups, fiscal_years, months,
+):
+    """Build the report PDF; runs in a worker process (source = snapshot path) or in-process (source = None)."""
+    from .pdf_generator import generate_pdf_report, generate_dynamic_pdf_report, generate_distributor_strategy_pdf
+    from .workers import load_frame
+    df = load_frame(source, tenant_id, start_date, end_date)
+    logging.info(f"REPORT: raw rows={len(df)}, cols={list(df.columns)[:10]}")
+    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+    logging.info(f"REPORT: after filters rows={len(df)}, report_type={report_type}, entity={specific_entity}, months={months}")
+
+    if df.empty:
+        raise HTTPException(
+            status_code=404,
+            detail="No data for the selected filters and date range. Widen filters or choose a different period."
+        )
+
+    if report_type == "Distributor Strategy Report":
+        customer_name = specific_entity if specific_entity and str(specific_entity).strip() and str(specific_entity) != "All" else None
+        if not customer_name and customers:
+            parts = [p.strip() for p in str(customers).split(",") if p.strip()]
+            if len(parts) == 1:
+                customer_name = parts[0]
+        if not customer_name and "CUSTOMER_NAME" in df.columns:
+            uniq = df["CUSTOMER_NAME"].dropna().unique()
+            customer_name = uniq[0] if len(uniq) == 1 else "All Customers"
+        customer_name = customer_name or "All Customers"
+        if customer_name != "All Customers" and "CUSTOMER_NAME" in df.columns:
+            df = df[df["CUSTOMER_NAME"].astype(str).str.strip() == str(customer_name).strip()]
+        if df.empty:
+            raise HTTPException(
+                status_code=404,
+                detail="No data for the selected customer and filters. Widen filters or choose a different period."
+            )
+
+        effective_months = months
+
+        # Extra safeguard: if the dataframe already resolves to a single month
+        # (e.g. due to other filtering), display that month on the PDF.
+        if (not effective_months or not str(effective_months).strip()) and ("MONTH" in df.columns) and (not df.empty):
+            uniq_months = (
+                df["MONTH"]
+                .dropna()
+                .astype(str)
+                .str.strip()
+                .str.upper()
+                .unique()
+                .tolist()
+            )
+            if len(uniq_months) == 1:
+                effective_months = uniq_months[0]
+        if fiscal_years:
+            fy_parts = [p.strip() for p in str(fiscal_years).split(",") if p.strip()]
+            analysis_period = fy_parts[0] if len(fy_parts) == 1 else (fiscal_years if isinstance(fiscal_years, str) else "YTD")
+        elif start_date and end_date:
+            analysis_period = f"{start_date} to {end_date}"
+        else:
+            analysis_period = "YTD"
+
+        # If a month filter is selected in the UI, include it in the analysis period text
+        # so it shows up on the PDF cover + summary.
+        if effective_months and str(effective_months).strip():
+            month_parts = [p.strip() for p in str(effective_months).split(",") if p.strip()]
+            if len(month_parts) == 1:
+                suffix = f"Month: {month_parts[0]}"
+            else:
+                shown = ", ".join(month_parts[:6])
+                suffix = f"Months: {shown}{'...' if len(month_parts) > 6 else ''}"
+            analysis_period = f"{analysis_period} | {suffix}" if analysis_period else suffix
+        pdf_bytes = generate_distributor_strategy_pdf(df, customer_name, analysis_period)
+        entity_name = str(customer_name).replace(" ", "_")
+    else:
+        pdf_bytes = generate_pdf_report(
+            df, report_type, tenant_id, specific_entity,
+            filter_customer, filter_state, filter_material
+        )
+        entity_name = str(specific_entity).replace(' ', '_') if specific_entity and specific_entity != "All" else "Summary"
+
+    filename = f"ELETTRO_{report_type.replace(' ', '_')}_{entity_name}_{tenant_id}.pdf"
+
+    return pdf_bytes, filename
+
+
 @router.get("/reports/download")
-def download_pdf_report(
+async def download_pdf_report(
+    request: Request,
     tenant_id: str = "default_elettro",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -507,86 +743,22 @@ def download_pdf_report(
     months: Optional[str] = None
 ):
     try:
-        from .pdf_generator import generate_pdf_report, generate_dynamic_pdf_report, generate_distributor_strategy_pdf
-        df = get_tenant_data(tenant_id, start_date, end_date)
-        logging.info(f"REPORT: raw rows={len(df)}, cols={list(df.columns)[:10]}")
-        df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
-        logging.info(f"REPORT: after filters rows={len(df)}, report_type={report_type}, entity={specific_entity}, months={months}")
-
-        if df.empty:
-            raise HTTPException(
-                status_code=404,
-                detail="No data for the selected filters and date range. Widen filters or choose a different period."
-            )
-
-        if report_type == "Distributor Strategy Report":
-            customer_name = specific_entity if specific_entity and str(specific_entity).strip() and str(specific_entity) != "All" else None
-            if not customer_name and customers:
-                parts = [p.strip() for p in str(customers).split(",") if p.strip()]
-                if len(parts) == 1:
-                    customer_name = parts[0]
-            if not customer_name and "CUSTOMER_NAME" in df.columns:
-                uniq = df["CUSTOMER_NAME"].dropna().unique()
-                customer_name = uniq[0] if len(uniq) == 1 else "All Customers"
-            customer_name = customer_name or "All Customers"
-            if customer_name != "All Customers" and "CUSTOMER_NAME" in df.columns:
-                df = df[df["CUSTOMER_NAME"].astype(str).str.strip() == str(customer_name).strip()]
-            if df.empty:
-                raise HTTPException(
-                    status_code=404,
-                    detail="No data for the selected customer and filters. Widen filters or choose a different period."
-                )
-
-            effective_months = months
-
-            # Extra safeguard: if the dataframe already resolves to a single month
-            # (e.g. due to other filtering), display that month on the PDF.
-            if (not effective_months or not str(effective_months).strip()) and ("MONTH" in df.columns) and (not df.empty):
-                uniq_months = (
-                    df["MONTH"]
-                    .dropna()
-                    .astype(str)
-                    .str.strip()
-                    .str.upper()
-                    .unique()
-                    .tolist()
+        from .admission import admit, estimate_cost
+        from .workers import run_tenant_task
+        async with admit("heavy", estimate_cost("pdf", tenant_id, start_date, end_date)):
+            with metrics.PDF_RENDER.time(report_type=report_type if report_type in PDF_REPORT_TYPES else "other"):
+                pdf_bytes, filename = await run_tenant_task(
+                    request, _pdf_report_task, tenant_id, start_date, end_date, report_type, specific_entity,
+                    filter_customer, filter_state, filter_material,
+                    states, cities, customers, material_groups, fiscal_years, months,
                 )
-                if len(uniq_months) == 1:
-                    effective_months = uniq_months[0]
-            if fiscal_years:
-                fy_parts = [p.strip() for p in str(fiscal_years).split(",") if p.strip()]
-                analysis_period = fy_parts[0] if len(fy_parts) == 1 else (fiscal_years if isinstance(fiscal_years, str) else "YTD")
-            elif start_date and end_date:
-                analysis_period = f"{start_date} to {end_date}"
-            else:
-                analysis_period = "YTD"
-
-            # If a month filter is selected in the UI, include it in the analysis period text
-            # so it shows up on the PDF cover + summary.
-            if effective_months and str(effective_months).strip():
-                month_parts = [p.strip() for p in str(effective_months).split(",") if p.strip()]
-                if len(month_parts) == 1:
-                    suffix = f"Month: {month_parts[0]}"
-                else:
-                    shown = ", ".join(month_parts[:6])
-                    suffix = f"Months: {shown}{'...' if len(month_parts) > 6 else ''}"
-                analysis_period = f"{analysis_period} | {suffix}" if analysis_period else suffix
-            pdf_bytes = generate_distributor_strategy_pdf(df, customer_name, analysis_period)
-            entity_name = str(customer_name).replace(" ", "_")
-        else:
-            pdf_bytes = generate_pdf_report(
-                df, report_type, tenant_id, specific_entity,
-                filter_customer, filter_state, filter_material
-            )
-            entity_name = str(specific_entity).replace(' ', '_') if specific_entity and specific_entity != "All" else "Summary"
-
-        filename = f"ELETTRO_{report_type.replace(' ', '_')}_{entity_name}_{tenant_id}.pdf"
-
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -620,27 +792,40 @@ class DynamicReportRequest(BaseModel):
     spec: DynamicReportSpec
 
 
+def _dynamic_report_task(source, tenant_id, start_date, end_date, states, cities, customers, material_groups, fiscal_years, months, spec: dict):
+    from .pdf_generator import generate_dynamic_pdf_report
+    from .workers import load_frame
+    df = load_frame(source, tenant_id, start_date, end_date)
+    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+    if df.empty:
+        raise HTTPException(status_code=404, detail="No data for the selected filters and date range.")
+
+    return generate_dynamic_pdf_report(
+        df=df,
+        title=spec["title"],
+        tenant=tenant_id,
+        primary_dimension=spec["primary_dimension"],
+        secondary_dimension=spec["secondary_dimension"],
+        top_n=spec["top_n"],
+        include_trend=spec["include_trend"],
+        include_share=spec["include_share"],
+        include_top_table=spec["include_top_table"],
+        include_pivot=spec["include_pivot"],
+    )
+
+
 @router.post("/reports/dynamic")
-def download_dynamic_report(req: DynamicReportRequest):
+async def download_dynamic_report(req: DynamicReportRequest, request: Request):
     try:
-        from .pdf_generator import generate_dynamic_pdf_report
-        df = get_tenant_data(req.tenant_id, req.start_date, req.end_date)
-        df = apply_filters(df, req.states, req.cities, req.customers, req.material_groups, req.fiscal_years, req.months)
-        if df.empty:
-            raise HTTPException(status_code=404, detail="No data for the selected filters and date range.")
-
-        pdf_bytes = generate_dynamic_pdf_report(
-            df=df,
-            title=req.spec.title,
-            tenant=req.tenant_id,
-            primary_dimension=req.spec.primary_dimension,
-            secondary_dimension=req.spec.secondary_dimension,
-            top_n=req.spec.top_n,
-            include_trend=req.spec.include_trend,
-            include_share=req.spec.include_share,
-            include_top_table=req.spec.include_top_table,
-            include_pivot=req.spec.include_pivot,
-        )
+        from .admission import admit, estimate_cost
+        from .workers import run_tenant_task
+        async with admit("heavy", estimate_cost("dynamic_pdf", req.tenant_id, req.start_date, req.end_date)):
+            with metrics.PDF_RENDER.time(report_type="Dynamic"):
+                pdf_bytes = await run_tenant_task(
+                    request, _dynamic_report_task, req.tenant_id, req.start_date, req.end_date,
+                    req.states, req.cities, req.customers, req.material_groups, req.fiscal_years, req.months,
+                    req.spec.model_dump(),
+                )
 
         safe_title = (req.spec.title or "Dynamic_Report").replace(" ", "_")
         filename = f"ELETTRO_Dynamic_{safe_title}_{req.tenant_id}.pdf"
@@ -669,50 +854,46 @@ class ChatRequest(BaseModel):
 @router.post("/chat")
 def handle_chat_query(req: ChatRequest):
     try:
-        from .chatbot import process_query as chat_process_query
-        df = get_tenant_data(req.tenant, req.startDate, req.endDate)
-        response_text = chat_process_query(req.query, df)
-        return {"response": response_text}
+        from .chatbot import answer
+        return {"response": answer(req.query, req.tenant, req.startDate, req.endDate)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process chat: {str(e)}")
 
 # ─── FILTER OPTIONS ───
 
 @router.get("/filters/options")
-def get_filter_options(tenant_id: str = "default_elettro"):
-    """Returns all unique filter values for the sidebar multi-selects."""
-    df = get_tenant_data(tenant_id)
-    if df.empty:
-        return {"states": [], "cities": [], "customers": [], "material_groups": [], "fiscal_years": [], "months": []}
+def get_filter_options(request: Request, tenant_id: str = "default_elettro"):
+    """Returns all unique filter values for the sidebar multi-selects (precomputed per tenant, with ETag)."""
+    from starlette.responses import Response
+    from .filter_index import EMPTY_BODY, get_filter_index
+
+    timing.note_path("index")
+    index = get_filter_index(tenant_id)
+    if index is None:
+        return Response(content=EMPTY_BODY, media_type="application/json")
+    body, etag = index.payload()
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/events")
+async def tenant_events(request: Request, tenant_id: str = "default_elettro"):
+    """
+    Server-sent events for a tenant: "hello" (current data version), "version" (data changed,
+    drop cached responses) and "upload" (upload progress). Honors Last-Event-ID on reconnect.
+    """
+    from . import events
+    from .db import get_tenant_version
+
+    last_id = request.headers.get("last-event-id")
+    last_id = int(last_id) if last_id and last_id.isdigit() else None
+    return StreamingResponse(
+        events.stream(tenant_id, last_id, hello={"version": get_tenant_version(tenant_id)}),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    # Exclude "State Not Found" / "STATE NOT FOUND ⚠️" from filter options so only real states appear (no duplicate region placeholders)
-    raw_states = df["STATE"].dropna().unique().tolist() if "STATE" in df.columns else []
-    states = sorted([s for s in raw_states if str(s).strip() and "NOT FOUND" not in str(s).upper()])
-    cities = sorted([c for c in df["CITY"].dropna().unique().tolist() if "NOT FOUND" not in str(c).upper() and "UNKNOWN" not in str(c).upper()]) if "CITY" in df.columns else []
-    customers = sorted(df["CUSTOMER_NAME"].dropna().unique().tolist()) if "CUSTOMER_NAME" in df.columns else []
-    
-    grp_col = _material_group_column(df)
-    material_groups = sorted(df[grp_col].dropna().unique().tolist()) if grp_col else []
-    
-    fiscal_years = sorted(df["FINANCIAL_YEAR"].dropna().unique().tolist()) if "FINANCIAL_YEAR" in df.columns else []
-    months = []
-    if "MONTH" in df.columns:
-        try:
-            unique_months = df["MONTH"].dropna().unique()
-            month_df = pd.DataFrame({"MONTH": unique_months})
-            month_df["SortKey"] = pd.to_datetime(month_df["MONTH"], format="%b-%y", errors='coerce')
-            months = month_df.sort_values("SortKey")["MONTH"].tolist()
-        except:
-            months = sorted(df["MONTH"].dropna().unique().tolist())
-    
-    return {
-        "states": states,
-        "cities": cities,
-        "customers": customers,
-        "material_groups": material_groups,
-        "fiscal_years": fiscal_years,
-        "months": months
-    }
 
 # ─── DASHBOARD (single-call for faster load) ───
 
@@ -734,6 +915,8 @@ def get_dashboard_summary(
     goal_orders: Optional[int] = None,
 ):
     """Single endpoint: summary + trend + material groups + top customers + previous-period comparison + optional goals."""
+    import pandas as pd
+
     def _empty(msg: str):
         return {
             "summary": {"revenue": 0, "orders": 0, "customers": 0, "average_order_value": 0},
@@ -746,8 +929,12 @@ def get_dashboard_summary(
             "message": msg,
         }
     try:
-        df = get_tenant_data(tenant_id, start_date, end_date)
-        df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+        from .comparison import compare, parse_bounds
+        from .db import filter_by_date
+
+        # Filter once without dates; the current window and the previous period are both sliced from it
+        base = apply_filters(get_tenant_data(tenant_id), states, cities, customers, material_groups, fiscal_years, months)
+        df = filter_by_date(base, start_date, end_date) if not base.empty else base
         if df is None or not isinstance(df, pd.DataFrame) or df.empty:
             return _empty("No rows in database for this tenant. Upload data from the Data page (Cloud Data Uploader).")
         # Coerce numeric/date so DB string or tz-aware types never raise
@@ -767,36 +954,15 @@ def get_dashboard_summary(
 
         previous_summary = None
         comparison = None
-        if start_date and end_date and "DATE" in df.columns:
+        if start_date and end_date and "DATE" in base.columns:
             try:
-                start_dt = pd.to_datetime(start_date)
-                end_dt = pd.to_datetime(end_date)
-                if len(str(end_date).strip()) <= 10:
-                    end_dt = end_dt + pd.Timedelta(days=1)
-                delta = end_dt - start_dt
-                prev_end = start_dt - pd.Timedelta(days=1)
-                prev_start = prev_end - delta
-                prev_start_str = prev_start.strftime("%Y-%m-%d")
-                prev_end_str = prev_end.strftime("%Y-%m-%d")
-                df_prev = get_tenant_data(tenant_id, prev_start_str, prev_end_str)
-                df_prev = apply_filters(df_prev, states, cities, customers, material_groups, fiscal_years, months)
-                if not df_prev.empty:
-                    _amt = next((c for c in df_prev.columns if str(c).upper() == "AMOUNT"), None)
-                    pr = float(df_prev[_amt].sum()) if _amt is not None else 0.0
-                    po = int(df_prev["INVOICE_NO"].nunique()) if "INVOICE_NO" in df_prev.columns else 0
-                    pc = int(df_prev["CUSTOMER_NAME"].nunique()) if "CUSTOMER_NAME" in df_prev.columns else 0
-                    paov = pr / po if po > 0 else 0
-                    previous_summary = {"revenue": pr, "orders": po, "customers": pc, "average_order_value": paov}
-                    rev_pct = ((revenue - pr) / pr * 100) if pr > 0 else 0
-                    ord_pct = ((orders - po) / po * 100) if po > 0 else 0
-                    cust_pct = ((cust_count - pc) / pc * 100) if pc > 0 else 0
-                    aov_pct = ((aov - paov) / paov * 100) if paov > 0 else 0
-                    comparison = {
-                        "revenue_pct": round(rev_pct, 1),
-                        "orders_pct": round(ord_pct, 1),
-                        "customers_pct": round(cust_pct, 1),
-                        "average_order_value_pct": round(aov_pct, 1),
-                    }
+                start_dt, end_dt = parse_bounds(start_date, end_date)
+                result = compare(base, start_dt, end_dt, ["previous_period"])
+                prev = result["kpis"]["previous_period"]
+                if prev["revenue"] or prev["orders"]:
+                    previous_summary = prev
+                    deltas = result["deltas"]["previous_period"]
+                    comparison = {f"{k}_pct": deltas[f"{k}_pct"] or 0 for k in ("revenue", "orders", "customers", "average_order_value")}
             except Exception:
                 pass
 
@@ -882,6 +1048,8 @@ def get_kpi_summary(tenant_id: str = "default_elettro", start_date: Optional[str
 
 @router.get("/charts/trend")
 def get_sales_trend(tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None, states: Optional[str] = None, cities: Optional[str] = None, customers: Optional[str] = None, material_groups: Optional[str] = None, fiscal_years: Optional[str] = None, months: Optional[str] = None):
+    import pandas as pd
+
     df = get_tenant_data(tenant_id, start_date, end_date)
     df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
     amount_col = next((c for c in df.columns if str(c).upper() == "AMOUNT"), None)
@@ -978,12 +1146,18 @@ def get_growth_metrics(tenant_id: str = "default_elettro", start_date: Optional[
 
 # ─── CUSTOMER INTELLIGENCE ───
 
-@router.get("/customers/all")
-def get_all_customers(tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None, states: Optional[str] = None, cities: Optional[str] = None, customers: Optional[str] = None, material_groups: Optional[str] = None, fiscal_years: Optional[str] = None, months: Optional[str] = None):
-    df = get_tenant_data(tenant_id, start_date, end_date)
-    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+def _paged_response(page: pd.DataFrame, page_info):
+    """List of records when unpaged (original contract); rows + cursor metadata when paged."""
+    if page_info is None:
+        return serialize_df(page)
+    return {"rows": serialize_df(page), **page_info}
+
+
+def _customers_table(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+
     if df.empty or "CUSTOMER_NAME" not in df.columns:
-        return []
+        return pd.DataFrame()
     cust = df.groupby("CUSTOMER_NAME").agg(
         Revenue=("AMOUNT", "sum"),
         Orders=("INVOICE_NO", "nunique"),
@@ -991,32 +1165,77 @@ def get_all_customers(tenant_id: str = "default_elettro", start_date: Optional[s
         LastOrder=("DATE", "max")
     ).sort_values("Revenue", ascending=False).reset_index()
     cust["LastOrder"] = cust["LastOrder"].dt.strftime("%Y-%m-%d")
-    return serialize_df(cust)
+    return cust
+
+
+@router.get("/customers/all")
+def get_all_customers(tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None, states: Optional[str] = None, cities: Optional[str] = None, customers: Optional[str] = None, material_groups: Optional[str] = None, fiscal_years: Optional[str] = None, months: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None, sort: Optional[str] = None, order: Optional[str] = None, q: Optional[str] = None):
+    """All customers with revenue/orders. Pass limit (and then next_cursor) for keyset paging; sort/order/q sort and search server-side."""
+    from .tables import filter_key, table_page
+
+    def build():
+        df = get_tenant_data(tenant_id, start_date, end_date)
+        df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+        return _customers_table(df)
+
+    filters = filter_key(start_date, end_date, states, cities, customers, material_groups, fiscal_years, months)
+    page, info = table_page(
+        "customers", tenant_id, filters, build,
+        key_cols=["CUSTOMER_NAME"], search_cols=["CUSTOMER_NAME"],
+        default_sort="Revenue", default_order="desc",
+        limit=limit, cursor=cursor, sort=sort, order=order, q=q,
+    )
+    return _paged_response(page, info)
+
+
+def _rfm_table(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+    from shared import rfm as rfm_engine
 
-@router.get("/customers/rfm")
-def get_rfm_segments(tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None, states: Optional[str] = None, cities: Optional[str] = None, customers: Optional[str] = None, material_groups: Optional[str] = None, fiscal_years: Optional[str] = None, months: Optional[str] = None):
-    df = get_tenant_data(tenant_id, start_date, end_date)
-    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
     if df.empty or "CUSTOMER_NAME" not in df.columns or "DATE" not in df.columns:
-        return []
-    max_date = df["DATE"].max()
-    rfm = df.groupby("CUSTOMER_NAME").agg(
-        Recency=("DATE", lambda x: (max_date - x.max()).days),
-        Frequency=("INVOICE_NO", "nunique"),
-        Monetary=("AMOUNT", "sum")
-    ).reset_index()
-    # Simple scoring
-    for col in ["Recency", "Frequency", "Monetary"]:
-        rfm[f"{col}_Score"] = pd.qcut(rfm[col], q=4, labels=[4,3,2,1] if col == "Recency" else [1,2,3,4], duplicates="drop").astype(int)
-    rfm["RFM_Score"] = rfm["Recency_Score"] + rfm["Frequency_Score"] + rfm["Monetary_Score"]
-    def segment(score):
-        if score >= 10: return "Champions"
-        elif score >= 8: return "Loyal"
-        elif score >= 6: return "Potential"
-        elif score >= 4: return "At Risk"
-        else: return "Lost"
-    rfm["Segment"] = rfm["RFM_Score"].apply(segment)
-    return serialize_df(rfm[["CUSTOMER_NAME", "Recency", "Frequency", "Monetary", "Segment"]])
+        return pd.DataFrame()
+    rfm = rfm_engine.score(rfm_engine.rfm_table(df))
+    rfm["Segment"] = rfm_engine.score_segments(rfm["RFM_Score"])
+    return rfm[["CUSTOMER_NAME", "Recency", "Frequency", "Monetary", "Segment"]]
+
+
+# RFM is offloaded to the process pool only once a tenant is this large
+RFM_OFFLOAD_MIN_ROWS = int(os.environ.get("RFM_OFFLOAD_MIN_ROWS", "200000"))
+
+
+def _rfm_task(source, tenant_id, start_date, end_date, states, cities, customers, material_groups, fiscal_years, months):
+    from .workers import load_frame
+    df = load_frame(source, tenant_id, start_date, end_date)
+    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+    return _rfm_table(df)
+
+
+@router.get("/customers/rfm")
+async def get_rfm_segments(request: Request, tenant_id: str = "default_elettro", start_date: Optional[str] = None, end_date: Optional[str] = None, states: Optional[str] = None, cities: Optional[str] = None, customers: Optional[str] = None, material_groups: Optional[str] = None, fiscal_years: Optional[str] = None, months: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None, sort: Optional[str] = None, order: Optional[str] = None, q: Optional[str] = None):
+    from .admission import admit, estimate_cost
+    from .db import get_cached_tenant_df
+    from .tables import filter_key, table_page_async
+    from .workers import run_tenant_task
+
+    filters = filter_key(start_date, end_date, states, cities, customers, material_groups, fiscal_years, months)
+
+    async def build():
+        # Runs once per (tenant, data version, filters); sort/search/paging variants reuse the table
+        rows = len(await run_in_threadpool(get_cached_tenant_df, tenant_id))
+        async with admit("heavy", estimate_cost("rfm", tenant_id, start_date, end_date)):
+            return await run_tenant_task(
+                request, _rfm_task, tenant_id, start_date, end_date,
+                states, cities, customers, material_groups, fiscal_years, months,
+                offload=rows >= RFM_OFFLOAD_MIN_ROWS,
+            )
+
+    page, info = await table_page_async(
+        "rfm", tenant_id, filters, build,
+        key_cols=["CUSTOMER_NAME"], search_cols=["CUSTOMER_NAME", "Segment"],
+        default_sort="CUSTOMER_NAME", default_order="asc",
+        limit=limit, cursor=cursor, sort=sort, order=order, q=q,
+    )
+    return _paged_response(page, info)
 
 # ─── GEOGRAPHIC ───
 
@@ -1103,29 +1322,17 @@ def get_pareto_data(tenant_id: str = "default_elettro", start_date: Optional[str
 
 # ─── REPORTS API ───
 
-@router.get("/reports/item-details")
-def get_item_details(
-    tenant_id: str = "default_elettro", 
-    start_date: Optional[str] = None, 
-    end_date: Optional[str] = None, 
-    states: Optional[str] = None, 
-    cities: Optional[str] = None, 
-    customers: Optional[str] = None, 
-    material_groups: Optional[str] = None, 
-    fiscal_years: Optional[str] = None, 
-    months: Optional[str] = None
-):
-    df = get_tenant_data(tenant_id, start_date, end_date)
-    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
-    
+def _item_details_table(df: pd.DataFrame) -> pd.DataFrame:
+    import pandas as pd
+
     if df.empty:
-        return []
+        return pd.DataFrame()
         
     item_col = "ITEMNAME" if "ITEMNAME" in df.columns else None
     grp_col = "ITEM_NAME_GROUP" if "ITEM_NAME_GROUP" in df.columns else "MATERIALGROUP"
     
     if not item_col or not grp_col in df.columns:
-        return []
+        return pd.DataFrame()
         
     qty_col = "QTY" if "QTY" in df.columns else ("QUANTITY" if "QUANTITY" in df.columns else None)
     
@@ -1150,13 +1357,66 @@ def get_item_details(
     else:
         items["Quantity"] = 0
         
-    return serialize_df(items.sort_values("Revenue", ascending=False))
+    return items.sort_values("Revenue", ascending=False)
+
+
+def _item_details_task(source, tenant_id, start_date, end_date, states, cities, customers, material_groups, fiscal_years, months):
+    from .workers import load_frame
+    df = load_frame(source, tenant_id, start_date, end_date)
+    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+    return _item_details_table(df)
+
+
+@router.get("/reports/item-details")
+async def get_item_details(
+    request: Request,
+    tenant_id: str = "default_elettro", 
+    start_date: Optional[str] = None, 
+    end_date: Optional[str] = None, 
+    states: Optional[str] = None, 
+    cities: Optional[str] = None, 
+    customers: Optional[str] = None, 
+    material_groups: Optional[str] = None, 
+    fiscal_years: Optional[str] = None, 
+    months: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    from .admission import admit, estimate_cost
+    from .tables import filter_key, table_page_async
+    from .workers import run_tenant_task
+
+    async def build():
+        # Only cache misses do heavy work; cached pages skip admission
+        async with admit("heavy", estimate_cost("item_details", tenant_id, start_date, end_date)):
+            return await run_tenant_task(
+                request, _item_details_task, tenant_id, start_date, end_date,
+                states, cities, customers, material_groups, fiscal_years, months,
+            )
+
+    filters = filter_key(start_date, end_date, states, cities, customers, material_groups, fiscal_years, months)
+    page, info = await table_page_async(
+        "item_details", tenant_id, filters, build,
+        key_cols=["Item", "Category"], search_cols=["Item", "Category"],
+        default_sort="Revenue", default_order="desc",
+        limit=limit, cursor=cursor, sort=sort, order=order, q=q,
+    )
+    return _paged_response(page, info)
 
 
 # ─── DATA EXPORT ───
 
+def _export_frame(tenant_id, start_date, end_date, states, cities, customers, material_groups, fiscal_years, months):
+    df = get_tenant_data(tenant_id, start_date, end_date)
+    return apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+
+
 @router.get("/export/data")
-def export_filtered_data(
+async def export_filtered_data(
+    request: Request,
     tenant_id: str = "default_elettro",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
@@ -1166,24 +1426,63 @@ def export_filtered_data(
     material_groups: Optional[str] = None,
     fiscal_years: Optional[str] = None, 
     months: Optional[str] = None,
+    export_format: str = Query("csv", alias="format"),
+    compress: bool = Query(False, alias="gzip"),
 ):
     """
-    Export the currently filtered dataset as CSV for use by the frontend Export Data button.
+    Export the currently filtered dataset for use by the frontend Export Data button.
+    Streams CSV (optionally gzipped on the fly), Parquet or XLSX in chunks instead of
+    building the whole file in memory. The chunks are encoded in the threadpool as they
+    are sent, so the response starts as soon as the frame is filtered (the edge timeout
+    only bounds the first byte); a client disconnect stops the export at the next chunk.
+    The heavy admission units are held until the last chunk is sent.
     """
-    df = get_tenant_data(tenant_id, start_date, end_date)
-    df = apply_filters(df, states, cities, customers, material_groups, fiscal_years, months)
+    from contextlib import AsyncExitStack
 
-    if df.empty:
-        # Return a valid but empty CSV so the download still works
-        csv_bytes = "".encode("utf-8")
-    else:
-        csv_bytes = df.to_csv(index=False).encode("utf-8-sig")
+    from starlette.background import BackgroundTask
+    from starlette.concurrency import iterate_in_threadpool
+
+    from .admission import admit, estimate_cost
+    from .export import EXPORT_FORMATS, export_stream
 
-    filename = f"ELETTRO_Export_{tenant_id}.csv"
-    return Response(
-        content=csv_bytes,
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    fmt = (export_format or "csv").strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format '{export_format}'. Use csv, parquet or xlsx.")
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export requires pyarrow on the server.")
+
+    held = AsyncExitStack()
+    await held.enter_async_context(admit("heavy", estimate_cost(f"export_{fmt}", tenant_id, start_date, end_date)))
+    try:
+        df = await run_in_threadpool(
+            _export_frame, tenant_id, start_date, end_date,
+            states, cities, customers, material_groups, fiscal_years, months,
+        )
+    except BaseException:
+        await held.aclose()
+        raise
+
+    async def body():
+        try:
+            async for chunk in iterate_in_threadpool(export_stream(df, fmt, compress=compress)):
+                yield chunk
+        finally:
+            await held.aclose()
+
+    media_type, ext = EXPORT_FORMATS[fmt]
+    if fmt == "csv" and compress:
+        media_type, ext = "application/gzip", "csv.gz"
+    filename = f"ELETTRO_Export_{tenant_id}.{ext}"
+    # Empty selection still yields a valid (empty) file so the download works.
+    # The background task releases admission if the body was never iterated (aclose is idempotent).
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(held.aclose),
     )
 
 
@@ -1220,38 +1519,97 @@ def get_anomalies(
     drop_threshold_pct: float = 20.0,
 ):
     """Returns customers or entities with revenue drop vs previous period (for alerts / dashboard)."""
-    df = get_tenant_data(tenant_id, start_date, end_date)
-    df = apply_filters(df, states, None, customers, material_groups, fiscal_years, months)
-    if df.empty or "CUSTOMER_NAME" not in df.columns or "DATE" not in df.columns:
-        return {"anomalies": [], "period": "current"}
+    import pandas as pd
+    from .comparison import compare, parse_bounds
+    from .db import filter_by_date
 
-    # Previous period (same length)
+    base = apply_filters(get_tenant_data(tenant_id), states, None, customers, material_groups, fiscal_years, months)
+    if base.empty or "CUSTOMER_NAME" not in base.columns or "DATE" not in base.columns:
+        return {"anomalies": [], "period": "current"}
     try:
-        start_dt = pd.to_datetime(start_date) if start_date else df["DATE"].min()
-        end_dt = pd.to_datetime(end_date) if end_date else df["DATE"].max()
-        if len(str(end_date or "").strip()) <= 10:
-            end_dt = end_dt + pd.Timedelta(days=1)
-        delta = end_dt - start_dt
-        prev_end = start_dt - pd.Timedelta(days=1)
-        prev_start = prev_end - delta
-        df_prev = get_tenant_data(tenant_id, prev_start.strftime("%Y-%m-%d"), prev_end.strftime("%Y-%m-%d"))
-        df_prev = apply_filters(df_prev, states, None, customers, material_groups, fiscal_years, months)
+        start_dt, end_dt = parse_bounds(start_date, end_date, filter_by_date(base, start_date, end_date))
+        result = compare(base, start_dt, end_dt, ["previous_period"], dimensions={"customer": "CUSTOMER_NAME"}, top=None)
     except Exception:
         return {"anomalies": [], "period": "current"}
 
-    if df_prev.empty:
+    rows = pd.DataFrame(result["breakdowns"].get("customer", []))
+    if rows.empty:
         return {"anomalies": [], "period": "current"}
-
-    cur = df.groupby("CUSTOMER_NAME")["AMOUNT"].sum()
-    prev = df_prev.groupby("CUSTOMER_NAME")["AMOUNT"].sum()
-    common = cur.index.intersection(prev.index)
-    anomalies = []
-    for c in common:
-        pv = float(prev.get(c, 0))
-        cv = float(cur.get(c, 0))
-        if pv > 0 and cv < pv:
-            pct = (cv - pv) / pv * 100
-            if pct <= -drop_threshold_pct:
-                anomalies.append({"entity": c, "entity_type": "customer", "current_revenue": cv, "previous_revenue": pv, "change_pct": round(pct, 1)})
-    anomalies.sort(key=lambda x: x["change_pct"])
+    drops = rows[(rows["current"] > 0) & (rows["previous_period"] > 0) & (rows["previous_period_pct"].astype(float) <= -drop_threshold_pct)]
+    drops = drops.sort_values("previous_period_pct", kind="mergesort")
+    anomalies = [
+        {"entity": r.key, "entity_type": "customer", "current_revenue": float(r.current), "previous_revenue": float(r.previous_period), "change_pct": float(r.previous_period_pct)}
+        for r in drops.itertuples(index=False)
+    ]
     return {"anomalies": anomalies[:20], "period": "current"}
+
+
+COMPARE_DIMENSIONS = {"customer": "CUSTOMER_NAME", "state": "STATE", "city": "CITY", "material_group": None}
+
+
+@router.get("/analytics/compare")
+def get_comparison(
+    tenant_id: str = "default_elettro",
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    windows: str = "previous_period,last_year,prev_fytd",
+    dimensions: Optional[str] = "customer,state,material_group",
+    top: int = 20,
+    states: Optional[str] = None,
+    cities: Optional[str] = None,
+    customers: Optional[str] = None,
+    material_groups: Optional[str] = None,
+    fiscal_years: Optional[str] = None,
+    months: Optional[str] = None,
+):
+    """KPIs and per-dimension revenue for the current window vs several comparison windows, with aligned deltas."""
+    from .comparison import compare, parse_bounds
+    from .db import filter_by_date
+
+    window_list = [w.strip() for w in windows.split(",") if w.strip()]
+    dim_names = [d.strip() for d in (dimensions or "").split(",") if d.strip()]
+    unknown = [d for d in dim_names if d not in COMPARE_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension(s): {', '.join(unknown)}. Use: {', '.join(COMPARE_DIMENSIONS)}.")
+
+    base = apply_filters(get_tenant_data(tenant_id), states, cities, customers, material_groups, fiscal_years, months)
+    dims = {}
+    for d in dim_names:
+        col = COMPARE_DIMENSIONS[d] or _material_group_column(base)
+        if col:
+            dims[d] = col
+    start_dt, end_dt = parse_bounds(start_date, end_date, filter_by_date(base, start_date, end_date))
+    return compare(base, start_dt, end_dt, window_list, dimensions=dims, top=max(1, min(top, 1000)))
+
+
+@router.get("/analytics/anomalies/statistical")
+def get_statistical_anomalies(
+    tenant_id: str = "default_elettro",
+    dimensions: Optional[str] = None,
+    min_z: Optional[float] = None,
+    limit: int = 50,
+):
+    """Ranked monthly revenue anomalies (robust z-score vs rolling median) across customers, states and material groups."""
+    from .anomalies import DIMENSIONS, EVAL_MONTHS, MIN_Z, WINDOW_MONTHS, get_anomalies
+
+    dim_list = [d.strip() for d in (dimensions or "").split(",") if d.strip()]
+    unknown = [d for d in dim_list if d not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension(s): {', '.join(unknown)}. Use: {', '.join(DIMENSIONS)}.")
+    result = get_anomalies(tenant_id)
+    if result is None:
+        return {"anomalies": [], "window_months": WINDOW_MONTHS, "eval_months": EVAL_MONTHS}
+    timing.note_path("cache")
+    rows = result["anomalies"]
+    if dim_list:
+        rows = [a for a in rows if a["dimension"] in dim_list]
+    if min_z is not None and min_z > MIN_Z:
+        rows = [a for a in rows if abs(a["z_score"]) >= min_z]
+    return {
+        "anomalies": rows[: max(1, min(limit, 1000))],
+        "total": len(rows),
+        "window_months": WINDOW_MONTHS,
+        "eval_months": EVAL_MONTHS,
+        "computed_at": datetime.fromtimestamp(result["computed_at"]).isoformat(),
+        "stale": bool(result.get("stale")),
+    }
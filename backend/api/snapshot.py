@@ -0,0 +1,173 @@
+"""
+Columnar tenant snapshots (Arrow IPC files) for sharing tenant data with worker processes.
+
+The API process writes the cached tenant frame once per frame object (an upload, a TTL
+reload from the DB or a warm restore each install a new one, while the data version only
+moves on changes this process made); worker processes memory-map the file and keep the
+decoded frame for reuse, so a heavy task only receives a file path instead of a pickled
+DataFrame. Requires pyarrow; callers fall back
+to in-process work when a snapshot cannot be written.
+
+Warm snapshots (WARM_DIR/<tenant>.arrow) outlive the process: every DB load of a tenant
+frame is written there in the background and deleted when the tenant's data changes, so
+the boot warm-up (warmup.py) can restore a recent frame without a DB round trip.
+"""
+import glob
+import itertools
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+import pandas as pd
+
+from .db import get_cached_tenant_df, get_tenant_version
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "elettro_snapshots"))
+# Generations are per process, so file names carry a boot token to never pick up a file
+# written by a previous run (or another worker) for the same generation number.
+_BOOT_TOKEN = f"{os.getpid()}-{int(time.time())}"
+_generations = itertools.count(1)
+# Decoded frames kept per process (API process and each pool worker).
+SNAPSHOT_FRAME_CACHE = int(os.environ.get("SNAPSHOT_FRAME_CACHE", "2"))
+WARM_DIR = os.path.join(SNAPSHOT_DIR, "warm")
+
+_write_locks: dict = {}
+_write_locks_guard = threading.Lock()
+_frames: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+_frames_lock = threading.Lock()
+# tenant -> (weakref to the cached frame the snapshot was written from, snapshot path)
+_written: dict = {}
+
+
+def _safe_name(tenant_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", tenant_id) or "_"
+
+
+def snapshot_path(tenant_id: str, generation: int) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{_safe_name(tenant_id)}.{_BOOT_TOKEN}.v{generation}.arrow")
+
+
+def _tenant_lock(tenant_id: str) -> threading.Lock:
+    with _write_locks_guard:
+        return _write_locks.setdefault(tenant_id, threading.Lock())
+
+
+def write_snapshot(df: pd.DataFrame, path: str) -> None:
+    """Write `df` as an uncompressed Arrow IPC file (mmap-friendly), atomically."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+
+
+def _current(tenant_id: str, df: pd.DataFrame) -> Optional[str]:
+    entry = _written.get(tenant_id)
+    if entry is not None and entry[0]() is df and os.path.exists(entry[1]):
+        return entry[1]
+    return None
+
+
+def ensure_snapshot(tenant_id: str) -> Optional[str]:
+    """Path of the snapshot of the tenant's current cached frame, writing it if needed. None if unavailable."""
+    df = get_cached_tenant_df(tenant_id)
+    if df is None or df.empty:
+        return None
+    path = _current(tenant_id, df)
+    if path is not None:
+        return path
+    with _tenant_lock(tenant_id):
+        path = _current(tenant_id, df)
+        if path is not None:
+            return path
+        path = snapshot_path(tenant_id, next(_generations))
+        try:
+            write_snapshot(df, path)
+        except Exception as e:
+            logging.warning("snapshot: could not write %s: %s", path, e)
+            return None
+        _written[tenant_id] = (weakref.ref(df), path)
+        # Older snapshots of this tenant from this process are no longer reachable
+        pattern = os.path.join(SNAPSHOT_DIR, f"{_safe_name(tenant_id)}.{_BOOT_TOKEN}.v*.arrow")
+        for old in glob.glob(pattern):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    return path
+
+
+def read_snapshot(path: str) -> pd.DataFrame:
+    """Decode a snapshot (memory-mapped) and keep it for reuse. Callers must not mutate the result."""
+    with _frames_lock:
+        df = _frames.get(path)
+        if df is not None:
+            _frames.move_to_end(path)
+            return df
+    import pyarrow.feather as feather
+
+    df = feather.read_table(path, memory_map=True).to_pandas()
+    with _frames_lock:
+        _frames[path] = df
+        while len(_frames) > max(1, SNAPSHOT_FRAME_CACHE):
+            _frames.popitem(last=False)
+    return df
+
+
+def warm_snapshot_path(tenant_id: str) -> str:
+    return os.path.join(WARM_DIR, f"{_safe_name(tenant_id)}.arrow")
+
+
+def schedule_warm_snapshot(tenant_id: str, df: pd.DataFrame, version: int) -> None:
+    """Write the tenant's warm snapshot in a daemon thread (skipped if its data changes meanwhile)."""
+    if df is None or df.empty:
+        return
+
+    def run():
+        if get_tenant_version(tenant_id) != version:
+            return
+        try:
+            with _tenant_lock(tenant_id):
+                write_snapshot(df, warm_snapshot_path(tenant_id))
+                # An upload that landed during the write invalidated this frame
+                if get_tenant_version(tenant_id) != version:
+                    discard_warm_snapshot(tenant_id)
+        except Exception as e:
+            logging.warning("snapshot: could not write warm snapshot for %s: %s", tenant_id, e)
+
+    threading.Thread(target=run, name=f"warm-snapshot-{tenant_id}", daemon=True).start()
+
+
+def read_warm_snapshot(tenant_id: str, max_age: float) -> Optional[pd.DataFrame]:
+    """The tenant's warm snapshot as a private frame if it is younger than max_age seconds, else None."""
+    path = warm_snapshot_path(tenant_id)
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+    if age > max_age:
+        return None
+    try:
+        import pyarrow.feather as feather
+
+        return feather.read_table(path, memory_map=False).to_pandas()
+    except Exception as e:
+        logging.warning("snapshot: could not read warm snapshot %s: %s", path, e)
+        return None
+
+
+def discard_warm_snapshot(tenant_id: str) -> None:
+    try:
+        os.remove(warm_snapshot_path(tenant_id))
+    except OSError:
+        pass
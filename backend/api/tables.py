@@ -0,0 +1,207 @@
+"""
+Server-side pagination, sorting and search for large table endpoints.
+
+The aggregate behind a table (customers, RFM, item details) is built once per
+(table, tenant, data version, filters). Each (sort, order, q) view of it is derived from
+that aggregate (a search plus a sort, no new groupby), stored pre-sorted, and paged with a
+keyset cursor: the cursor carries the key of the last row served, and the cached view
+maps every key to its position, so page 2..N is a dict lookup plus a slice.
+"""
+import base64
+import json
+import os
+import threading
+from typing import Awaitable, Callable, List, Optional
+
+import pandas as pd
+from cachetools import TTLCache
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from . import timing
+from .db import get_tenant_version
+
+MAX_PAGE_SIZE = 1000
+
+# Entries are keyed on the tenant data version, so uploads never serve stale pages;
+# the TTL only bounds memory for filter combinations that are no longer being browsed.
+# aggregate_cache holds built aggregates, table_cache the sorted/searched views of them.
+aggregate_cache = TTLCache(maxsize=int(os.environ.get("TABLE_AGGREGATE_CACHE_SIZE", "32")), ttl=30 * 60)
+table_cache = TTLCache(maxsize=int(os.environ.get("TABLE_CACHE_SIZE", "64")), ttl=30 * 60)
+_table_cache_lock = threading.Lock()
+
+
+class _SortedTable:
+    __slots__ = ("frame", "key_cols", "_positions")
+
+    def __init__(self, frame: pd.DataFrame, key_cols: List[str]):
+        self.frame = frame
+        self.key_cols = key_cols
+        self._positions = None
+
+    def position_after(self, key: list) -> Optional[int]:
+        """Index of the row following `key`, or None if the key is not in this table."""
+        if self._positions is None:
+            keys = self.frame[self.key_cols].astype(str).itertuples(index=False, name=None)
+            self._positions = {k: i for i, k in enumerate(keys)}
+        pos = self._positions.get(tuple(str(k) for k in key))
+        return None if pos is None else pos + 1
+
+
+def filter_key(*values) -> tuple:
+    """Normalize request filters (strip, drop empties, sort comma lists) into a hashable cache key."""
+    out = []
+    for v in values:
+        if v is None or not str(v).strip():
+            out.append(None)
+        elif isinstance(v, str) and "," in v:
+            out.append(",".join(sorted(p.strip() for p in v.split(",") if p.strip())))
+        else:
+            out.append(str(v).strip())
+    return tuple(out)
+
+
+def encode_cursor(key: list) -> str:
+    raw = json.dumps([str(k) for k in key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(cursor + pad).decode("utf-8"))
+        if not isinstance(key, list):
+            raise ValueError("cursor is not a key list")
+        return key
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _sorted_table(
+    df: pd.DataFrame,
+    key_cols: List[str],
+    sort: str,
+    order: str,
+    q: Optional[str],
+    search_cols: List[str],
+) -> _SortedTable:
+    if df is None or df.empty:
+        return _SortedTable(pd.DataFrame(), key_cols)
+    if sort not in df.columns:
+        raise HTTPException(status_code=400, detail=f"Cannot sort by '{sort}'. Sortable columns: {', '.join(map(str, df.columns))}.")
+    if q and q.strip():
+        needle = q.strip()
+        mask = pd.Series(False, index=df.index)
+        for col in search_cols:
+            if col in df.columns:
+                mask |= df[col].astype(str).str.contains(needle, case=False, regex=False, na=False)
+        df = df[mask]
+    ascending = order != "desc"
+    # Key columns break ties so the order (and therefore every cursor) is deterministic
+    by = [sort] + [k for k in key_cols if k != sort]
+    df = df.sort_values(by, ascending=[ascending] + [True] * (len(by) - 1), na_position="last", kind="mergesort")
+    return _SortedTable(df.reset_index(drop=True), key_cols)
+
+
+def _normalize(sort, order, q, default_sort, default_order):
+    sort = sort or default_sort
+    order = (order or default_order).lower()
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'.")
+    q_norm = q.strip() if q and q.strip() else None
+    return sort, order, q_norm
+
+
+def _lookup(cache: TTLCache, key: tuple):
+    with _table_cache_lock:
+        return cache.get(key)
+
+
+def _store(cache: TTLCache, key: tuple, entry) -> None:
+    with _table_cache_lock:
+        cache[key] = entry
+
+
+def _page(entry: _SortedTable, sort: str, order: str, limit: Optional[int], cursor: Optional[str]):
+    frame = entry.frame
+    if limit is None and cursor is None:
+        return frame, None
+
+    limit = max(1, min(int(limit or 100), MAX_PAGE_SIZE))
+    start = 0
+    if cursor:
+        start = entry.position_after(decode_cursor(cursor))
+        if start is None:
+            raise HTTPException(status_code=400, detail="Cursor no longer matches this table (data or filters changed). Restart from the first page.")
+    page = frame.iloc[start:start + limit]
+    end = start + len(page)
+    next_cursor = None
+    if end < len(frame) and not page.empty:
+        next_cursor = encode_cursor(list(page.iloc[-1][entry.key_cols]))
+    return page, {"total": len(frame), "limit": limit, "next_cursor": next_cursor, "sort": sort, "order": order}
+
+
+def table_page(
+    table: str,
+    tenant_id: str,
+    filters: tuple,
+    build: Callable[[], pd.DataFrame],
+    key_cols: List[str],
+    search_cols: List[str],
+    default_sort: str,
+    default_order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """
+    Serve one page of a cached, pre-sorted aggregate.
+    Returns (frame, page_info); page_info is None when the caller did not ask for paging
+    (no limit and no cursor), in which case the whole sorted/searched table is returned.
+    """
+    sort, order, q_norm = _normalize(sort, order, q, default_sort, default_order)
+    base = (table, tenant_id, get_tenant_version(tenant_id), filters)
+    entry = _lookup(table_cache, base + (sort, order, q_norm))
+    if entry is not None:
+        timing.note_path("cache")
+    if entry is None:
+        df = _lookup(aggregate_cache, base)
+        if df is None:
+            df = build()
+            _store(aggregate_cache, base, df)
+        entry = _sorted_table(df, key_cols, sort, order, q_norm, search_cols)
+        _store(table_cache, base + (sort, order, q_norm), entry)
+    return _page(entry, sort, order, limit, cursor)
+
+
+async def table_page_async(
+    table: str,
+    tenant_id: str,
+    filters: tuple,
+    build: Callable[[], Awaitable[pd.DataFrame]],
+    key_cols: List[str],
+    search_cols: List[str],
+    default_sort: str,
+    default_order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: Optional[str] = None,
+    q: Optional[str] = None,
+):
+    """table_page for aggregates built by an awaitable (e.g. in a worker process); same return value."""
+    sort, order, q_norm = _normalize(sort, order, q, default_sort, default_order)
+    base = (table, tenant_id, get_tenant_version(tenant_id), filters)
+    entry = _lookup(table_cache, base + (sort, order, q_norm))
+    if entry is not None:
+        timing.note_path("cache")
+    if entry is None:
+        df = _lookup(aggregate_cache, base)
+        if df is None:
+            df = await build()
+            _store(aggregate_cache, base, df)
+        entry = await run_in_threadpool(_sorted_table, df, key_cols, sort, order, q_norm, search_cols)
+        _store(table_cache, base + (sort, order, q_norm), entry)
+    return await run_in_threadpool(_page, entry, sort, order, limit, cursor)
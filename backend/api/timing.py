@@ -0,0 +1,155 @@
+"""
+Per-request stage timing for analytical endpoints.
+
+ServerTimingMiddleware opens a RequestTiming for every HTTP request (in a context var, so
+sync handlers in the threadpool see the same object). The shared helpers record their
+own stages: get_tenant_data ("load"), apply_filters ("filter"), serialize_df
+("serialize"), pool tasks ("worker"), each with the row count after the stage. Whatever
+is left of the handler time (groupbys, response encoding) is reported as "compute".
+
+Every response gets a Server-Timing header. With ?explain=1 a JSON response is wrapped
+as {"result": <original body>, "explain": {...}} with the same breakdown plus the path
+that answered ("raw" frame or "cache").
+"""
+import contextvars
+import json
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+_current: contextvars.ContextVar = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    __slots__ = ("start", "stages", "path", "explain")
+
+    def __init__(self, explain: bool = False):
+        self.start = time.perf_counter()
+        self.stages: List[dict] = []
+        self.path = "raw"
+        self.explain = explain
+
+    def add(self, name: str, seconds: float, rows: Optional[int] = None) -> None:
+        self.stages.append({"name": name, "ms": round(seconds * 1000, 2), "rows": rows})
+
+    def breakdown(self) -> dict:
+        total_ms = round((time.perf_counter() - self.start) * 1000, 2)
+        staged = sum(s["ms"] for s in self.stages)
+        stages = list(self.stages) + [{"name": "compute", "ms": round(max(total_ms - staged, 0.0), 2), "rows": None}]
+        return {"path": self.path, "total_ms": total_ms, "stages": stages}
+
+    def header(self) -> str:
+        b = self.breakdown()
+        parts = []
+        for s in b["stages"]:
+            part = f'{s["name"]};dur={s["ms"]}'
+            if s["rows"] is not None:
+                part += f';desc="rows={s["rows"]}"'
+            parts.append(part)
+        parts.append(f'total;dur={b["total_ms"]};desc="path={b["path"]}"')
+        return ", ".join(parts)
+
+
+def current() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+class _Stage:
+    __slots__ = ("rows",)
+
+    def __init__(self):
+        self.rows = None
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as a named stage; set `.rows` on the yielded handle to report rows after it."""
+    handle = _Stage()
+    timing = _current.get()
+    if timing is None:
+        yield handle
+        return
+    start = time.perf_counter()
+    try:
+        yield handle
+    finally:
+        timing.add(name, time.perf_counter() - start, handle.rows)
+
+
+def note_path(path: str) -> None:
+    """Record which path answered the request ("raw", "cache", ...)."""
+    timing = _current.get()
+    if timing is not None:
+        timing.path = path
+
+
+def _wants_explain(scope) -> bool:
+    qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return (qs.get("explain", ["0"])[-1] or "").lower() in ("1", "true", "yes")
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI: attach Server-Timing to responses; wrap JSON bodies with the breakdown on ?explain=1."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timing = RequestTiming(explain=_wants_explain(scope))
+        token = _current.set(timing)
+        try:
+            if timing.explain:
+                await self._explain(scope, receive, send, timing)
+            else:
+                await self.app(scope, receive, self._header_sender(send, timing))
+        finally:
+            _current.reset(token)
+
+    @staticmethod
+    def _header_sender(send, timing):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header().encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+        return send_wrapper
+
+    async def _explain(self, scope, receive, send, timing):
+        state = {"start": None, "json": False, "body": []}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                ctype = dict(message.get("headers", [])).get(b"content-type", b"")
+                state["json"] = ctype.startswith(b"application/json")
+                if not state["json"]:
+                    await self._header_sender(send, timing)(message)
+                    return
+                state["start"] = message
+                return
+            if message["type"] == "http.response.body" and state["json"]:
+                state["body"].append(message.get("body", b""))
+                if message.get("more_body", False):
+                    return
+                body = b"".join(state["body"])
+                try:
+                    result = json.loads(body) if body else None
+                except ValueError:
+                    result = body.decode("utf-8", "replace")
+                payload = json.dumps({"result": result, "explain": timing.breakdown()}).encode("utf-8")
+                start = state["start"]
+                headers = [(k, v) for k, v in start.get("headers", []) if k.lower() != b"content-length"]
+                headers.append((b"content-length", str(len(payload)).encode("latin-1")))
+                headers.append((b"server-timing", timing.header().encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*"))
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": payload})
+                return
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,205 @@
+"""
+Prioritized boot warm-up of tenant frames, and the readiness state behind /ready.
+
+Tenant data requests are counted per tenant (record_access) and persisted to a small JSON
+file as exponentially decayed scores, so recent activity dominates. On boot the top
+WARMUP_TENANTS tenants are warmed in priority order, at most WARMUP_PARALLELISM at a time
+so the warm-up never takes more than a few connections from the DB pool. A tenant whose
+warm snapshot (snapshot.py) is younger than WARM_SNAPSHOT_MAX_AGE is restored from that
+file instead of the database. The restored frame then gets a full tenant cache TTL, so the
+max age is kept short: data is never more than TTL + max age old (a quick restart or
+deploy still skips the DB).
+
+The app answers liveness (/) as soon as it is imported; /ready reports 503 until the
+warm-up has finished, then 200 with how long it took from process boot to a warm
+dashboard (tenant frames and filter indexes in memory).
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+
+from . import metrics
+
+DEFAULT_TENANT = "default_elettro"
+ACCESS_FILE = os.environ.get("WARMUP_ACCESS_FILE", os.path.join(tempfile.gettempdir(), "elettro_tenant_access.json"))
+WARMUP_TENANTS = int(os.environ.get("WARMUP_TENANTS", "5"))
+# Concurrent warm-up loads (each holds one DB connection while it reads)
+WARMUP_PARALLELISM = int(os.environ.get("WARMUP_PARALLELISM", "2"))
+# Oldest warm snapshot restored on boot instead of loading from the DB
+WARM_SNAPSHOT_MAX_AGE = float(os.environ.get("WARM_SNAPSHOT_MAX_AGE", "600"))
+# Access scores halve every week; counts are flushed to disk at most this often
+HALF_LIFE_SECONDS = 7 * 24 * 3600
+FLUSH_INTERVAL_SECONDS = 60
+# Tenants kept in the access file (lowest scores dropped)
+MAX_TRACKED_TENANTS = 200
+
+_state = {
+    "status": "pending",  # pending -> warming -> ready
+    "boot_time": time.time(),
+    "started_at": None,
+    "finished_at": None,
+    "tenants": {},
+    "error": None,
+}
+_lock = threading.Lock()
+
+# Accesses since the last flush, and when that was
+_pending: Counter = Counter()
+_last_flush = time.time()
+_access_lock = threading.Lock()
+
+WARMUP_TENANT_SECONDS = metrics.histogram("warmup_tenant_seconds", "Time to warm one tenant frame on boot.", ("source",))
+metrics.callback("warmup_ready", "1 once the startup warm-up has finished.", lambda: 1 if _state["status"] == "ready" else 0)
+metrics.callback("warmup_seconds_since_boot", "Seconds from process boot to a warm dashboard (0 until ready).", lambda: ready_after() or 0)
+
+
+# ─── access frequency ───
+
+def _read_scores() -> dict:
+    try:
+        with open(ACCESS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _decayed(entry: dict, now: float) -> float:
+    age = max(0.0, now - float(entry.get("updated", now)))
+    return float(entry.get("score", 0.0)) * 0.5 ** (age / HALF_LIFE_SECONDS)
+
+
+def record_access(tenant_id: str) -> None:
+    """Count a data request for the tenant; flushes to the access file at most once a minute."""
+    global _last_flush
+    with _access_lock:
+        _pending[tenant_id] += 1
+        if time.time() - _last_flush < FLUSH_INTERVAL_SECONDS:
+            return
+        _last_flush = time.time()
+    threading.Thread(target=flush, name="warmup-access-flush", daemon=True).start()
+
+
+def flush() -> None:
+    """Merge pending access counts into the access file (atomic replace)."""
+    with _access_lock:
+        counts = dict(_pending)
+        _pending.clear()
+    if not counts:
+        return
+    now = time.time()
+    try:
+        scores = _read_scores()
+        for tenant_id, n in counts.items():
+            scores[tenant_id] = {"score": _decayed(scores.get(tenant_id, {}), now) + n, "updated": now}
+        if len(scores) > MAX_TRACKED_TENANTS:
+            keep = sorted(scores, key=lambda t: -_decayed(scores[t], now))[:MAX_TRACKED_TENANTS]
+            scores = {t: scores[t] for t in keep}
+        os.makedirs(os.path.dirname(ACCESS_FILE) or ".", exist_ok=True)
+        tmp = f"{ACCESS_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(scores, f)
+        os.replace(tmp, ACCESS_FILE)
+    except Exception as e:
+        logging.warning("warm-up: could not persist tenant access counts: %s", e)
+
+
+def priority_tenants(limit: int = WARMUP_TENANTS) -> List[str]:
+    """Tenants to warm, most accessed first; the default tenant is always included."""
+    now = time.time()
+    scores = {t: _decayed(e, now) for t, e in _read_scores().items() if isinstance(e, dict)}
+    with _access_lock:
+        pending = dict(_pending)
+    for tenant_id, n in pending.items():
+        scores[tenant_id] = scores.get(tenant_id, 0.0) + n
+    ranked = sorted(scores, key=lambda t: (-scores[t], t))[: max(1, limit)]
+    if DEFAULT_TENANT not in ranked:
+        ranked = ranked[: max(0, limit - 1)] + [DEFAULT_TENANT]
+    return ranked
+
+
+# ─── boot warm-up ───
+
+def _warm_one(tenant_id: str) -> None:
+    from .db import get_cached_tenant_df, get_tenant_version, prime_tenant_cache
+
+    start = time.time()
+    source = "db"
+    df = None
+    try:
+        from .snapshot import read_warm_snapshot
+
+        version = get_tenant_version(tenant_id)
+        df = read_warm_snapshot(tenant_id, max_age=WARM_SNAPSHOT_MAX_AGE)
+        if df is not None and get_tenant_version(tenant_id) == version:
+            prime_tenant_cache(tenant_id, df)
+            source = "snapshot"
+        else:
+            df = None
+    except Exception as e:
+        logging.warning("warm-up: snapshot restore failed for %s: %s", tenant_id, e)
+    if df is None:
+        df = get_cached_tenant_df(tenant_id)
+    seconds = time.time() - start
+    WARMUP_TENANT_SECONDS.observe(seconds, source=source)
+    with _lock:
+        _state["tenants"][tenant_id] = {"rows": len(df), "seconds": round(seconds, 3), "source": source}
+
+
+def _run(tenants: List[str]) -> None:
+    try:
+        # Submitted in priority order: the busiest tenants get the first DB connections
+        with ThreadPoolExecutor(max_workers=max(1, WARMUP_PARALLELISM), thread_name_prefix="warmup") as pool:
+            for future in [pool.submit(_warm_one, t) for t in tenants]:
+                try:
+                    future.result()
+                except Exception as e:
+                    logging.error("warm-up failed: %s", e)
+                    with _lock:
+                        _state["error"] = str(e)
+    finally:
+        with _lock:
+            _state["finished_at"] = time.time()
+            _state["status"] = "ready"
+        logging.info("warm-up of %d tenant(s) finished %.2fs after boot", len(tenants), ready_after())
+
+
+def start(tenants: Optional[Iterable[str]] = None, boot_time: Optional[float] = None) -> None:
+    """Warm tenants (default: priority_tenants()) in a background thread, once. boot_time: process start."""
+    with _lock:
+        if _state["status"] != "pending":
+            return
+        if boot_time is not None:
+            _state["boot_time"] = boot_time
+        _state["status"] = "warming"
+        _state["started_at"] = time.time()
+
+    def run():
+        from .db import tenant_cache
+
+        # More tenants than the frame cache holds would just evict each other
+        _run(list(tenants) if tenants is not None else priority_tenants(min(WARMUP_TENANTS, tenant_cache.maxsize)))
+
+    threading.Thread(target=run, name="warmup", daemon=True).start()
+
+
+def ready_after() -> Optional[float]:
+    """Seconds from boot until warm-up finished, or None while still warming."""
+    finished = _state["finished_at"]
+    return None if finished is None else round(finished - _state["boot_time"], 3)
+
+
+def status() -> dict:
+    with _lock:
+        return {
+            "status": _state["status"],
+            "ready_after_seconds": ready_after(),
+            "tenants": dict(_state["tenants"]),
+            "error": _state["error"],
+        }
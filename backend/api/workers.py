@@ -0,0 +1,180 @@
+"""
+Managed process pool for heavy endpoint work (PDF generation, item details, RFM).
+Exports stream from the API process instead (see export_filtered_data).
+
+Sync handlers in the threadpool cannot be stopped: after the edge timeout (EdgeMiddleware in edge.py) answers 504 they
+keep running and holding the GIL. Here each task runs in a worker process; on timeout,
+client disconnect or request cancellation the worker is killed and replaced, so the CPU is
+actually freed. Tenant data reaches workers as a columnar snapshot path (see snapshot.py).
+
+Set WORKER_PROCESSES=0 to run tasks in the threadpool instead (same task functions).
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from typing import Optional
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from . import timing
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", str(min(2, os.cpu_count() or 1))))
+# Below the edge timeout (REQUEST_TIMEOUT_SECONDS, default 60s) so the pool answers (and kills the worker) first.
+WORKER_TASK_TIMEOUT = float(os.environ.get("WORKER_TASK_TIMEOUT", "55"))
+POLL_INTERVAL = 0.25
+
+
+def _worker_main(conn) -> None:
+    """Worker loop: receive (fn, args), run it, send ("ok", result), ("http", fields) or ("err", exception)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return
+        if msg is None:
+            return
+        fn, args = msg
+        try:
+            reply = ("ok", fn(*args))
+        except HTTPException as e:
+            # HTTPException does not survive pickling; send its fields instead
+            reply = ("http", (e.status_code, e.detail, e.headers))
+        except BaseException as e:
+            reply = ("err", e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # Result or exception not picklable
+            conn.send(("err", RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+            self.process.join(timeout=2)
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class ProcessPool:
+    """Fixed-size pool of spawned worker processes with per-task cancellation."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: list = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.size)
+            self._slots_loop = loop
+        return self._slots
+
+    def _checkout(self) -> _Worker:
+        while self._idle:
+            worker = self._idle.pop()
+            if worker.alive():
+                return worker
+            worker.kill()
+        return _Worker(self._ctx)
+
+    async def run(self, fn, *args, timeout: float = WORKER_TASK_TIMEOUT, request: Optional[Request] = None):
+        """Run fn(*args) in a worker. Kills the worker on timeout (504), disconnect (499) or cancellation."""
+        async with self._semaphore():
+            worker = await run_in_threadpool(self._checkout)
+            deadline = time.monotonic() + timeout
+            try:
+                worker.conn.send((fn, args))
+                while True:
+                    if await asyncio.to_thread(worker.conn.poll, POLL_INTERVAL):
+                        status, payload = await asyncio.to_thread(worker.conn.recv)
+                        break
+                    if time.monotonic() > deadline:
+                        raise HTTPException(status_code=504, detail="Request timed out. Please try again with a smaller dataset or narrower filters.")
+                    if request is not None and await request.is_disconnected():
+                        raise HTTPException(status_code=499, detail="Client closed request.")
+            except BaseException:
+                # Timeout, disconnect, cancellation or a crashed worker: the process may be
+                # mid-task, so it cannot be reused.
+                worker.kill()
+                raise
+            self._idle.append(worker)
+        if status == "http":
+            status_code, detail, headers = payload
+            raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+        if status == "err":
+            raise payload
+        return payload
+
+    def shutdown(self) -> None:
+        while self._idle:
+            self._idle.pop().kill()
+
+
+_pool: Optional[ProcessPool] = None
+
+
+def get_pool() -> Optional[ProcessPool]:
+    global _pool
+    if WORKER_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        _pool = ProcessPool(WORKER_PROCESSES)
+    return _pool
+
+
+def load_frame(source: Optional[str], tenant_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """Tenant frame for a task: from the snapshot at `source` (worker) or the in-process cache (source=None)."""
+    from .db import filter_by_date, get_tenant_data
+
+    if source is None:
+        return get_tenant_data(tenant_id, start_date, end_date)
+    from .snapshot import read_snapshot
+
+    df = read_snapshot(source)
+    filtered = filter_by_date(df, start_date, end_date)
+    # The decoded snapshot is shared across tasks in this worker; hand out a private frame
+    return filtered.copy() if filtered is df else filtered
+
+
+async def run_tenant_task(request: Optional[Request], fn, tenant_id: str, *args, offload: bool = True):
+    """
+    Run fn(source, tenant_id, *args) for a tenant. With a pool and a snapshot the task runs in a
+    worker process with source=<snapshot path>; otherwise in the threadpool with source=None.
+    """
+    pool = get_pool() if offload else None
+    source = None
+    if pool is not None:
+        from .snapshot import ensure_snapshot
+
+        source = await run_in_threadpool(ensure_snapshot, tenant_id)
+        if source is None:
+            logging.info("workers: no snapshot for %s, running %s in-process", tenant_id, getattr(fn, "__name__", fn))
+    if pool is None or source is None:
+        return await run_in_threadpool(fn, None, tenant_id, *args)
+    # Stages inside the worker are not visible here; the whole task is reported as one stage
+    with timing.stage("worker"):
+        return await pool.run(fn, source, tenant_id, *args, request=request)
@@ -1,12 +1,13 @@
 import os
 import sys
+import time
+
+# Process boot reference for /ready (time to a warm dashboard)
+BOOT_TIME = time.time()
 
 # Surface startup errors so Render logs show the traceback
 try:
-    from fastapi import FastAPI, Request, HTTPException
-    from fastapi.middleware.cors import CORSMiddleware
-    import asyncio
-    from starlette.middleware.base import BaseHTTPMiddleware
+    from fastapi import FastAPI
     from api.routes import router as api_router
 except Exception as e:
     print(f"Startup error: {e}", file=sys.stderr)
@@ -19,70 +20,74 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# CORS: allow any origin (frontend doesn't send credentials to API).
-REQUEST_TIMEOUT_SECONDS = 60
-
-
-class TimeoutMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        try:
-            return await asyncio.wait_for(call_next(request), timeout=REQUEST_TIMEOUT_SECONDS)
-        except asyncio.TimeoutError:
-            raise HTTPException(status_code=504, detail="Request timed out. Please try again with a smaller dataset or narrower filters.")
-
-
-class CorsAllMiddleware(BaseHTTPMiddleware):
-    """Ensure CORS headers on every response so browser never sees 'No Access-Control-Allow-Origin'."""
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            from starlette.responses import Response
-            return Response(
-                status_code=200,
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-                    "Access-Control-Allow-Headers": "*",
-                    "Access-Control-Max-Age": "86400",
-                },
-            )
-        response = await call_next(request)
-        response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "*"
-        return response
-
-
-from starlette.middleware.gzip import GZipMiddleware
-app.add_middleware(GZipMiddleware, minimum_size=500)
-app.add_middleware(CorsAllMiddleware)
-app.add_middleware(TimeoutMiddleware)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=False,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
-)
+# Innermost (added first): sees the uncompressed JSON body, so ?explain=1 can wrap it
+from api.timing import ServerTimingMiddleware
+app.add_middleware(ServerTimingMiddleware)
+
+# Repeat analytical GETs are answered here, already compressed (the edge layer skips them)
+from api.response_cache import ResponseCacheMiddleware
+app.add_middleware(ResponseCacheMiddleware)
+# Inside the edge layer so 429 responses still carry CORS headers
+from api.admission import AdmissionMiddleware
+app.add_middleware(AdmissionMiddleware)
+# CORS (any origin) + request timeout + gzip, one pure-ASGI layer
+from api.edge import EdgeMiddleware
+app.add_middleware(EdgeMiddleware)
+
+# Outermost (added last) so latency and status include every other middleware, incl. timeouts
+from api.metrics import MetricsMiddleware
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(api_router, prefix="/api")
 
 
 @app.on_event("startup")
 def _warm_cache():
-    """Pre-load the default tenant data into cache so the first dashboard request is fast."""
+    """Pre-load the most used tenants' data into cache (background thread) so their first dashboard request is fast."""
     try:
-        from api.db import get_cached_tenant_df
-        import threading
-        threading.Thread(target=get_cached_tenant_df, args=("default_elettro",), daemon=True).start()
+        from api import warmup
+        warmup.start(boot_time=BOOT_TIME)
     except Exception:
         pass
 
 
+@app.on_event("startup")
+def _start_upload_jobs():
+    """Start the upload job workers; jobs interrupted by the last shutdown are re-queued from the journal."""
+    from api import jobs
+    jobs.start()
+
+
+@app.on_event("shutdown")
+def _stop_workers():
+    """Terminate idle process-pool workers (heavy report/export tasks) on shutdown; persist tenant access counts."""
+    from api import warmup
+    warmup.flush()
+    from api.workers import _pool
+    if _pool is not None:
+        _pool.shutdown()
+
+
 @app.api_route("/", methods=["GET", "HEAD"])
 def read_root():
+    """Liveness: answers as soon as the app is imported, before any data is loaded."""
     return {"status": "ok", "message": "ELETTRO Intelligence API is running."}
 
+@app.api_route("/ready", methods=["GET", "HEAD"])
+def readiness():
+    """Readiness: 503 until the startup warm-up has loaded the tenant data, then 200."""
+    from starlette.responses import JSONResponse
+    from api import warmup
+    state = warmup.status()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus text-format metrics: per-route latency/errors, tenant cache, DB pool, uploads, PDFs."""
+    from starlette.responses import Response
+    from api import metrics
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/version")
 def version_check():
     """Diagnostic endpoint: returns fpdf version info to confirm fpdf2 is loaded."""
@@ -67,6 +67,9 @@ async function proxy(
             } else if (contentType?.includes("multipart/form-data")) {
                 init.body = await request.arrayBuffer();
                 headers.set("content-type", contentType);
+            } else if (request.body) {
+                // Raw bodies, e.g. application/octet-stream parts of a chunked upload
+                init.body = await request.arrayBuffer();
             }
         }
 
@@ -83,21 +86,28 @@ async function proxy(
         resHeaders.set("Access-Control-Allow-Origin", "*");
         resHeaders.set("Content-Encoding", "identity");
 
-        // Detect if response is binary (PDF, images, etc.) - must NOT run through res.text() / TextEncoder
-        // as that would mangle bytes > 127 and produce a corrupt/blank PDF.
+        // Detect if response is binary (PDF, Parquet, gzip, images, etc.) - must NOT run through res.text() /
+        // TextEncoder as that would mangle bytes > 127 and produce a corrupt/blank file.
+        // Anything that is not text, JSON or XML is passed through as raw bytes.
         const contentType = (res.headers.get("content-type") || "").toLowerCase();
-        const isBinary =
-            contentType.includes("pdf") ||
-            contentType.includes("octet-stream") ||
-            contentType.startsWith("image/") ||
-            contentType.includes("zip") ||
-            contentType.includes("excel") ||
-            contentType.includes("spreadsheet");
+        const isText =
+            contentType.startsWith("text/") ||
+            contentType.includes("json") ||
+            contentType.includes("xml") ||
+            contentType.includes("javascript") ||
+            contentType.includes("x-www-form-urlencoded");
+        const isBinary = contentType !== "" && !isText;
 
         if (res.status === 204 || res.status === 304) {
             return new NextResponse(null, { status: res.status, statusText: res.statusText, headers: resHeaders });
         }
 
+        if (contentType.includes("text/event-stream") && res.body) {
+            // Server-sent events: pass the stream through unbuffered
+            resHeaders.set("Cache-Control", "no-cache");
+            return new NextResponse(res.body, { status: res.status, statusText: res.statusText, headers: resHeaders });
+        }
+
         if (isBinary) {
             // Stream the raw bytes directly — do NOT convert to text
             const arrayBuf = await res.arrayBuffer();
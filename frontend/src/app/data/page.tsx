@@ -4,7 +4,7 @@ import { useState, useCallback, useEffect } from "react";
 import { useDropzone } from "react-dropzone";
 import { UploadCloud, FileSpreadsheet, CheckCircle2, AlertCircle, Loader2, Activity } from "lucide-react";
 import { useFilter } from "@/components/FilterContext";
-import { fetchDataHealth, API_BASE_URL } from "@/lib/api";
+import { fetchDataHealth, uploadFileChunked, API_BASE_URL } from "@/lib/api";
 
 export default function DataUploadPage() {
     const { tenant } = useFilter();
@@ -12,6 +12,7 @@ export default function DataUploadPage() {
     const [status, setStatus] = useState<"idle" | "uploading" | "success" | "error">("idle");
     const [message, setMessage] = useState("");
     const [progress, setProgress] = useState({ current: 0, total: 0 });
+    const [stage, setStage] = useState("");
     const [health, setHealth] = useState<{ total_rows: number; missing_dates: number; duplicate_invoices: number; negative_amounts: number; score: number; status: string; message: string } | null>(null);
     const [healthLoading, setHealthLoading] = useState(true);
 
@@ -52,33 +53,26 @@ export default function DataUploadPage() {
         setStatus("uploading");
         setProgress({ current: 0, total: files.length });
         let totalRows = 0;
+        let unchanged = 0;
         let failedFiles: string[] = [];
 
         for (let i = 0; i < files.length; i++) {
             setProgress({ current: i + 1, total: files.length });
-            const formData = new FormData();
-            formData.append("file", files[i]);
-            formData.append("tenant_id", tenant);
-
             try {
-                const response = await fetch(`${API_BASE_URL}/upload`, {
-                    method: "POST",
-                    body: formData,
-                });
-                const result = await response.json();
-                if (response.ok) {
-                    totalRows += result.rows_inserted || 0;
-                } else {
-                    failedFiles.push(`${files[i].name}: ${result.detail || "failed"}`);
-                }
-            } catch {
-                failedFiles.push(`${files[i].name}: network error`);
+                setStage("uploading");
+                const result = await uploadFileChunked(files[i], tenant, undefined, (job) =>
+                    setStage(job.status === "queued" ? "queued" : `${job.stage} ${Math.round(job.percent)}%`));
+                totalRows += result.rows_inserted || 0;
+                if (result.duplicate) unchanged++;
+            } catch (e) {
+                failedFiles.push(`${files[i].name}: ${e instanceof Error ? e.message : "network error"}`);
             }
         }
 
         if (failedFiles.length === 0) {
             setStatus("success");
-            setMessage(`Successfully processed ${files.length} file${files.length > 1 ? "s" : ""} — ${totalRows.toLocaleString()} rows inserted.`);
+            setMessage(`Successfully processed ${files.length} file${files.length > 1 ? "s" : ""} — ${totalRows.toLocaleString()} rows inserted.`
+                + (unchanged ? ` ${unchanged} file${unchanged > 1 ? "s were" : " was"} already uploaded.` : ""));
             setFiles([]);
         } else if (failedFiles.length < files.length) {
             setStatus("success");
@@ -105,7 +99,7 @@ export default function DataUploadPage() {
             const data = await res.json();
             if (res.ok) {
                 setMasterStatus("success");
-                setMasterMsg(`Customer master loaded: ${data.rows} rows, columns: ${data.columns?.join(", ")}`);
+                setMasterMsg(`Customer master saved: ${data.customers} customers (${data.rows} rows), columns: ${data.columns?.join(", ")}`);
             } else {
                 setMasterStatus("error");
                 setMasterMsg(data.detail || "Upload failed.");
@@ -289,7 +283,7 @@ export default function DataUploadPage() {
                         {status === "uploading" ? (
                             <>
                                 <Loader2 className="animate-spin h-5 w-5 mr-2" />
-                                Processing {progress.current}/{progress.total}...
+                                Processing {progress.current}/{progress.total}{stage ? ` (${stage})` : ""}...
                             </>
                         ) : (
                             <>
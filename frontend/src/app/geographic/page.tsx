@@ -16,7 +16,7 @@ import dynamic from "next/dynamic";
 const IndiaMap = dynamic(() => import("@/components/ui/IndiaMap"), { ssr: false });
 
 export default function GeographicPage() {
-    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths } = useFilter();
+    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion } = useFilter();
     const [data, setData] = useState<any>({ states: [], cities: [] });
     const [loading, setLoading] = useState(true);
     const [drilldownState, setDrilldownState] = useState<string | null>(null);
@@ -50,7 +50,7 @@ export default function GeographicPage() {
         }
 
         loadData();
-    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths]);
+    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion]);
 
     const validStates = Array.isArray(data.states) ? data.states : [];
     const validCities = Array.isArray(data.cities) ? data.cities : [];
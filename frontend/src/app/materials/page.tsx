@@ -11,7 +11,7 @@ import { Package, Award, Layers } from "lucide-react";
 import { formatAmount } from "@/lib/format";
 
 export default function MaterialsPage() {
-    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths } = useFilter();
+    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion } = useFilter();
     const [revenueChartView, setRevenueChartView] = useState<"treemap" | "bar">("treemap");
     const [data, setData] = useState<any>({ performance: [], pareto: [] });
     const [loading, setLoading] = useState(true);
@@ -45,7 +45,7 @@ export default function MaterialsPage() {
         }
 
         loadData();
-    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths]);
+    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion]);
 
     const validPerf = Array.isArray(data.performance) ? data.performance : [];
     const validPareto = Array.isArray(data.pareto) ? data.pareto : [];
@@ -12,7 +12,7 @@ import { IndianRupee, ShoppingCart, Users, TrendingUp, AlertTriangle } from "luc
 import { formatAmount } from "@/lib/format";
 
 export default function DashboardPage() {
-    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths } = useFilter();
+    const { dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion } = useFilter();
     const [data, setData] = useState<any>({ summary: null, trend: [], materials: [], customers: [], comparison: null, goals: null, message: null });
     const [anomalies, setAnomalies] = useState<{ entity: string; change_pct: number; current_revenue: number }[]>([]);
     const [loading, setLoading] = useState(true);
@@ -127,7 +127,7 @@ export default function DashboardPage() {
         }
 
         loadData();
-    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, goalRevenue, goalOrders, refreshKey]);
+    }, [dateRange, tenant, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion, goalRevenue, goalOrders, refreshKey]);
 
     const fmt = formatAmount;
     const sum = data.summary || { revenue: 0, orders: 0, customers: 0, average_order_value: 0 };
@@ -27,7 +27,7 @@ const DYNAMIC_DIMENSIONS = [
 ];
 
 export default function ReportsPage() {
-    const { tenant, dateRange, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths } = useFilter();
+    const { tenant, dateRange, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion } = useFilter();
 
     // Tab state
     const [activeTab, setActiveTab] = useState<'interactive' | 'export'>('interactive');
@@ -94,7 +94,7 @@ export default function ReportsPage() {
         };
 
         loadDocs();
-    }, [activeTab, tenant, dateRange, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths]);
+    }, [activeTab, tenant, dateRange, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths, dataVersion]);
 
     // Fetch dynamic options based on selected report type
     useEffect(() => {
@@ -1,6 +1,7 @@
 "use client";
 
 import React, { createContext, useContext, useState, useEffect, useCallback, ReactNode } from "react";
+import { subscribeTenantEvents } from "@/lib/api";
 
 const FILTER_STORAGE_KEY = "elettro_filter_view";
 
@@ -29,6 +30,8 @@ interface FilterContextType {
     saveCurrentView: (name: string) => void;
     loadView: (name: string) => void;
     savedViewNames: string[];
+    /** Bumped when the server pushes a data change for the tenant; pages refetch on change. */
+    dataVersion: number;
 }
 
 const FilterContext = createContext<FilterContextType | undefined>(undefined);
@@ -45,6 +48,7 @@ export function FilterProvider({ children }: { children: ReactNode }) {
     const [selectedMonths, setSelectedMonths] = useState<string[]>([]);
     const [savedViewNames, setSavedViewNames] = useState<string[]>([]);
     const [hasHydrated, setHasHydrated] = useState(false);
+    const [dataVersion, setDataVersion] = useState(0);
 
     // Restore from localStorage only after mount (client-only)
     useEffect(() => {
@@ -88,6 +92,12 @@ export function FilterProvider({ children }: { children: ReactNode }) {
         localStorage.setItem(FILTER_STORAGE_KEY + "_current", JSON.stringify(payload));
     }, [hasHydrated, tenant, dateRange, selectedStates, selectedCities, selectedCustomers, selectedMaterialGroups, selectedFiscalYears, selectedMonths]);
 
+    // Server pushes data version changes; the API cache is invalidated before pages refetch
+    useEffect(() => {
+        if (!hasHydrated) return;
+        return subscribeTenantEvents(tenant, () => setDataVersion((v) => v + 1));
+    }, [hasHydrated, tenant]);
+
     const saveCurrentView = useCallback((name: string) => {
         if (typeof window === "undefined" || !name.trim()) return;
         const payload = { name: name.trim(), tenant, states: selectedStates, cities: selectedCities, customers: selectedCustomers, materialGroups: selectedMaterialGroups, fiscalYears: selectedFiscalYears, months: selectedMonths, dateFrom: dateRange?.from?.toISOString?.()?.slice(0, 10), dateTo: dateRange?.to?.toISOString?.()?.slice(0, 10) };
@@ -132,6 +142,7 @@ export function FilterProvider({ children }: { children: ReactNode }) {
             saveCurrentView,
             loadView,
             savedViewNames,
+            dataVersion,
         }}>
             {children}
         </FilterContext.Provider>
@@ -101,6 +101,7 @@ export default function GlobalFilterBar() {
         saveCurrentView,
         loadView,
         savedViewNames,
+        dataVersion,
     } = useFilter();
 
     const [isCalendarOpen, setIsCalendarOpen] = useState(false);
@@ -134,7 +135,7 @@ export default function GlobalFilterBar() {
                 }
             })
             .catch(() => { });
-    }, [tenant]);
+    }, [tenant, dataVersion]);
 
     const activeFilterCount = selectedStates.length + selectedCities.length + selectedCustomers.length + selectedMaterialGroups.length + selectedFiscalYears.length + selectedMonths.length;
 
@@ -6,8 +6,8 @@ export const API_BASE_URL = USE_PROXY
     ? "/api/proxy"
     : (process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000/api").trim().replace(/\/+$/, "");
 
-/** Client cache: 5 min TTL so navigation feels instant and reduces backend load. */
-const CACHE_TTL_MS = 5 * 60 * 1000;
+/** Client cache: 30 min TTL; data changes are pushed over /events and drop the tenant's entries early. */
+const CACHE_TTL_MS = 30 * 60 * 1000;
 /** Timeout for API requests (backend cold start on Render can be 30–60s). */
 const FETCH_TIMEOUT_MS = 50 * 1000;
 const apiCache = new Map<string, { data: unknown; expiresAt: number }>();
@@ -22,6 +22,168 @@ function setCached(key: string, data: unknown) {
     apiCache.set(key, { data, expiresAt: Date.now() + CACHE_TTL_MS });
 }
 
+/** Drop cached responses for a tenant (its data version changed). */
+export function invalidateTenantCache(tenant: string) {
+    const needle = `tenant_id=${encodeURIComponent(tenant)}`;
+    for (const key of Array.from(apiCache.keys())) {
+        const params = key.includes("?") ? key.slice(key.indexOf("?") + 1).split("&") : [];
+        const hasTenant = params.some(p => p.startsWith("tenant_id="));
+        if (params.includes(needle) || (!hasTenant && tenant === "default_elettro")) apiCache.delete(key);
+    }
+}
+
+export type UploadProgressEvent = { upload_id: string; stage: string; filename?: string; rows?: number; rows_inserted?: number; error?: string };
+
+/**
+ * Subscribe to a tenant's data events (server-sent events). onVersion fires when the data version
+ * changes (after the cache has been invalidated); onUpload receives upload progress.
+ * EventSource reconnects by itself and resumes from the last event id. Returns an unsubscribe function.
+ */
+export function subscribeTenantEvents(
+    tenant: string,
+    onVersion: (version: number) => void,
+    onUpload?: (e: UploadProgressEvent) => void,
+): () => void {
+    if (typeof window === "undefined" || typeof EventSource === "undefined") return () => {};
+    const source = new EventSource(`${API_BASE_URL}/events?tenant_id=${encodeURIComponent(tenant)}`);
+    let lastVersion: number | null = null;
+    const onData = (version: number) => {
+        if (lastVersion !== null && version !== lastVersion) {
+            invalidateTenantCache(tenant);
+            onVersion(version);
+        }
+        lastVersion = version;
+    };
+    // hello carries the current version on every (re)connect, so changes missed while offline still invalidate
+    source.addEventListener("hello", (e) => onData(JSON.parse((e as MessageEvent).data).version));
+    source.addEventListener("version", (e) => {
+        const version = JSON.parse((e as MessageEvent).data).version;
+        if (lastVersion === null) lastVersion = version - 1;
+        onData(version);
+    });
+    if (onUpload) source.addEventListener("upload", (e) => onUpload(JSON.parse((e as MessageEvent).data)));
+    return () => source.close();
+}
+
+export type ChunkedUploadResult = { filename: string; rows_inserted: number; tenant: string; upload_id: string; duplicate: boolean };
+
+export type UploadJob = {
+    job_id: string;
+    status: "queued" | "running" | "done" | "failed";
+    stage: string;
+    percent: number;
+    rows_parsed: number | null;
+    rows_per_second: number | null;
+    queue_position: number | null;
+    result: {
+        filename: string;
+        tenant: string;
+        rows_parsed: number;
+        rows_skipped: number;
+        rows_clean: number;
+        rows_inserted: number;
+        /** Same file content was loaded before; nothing was processed */
+        duplicate?: boolean;
+        stages: { stage: string; rows_in: number; rows_out: number; seconds: number }[];
+    } | null;
+    error: string | null;
+};
+
+const JOB_POLL_MS = 1000;
+
+/** Poll GET /jobs/{id} until the upload job is done (resolves with it) or failed (rejects). */
+export async function waitForUploadJob(jobId: string, onJob?: (job: UploadJob) => void): Promise<UploadJob> {
+    for (;;) {
+        const res = await fetch(`${API_BASE_URL}/jobs/${jobId}`, { cache: "no-store" }).catch(() => null);
+        if (res?.ok) {
+            const job: UploadJob = await res.json();
+            onJob?.(job);
+            if (job.status === "done") return job;
+            if (job.status === "failed") throw new Error(job.error || "Upload job failed");
+        } else if (res?.status === 404) {
+            throw new Error("Upload job not found");
+        }
+        await new Promise(r => setTimeout(r, JOB_POLL_MS));
+    }
+}
+
+const UPLOAD_PART_RETRIES = 5;
+
+async function sha256Hex(data: ArrayBuffer): Promise<string | null> {
+    if (typeof crypto === "undefined" || !crypto.subtle) return null;
+    const digest = await crypto.subtle.digest("SHA-256", data);
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function uploadError(res: Response): Promise<Error> {
+    const body = await res.json().catch(() => null);
+    return new Error((body && body.detail) || `HTTP ${res.status}`);
+}
+
+/**
+ * Upload a sales file in parts (init, PUT parts, complete) so large files never travel in one request.
+ * A failed part is retried with backoff; the upload id is remembered per file, so calling this again
+ * after a dropped connection or page reload only sends the parts the server is missing.
+ * Complete queues an upload job; this waits for it (onJob gets each polled state).
+ */
+export async function uploadFileChunked(
+    file: File,
+    tenant: string,
+    onProgress?: (sentBytes: number, totalBytes: number) => void,
+    onJob?: (job: UploadJob) => void,
+): Promise<ChunkedUploadResult> {
+    const resumeKey = `chunked-upload:${tenant}:${file.name}:${file.size}:${file.lastModified}`;
+    let state: { upload_id: string; chunk_size: number; total_parts: number; missing: number[] } | null = null;
+
+    const savedId = typeof localStorage !== "undefined" ? localStorage.getItem(resumeKey) : null;
+    if (savedId) {
+        const res = await fetch(`${API_BASE_URL}/upload/chunked/${savedId}`, { cache: "no-store" }).catch(() => null);
+        if (res?.ok) state = await res.json();
+    }
+    if (!state) {
+        const res = await fetch(`${API_BASE_URL}/upload/chunked/init`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({ filename: file.name, size: file.size, tenant_id: tenant }),
+        });
+        if (!res.ok) throw await uploadError(res);
+        state = await res.json();
+        if (typeof localStorage !== "undefined") localStorage.setItem(resumeKey, state!.upload_id);
+    }
+    const { upload_id, chunk_size, total_parts, missing } = state!;
+
+    let sent = (total_parts - missing.length) * chunk_size;
+    onProgress?.(Math.min(sent, file.size), file.size);
+    for (const index of missing) {
+        const part = await file.slice(index * chunk_size, Math.min(file.size, (index + 1) * chunk_size)).arrayBuffer();
+        const checksum = await sha256Hex(part);
+        for (let attempt = 0; ; attempt++) {
+            const res = await fetch(`${API_BASE_URL}/upload/chunked/${upload_id}/parts/${index}`, {
+                method: "PUT",
+                headers: { "Content-Type": "application/octet-stream", ...(checksum ? { "X-Part-SHA256": checksum } : {}) },
+                body: part,
+            }).catch(() => null);
+            if (res?.ok) break;
+            // Unknown/expired upload or over the size limit will not get better by retrying
+            if (res && (res.status === 404 || res.status === 413)) {
+                if (res.status === 404 && typeof localStorage !== "undefined") localStorage.removeItem(resumeKey);
+                throw await uploadError(res);
+            }
+            if (attempt >= UPLOAD_PART_RETRIES) throw res ? await uploadError(res) : new Error("network error");
+            await new Promise(r => setTimeout(r, Math.min(500 * 2 ** attempt, 8000)));
+        }
+        sent += part.byteLength;
+        onProgress?.(Math.min(sent, file.size), file.size);
+    }
+
+    const res = await fetch(`${API_BASE_URL}/upload/chunked/${upload_id}/complete`, { method: "POST" });
+    if (!res.ok) throw await uploadError(res);
+    if (typeof localStorage !== "undefined") localStorage.removeItem(resumeKey);
+    const { job_id } = await res.json();
+    const job = await waitForUploadJob(job_id, onJob);
+    return { filename: file.name, rows_inserted: job.result?.rows_inserted ?? 0, tenant, upload_id: job_id, duplicate: !!job.result?.duplicate };
+}
+
 function fetchWithTimeout(url: string, init?: RequestInit, timeoutMs = FETCH_TIMEOUT_MS): Promise<Response> {
     const ac = new AbortController();
     const id = setTimeout(() => ac.abort(), timeoutMs);
@@ -1,36 +1,30 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
+from shared import rfm as rfm_engine
 from .utils import format_indian_currency
 
+# Quartile labels by score (1..4); recency 4 = most recent
+R_LABELS = ["Lost", "Churning", "At Risk", "Active"]
+F_LABELS = ["One-time", "Rare", "Frequent", "Loyal"]
+M_LABELS = ["Low", "Medium", "High", "VIP"]
+
 def render_rfm(df):
     st.subheader("RFM Segmentation")
 
-    reference_date = df["DATE"].max()
-
-    rfm = (
-        df.groupby("CUSTOMER_NAME")
-        .agg(
-            Recency=("DATE", lambda x: (reference_date - x.max()).days),
-            Frequency=("INVOICE_NO", "nunique"),
-            Monetary=("AMOUNT", "sum")
-        )
-        .reset_index()
-    )
+    rfm = rfm_engine.rfm_table(df)
 
     if len(rfm) >= 4:
-        # Scoring
-        rfm["R_Score"] = pd.qcut(rfm["Recency"], 4, labels=["Active", "At Risk", "Churning", "Lost"])
-        rfm["F_Score"] = pd.qcut(rfm["Frequency"].rank(method="first"), 4, labels=["One-time", "Rare", "Frequent", "Loyal"])
-        rfm["M_Score"] = pd.qcut(rfm["Monetary"], 4, labels=["Low", "Medium", "High", "VIP"])
+        # Scoring (shared engine: vectorized quartiles, ties never break the cut)
+        scored = rfm_engine.score(rfm, rank_frequency=True)
+        rfm["R_Score"] = np.array(R_LABELS)[scored["Recency_Score"] - 1]
+        rfm["F_Score"] = np.array(F_LABELS)[scored["Frequency_Score"] - 1]
+        rfm["M_Score"] = np.array(M_LABELS)[scored["Monetary_Score"] - 1]
 
         # --- 1. RFM Scorecards (New) ---
         # Define segments based on logic (simplified for immediate impact)
-        rfm["Segment"] = "Standard"
-        rfm.loc[(rfm["R_Score"]=="Active") & (rfm["F_Score"]=="Loyal"), "Segment"] = "Strategic Accounts"
-        rfm.loc[(rfm["R_Score"]=="Active") & (rfm["F_Score"]=="Frequent"), "Segment"] = "Consistent Buyers"
-        rfm.loc[(rfm["R_Score"]=="At Risk") & (rfm["F_Score"].isin(["Loyal", "Frequent"])), "Segment"] = "Retention Opportunities"
-        rfm.loc[rfm["R_Score"]=="Lost", "Segment"] = "Inactive"
+        rfm["Segment"] = rfm_engine.account_segments(scored["Recency_Score"], scored["Frequency_Score"])
         
         # Calculate Metrics
         seg_metrics = rfm.groupby("Segment").agg(
@@ -11,6 +11,7 @@ _ASSETS_DIR = _APP_DIR / "assets" if (_APP_DIR / "assets").exists() else _APP_DI
 
 import config
 import pipeline_monitor
+from shared import excel
 import requests
 from streamlit_option_menu import option_menu
 
@@ -694,7 +695,7 @@ elif selected == "Data Management":
                 dfs = []
                 for f in raw_files:
                     path = os.path.join(config.RAW_FOLDER, f)
-                    tmp = pd.read_excel(path)
+                    tmp = excel.read_sales_workbook(path)
                     # Standardize just to find AMOUNT column
                     tmp.columns = tmp.columns.str.upper().str.strip()
                     dfs.append(tmp)
@@ -1,8 +1,109 @@
+import hashlib
+import time
+
 import streamlit as st
 import pandas as pd
 import requests
 import config
 
+PART_RETRIES = 5
+PART_TIMEOUT = 60
+# Longest wait for the server-side upload job before giving up
+JOB_TIMEOUT = 30 * 60
+
+
+class UploadError(Exception):
+    pass
+
+
+def _raise_for(response):
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    raise UploadError(f"{response.status_code}: {detail}")
+
+
+def _upload_state(url):
+    """GET the upload's status, retried with the same backoff as the parts."""
+    for attempt in range(PART_RETRIES):
+        try:
+            resp = requests.get(url, timeout=PART_TIMEOUT)
+            if resp.status_code == 200:
+                return resp.json()
+            if resp.status_code == 404:
+                _raise_for(resp)
+        except requests.RequestException:
+            pass
+        time.sleep(min(0.5 * 2 ** attempt, 8))
+    raise UploadError("upload status could not be fetched")
+
+
+def upload_file_chunked(uploaded_file, tenant_id, on_progress=None):
+    """
+    Upload one file through the chunked upload API (init, PUT parts, complete).
+    Each part is retried with exponential backoff; after a dropped connection the server's
+    status tells us which parts are still missing, so only those are re-sent.
+    Completing queues an upload job; returns the finished job (counts under "result").
+    """
+    base = f"{config.API_URL}/api/upload/chunked"
+    data = uploaded_file.getbuffer()
+    resp = requests.post(f"{base}/init", json={"filename": uploaded_file.name, "size": len(data), "tenant_id": tenant_id}, timeout=PART_TIMEOUT)
+    if resp.status_code != 200:
+        _raise_for(resp)
+    state = resp.json()
+    upload_id, chunk_size = state["upload_id"], state["chunk_size"]
+
+    for _ in range(PART_RETRIES):
+        received = state["total_parts"] - len(state["missing"])
+        for index in state["missing"]:
+            part = bytes(data[index * chunk_size:(index + 1) * chunk_size])
+            headers = {"Content-Type": "application/octet-stream", "X-Part-SHA256": hashlib.sha256(part).hexdigest()}
+            for attempt in range(PART_RETRIES):
+                try:
+                    resp = requests.put(f"{base}/{upload_id}/parts/{index}", data=part, headers=headers, timeout=PART_TIMEOUT)
+                    if resp.status_code == 200:
+                        break
+                    if resp.status_code in (404, 413):
+                        _raise_for(resp)
+                except requests.RequestException:
+                    pass
+                time.sleep(min(0.5 * 2 ** attempt, 8))
+            received += 1
+            if on_progress:
+                on_progress(min(received, state["total_parts"]), state["total_parts"])
+        # Resume: ask the server which parts it actually has
+        state = _upload_state(f"{base}/{upload_id}")
+        if state["complete"]:
+            break
+    else:
+        raise UploadError(f"{len(state['missing'])} part(s) could not be uploaded")
+
+    resp = requests.post(f"{base}/{upload_id}/complete", timeout=PART_TIMEOUT)
+    if resp.status_code != 202:
+        _raise_for(resp)
+    return wait_for_job(resp.json()["job_id"])
+
+
+def wait_for_job(job_id, poll_seconds=1.0, timeout=JOB_TIMEOUT):
+    """
+    Poll the upload job until it is done (returns it), failed or still unfinished
+    after `timeout` seconds (both raise UploadError).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        resp = requests.get(f"{config.API_URL}/api/jobs/{job_id}", timeout=PART_TIMEOUT)
+        if resp.status_code != 200:
+            _raise_for(resp)
+        job = resp.json()
+        if job["status"] == "done":
+            return job
+        if job["status"] == "failed":
+            raise UploadError(job.get("error") or "upload job failed")
+        if time.monotonic() >= deadline:
+            raise UploadError(f"upload job {job_id} not finished after {timeout}s (status: {job['status']})")
+        time.sleep(poll_seconds)
+
 def render_cloud_uploader():
     """
     Adds a file uploader to the sidebar for Cloud Deployments.
@@ -28,46 +129,27 @@ def render_cloud_uploader():
                 total_files = len(uploaded_files)
                 
                 status_text.text(f"Preparing to upload {total_files} files...")
-                
-                # Process files 1 by 1 to avoid Cloudflare/Render payload rate-limiting (429 Too Many Requests)
-                chunk_size = 1
-                file_chunks = [uploaded_files[i:i + chunk_size] for i in range(0, total_files, chunk_size)]
-                
-                import time
-                
-                for idx, chunk in enumerate(file_chunks):
-                    status_text.text(f"Uploading file {idx + 1} of {total_files}: {chunk[0].name}...")
-                    
-                    # Prepare Multipart Form Data
-                    files = [
-                        ("files", (f.name, f.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")) 
-                        for f in chunk
-                    ]
-                    data = {"tenant_id": current_tenant}
-                    
+
+                # Large files go up in parts, each retried on its own, so no request carries a whole workbook
+                for idx, f in enumerate(uploaded_files):
+                    status_text.text(f"Uploading file {idx + 1} of {total_files}: {f.name}...")
+
+                    def on_progress(done, total, idx=idx):
+                        progress_bar.progress(min(1.0, (idx + done / total) / total_files))
+
                     try:
-                        # Send to FastAPI Batch Endpoint
-                        response = requests.post(
-                            f"{config.API_URL}/api/v1/upload_batch", 
-                            data=data, 
-                            files=files,
-                            timeout=90 # Prevent Render 100s drops
-                        )
-                        
-                        if response.status_code == 200:
-                            success_count += len(chunk)
-                            time.sleep(1.5) # Stagger requests so we don't hit cloud WAF limits
-                        else:
-                            st.error(f"Failed on file {idx + 1} ({response.status_code}): {response.text}")
-                            break # Stop on error
+                        upload_file_chunked(f, current_tenant, on_progress)
+                        success_count += 1
+                    except UploadError as e:
+                        st.error(f"Failed on file {idx + 1} ({f.name}): {e}")
+                        break # Stop on error
                     except Exception as e:
-                        st.error(f"Backend Integration Error on batch {idx + 1}: {e}")
+                        st.error(f"Backend Integration Error on file {idx + 1}: {e}")
                         break # Stop on error
-                        
+
                     # Update progress
-                    progress = min(1.0, (idx + 1) / len(file_chunks))
-                    progress_bar.progress(progress)
-                
+                    progress_bar.progress(min(1.0, (idx + 1) / total_files))
+
                 if success_count == total_files:
                     progress_bar.progress(100)
                     status_text.success(f"✅ Successfully processed all {success_count} files!")
@@ -1,8 +1,12 @@
 import os
+import sys
 
 # Repo root (parent of legacy/), so data/ and assets/ stay at repo root
 _BASE = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 BASE_DIR = _BASE
+# shared/ (code used by both this app and the FastAPI backend) lives at the repo root
+if os.path.isdir(os.path.join(BASE_DIR, "shared")) and BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
 # For Cloud Deployments with persistent storage, we read the DATA_DIR env variable
 # If not set (like local dev), we use the repo-root "data" folder.
 DATA_DIR = os.environ.get("DATA_DIR", os.path.join(BASE_DIR, "data"))
@@ -31,24 +35,6 @@ SALES_MASTER_FILE = os.path.join(OUTPUT_FOLDER, "sales_master.xlsx")
 AUDIT_LOG_FILE = os.path.join(OUTPUT_FOLDER, "audit_log.xlsx")
 MONTHLY_SUMMARY_FILE = os.path.join(OUTPUT_FOLDER, "monthly_summary.xlsx")
 
-# Business Logic
-FY_START_MONTH = 4
-
-# Exclusion List (Material Groups to Ignore) - keyword match: row excluded if MATERIALGROUP contains any of these.
-# Keep in sync with backend/api/routes.py EXCLUDED_MATERIAL_GROUPS (exact names there).
-EXCLUDE_KEYWORDS = [
-    "SERVICE", "AIR VENT", "PACKING", "RAW", "BRASS", "PANEL",
-    "SALES ACCOUNT", "MASTER BATCH", "SEMI", "PPCP", "FIXED",
-    "PROTECTION", "HIPS", "ABS", "INDIRECT", "NYLOAN", "PP BLACK",
-    "NASER MILES PARIS", "DOCUMENT HOLDER",
-    "SWISS MILITARY MODLE MAZE",
-    "SELF ADHESIVE TIE MOUNT", "SCREW TYPE TIE MOUNT",
-    "FINISHED GOOD",  # Finished goods
-]
-
-# Rename Mappings (Standardizing Material Groups)
-MATERIAL_GROUP_MAPPINGS = {
-    r"CONDUIT.*GLAND": "POLYAMIDE CONDUIT GLAND",
-    r"REVER": "REVERSE FORWARD",
-    r"REVERSE FORWORD": "REVERSE FORWARD"
-}
+# Business Logic (financial year start, material group exclusion keywords and rename mappings,
+# city -> state fallback, tax rates) is in shared/ingest.py: one transform pipeline for the
+# API uploads and this ETL.
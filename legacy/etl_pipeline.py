@@ -6,6 +6,7 @@ from sqlalchemy import text
 from datetime import datetime
 import config
 import pipeline_monitor
+from shared import excel, ingest
 
 # Configure Logging
 log_handlers = [logging.StreamHandler()]
@@ -22,69 +23,14 @@ logging.basicConfig(
 
 
 def standardize(df):
-    """
-    Standardizes column names and text values:
-    - Strips spaces
-    - Converts column names to uppercase
-    - Converts all string values to uppercase
-    - Sanitizes column names for SQL
-    """
-    if df.empty:
-        return df
-
-    # Standardize column names
-    df.columns = df.columns.str.strip().str.upper()
-    
-    # SQL Safe column names
-    df.columns = (
-        df.columns
-        .str.replace(".", "", regex=False)
-        .str.replace(" ", "_")
-    )
-    
-    # fuzzy column matching for critical fields
-    for col in df.columns:
-        col_upper = col.upper()
-        
-        # CITY Synonyms
-        if any(x in col_upper for x in ["CITY", "TOWN", "DISTRICT", "LOCATION", "STATION", "DESTINATION", "PLACE"]):
-            if "CITY" not in df.columns:
-                df.rename(columns={col: "CITY"}, inplace=True)
-        
-        # STATE Synonyms
-        elif any(x in col_upper for x in ["STATE", "REGION", "PROVINCE", "TERRITORY", "POS", "SUPPLY"]):
-            if "STATE" not in df.columns:
-                df.rename(columns={col: "STATE"}, inplace=True)
-                
-        # CUSTOMER Synonyms
-        elif any(x in col_upper for x in ["CUSTOMER", "PARTY", "BILL TO", "BUYER", "DEBTOR"]):
-            if "CUSTOMER_NAME" not in df.columns:
-                 df.rename(columns={col: "CUSTOMER_NAME"}, inplace=True)
-                 
-        # ITEM Synonyms
-        elif any(x in col_upper for x in ["ITEM", "MATERIAL", "PRODUCT", "DESCRIPTION", "PART"]):
-            if "ITEMNAME" not in df.columns and "GROUP" not in col_upper:
-                df.rename(columns={col: "ITEMNAME"}, inplace=True)
-
-        # INVOICE Synonyms
-        elif col_upper == "NO" or col_upper == "NO." or any(x in col_upper for x in ["INVOICE", "BILL_NO", "DOC_NO", "VOUCHER"]):
-            if "INVOICE_NO" not in df.columns and "DATE" not in col_upper:
-                df.rename(columns={col: "INVOICE_NO"}, inplace=True)
-
-    return df
-
-def calculate_fy(date):
-    """Calculates Financial Year from a date object."""
-    if pd.isna(date):
-        return "UNKNOWN"
-    
-    if date.month >= config.FY_START_MONTH:
-        return f"FY{date.year % 100}-{(date.year + 1) % 100}"
-    else:
-        return f"FY{(date.year - 1) % 100}-{date.year % 100}"
+    """Standardizes column names: upper-case, SQL safe, synonyms mapped (shared/ingest.py)."""
+    return ingest.standardize(df)
 
 def ingest_raw_data():
-    """Reads all Excel files from the raw folder and combines them."""
+    """
+    Reads all Excel files from the raw folder and combines them (standardized). An INVOICE_NO
+    already in an earlier file is dropped from later ones, as the backend batch upload does.
+    """
     pipeline_monitor.update_status("Ingest", "Running", "Scanning raw folder...", 10)
     
     all_files = [f for f in os.listdir(config.RAW_FOLDER) if f.endswith(".xlsx")]
@@ -97,213 +43,60 @@ def ingest_raw_data():
     logging.info(f"files detected: {all_files}")
     pipeline_monitor.update_status("Ingest", "Running", f"Found {len(all_files)} files", 20)
     
-    dataframes = []
-    for i, file in enumerate(all_files):
-        try:
-            path = os.path.join(config.RAW_FOLDER, file)
-            df = pd.read_excel(path)
-            dataframes.append(df)
-            logging.info(f"Loaded {file} ({len(df)} rows)")
-            pipeline_monitor.update_status("Ingest", "Running", f"Loaded {file}", 20 + int((i/len(all_files))*20))
-        except Exception as e:
-            logging.error(f"Error loading {file}: {e}")
+    # Files are parsed concurrently (worker processes for large batches)
+    paths = [os.path.join(config.RAW_FOLDER, file) for file in all_files]
+    dataframes, names = [], []
+    for i, (file, df) in enumerate(zip(all_files, excel.read_files(paths))):
+        if isinstance(df, Exception):
+            logging.error(f"Error loading {file}: {df}")
+            continue
+        dataframes.append(standardize(df))
+        names.append(file)
+        logging.info(f"Loaded {file} ({len(df)} rows)")
+        pipeline_monitor.update_status("Ingest", "Running", f"Loaded {file}", 20 + int((i/len(all_files))*20))
 
     if not dataframes:
         return None
 
-    combined_df = pd.concat(dataframes, ignore_index=True)
+    combined_df, _, dropped = ingest.merge_files(dataframes)
+    for file, n in zip(names, dropped):
+        if n:
+            logging.info(f"{file}: dropped {n} rows whose INVOICE_NO is in an earlier file")
     return combined_df
 
-def clean_and_transform(df):
-    """Applies filters, standardization, and enrichment logic."""
-    pipeline_monitor.update_status("Transform", "Running", "Standardizing and cleaning data...", 50)
-    
-    if df is None or df.empty:
-        return df
-
-    # 1. Standardize
-    df = standardize(df)
-
-    initial_count = len(df)
-
-    # 2. Exclude Keywords (use any column that holds material group, same idea as backend)
-    grp_col = None
-    for c in ["ITEM_NAME_GROUP", "MATERIALGROUP", "MATERIAL_GROUP", "PRODUCT_CATEGORY", "CATEGORY"]:
-        if c in df.columns:
-            grp_col = c
-            break
-    if grp_col:
-        for keyword in config.EXCLUDE_KEYWORDS:
-            df = df[~df[grp_col].astype(str).str.contains(keyword, case=False, na=False)]
-    logging.info(f"Rows excluded by keywords: {initial_count - len(df)}")
-
-    # 3. Apply Mappings (same column as exclusion)
-    if grp_col:
-        for pattern, replacement in config.MATERIAL_GROUP_MAPPINGS.items():
-            df.loc[df[grp_col].astype(str).str.contains(pattern, case=False, na=False), grp_col] = replacement
-
-    # 4. Add Financial Year
-    if "DATE" in df.columns:
-        df["DATE"] = pd.to_datetime(df["DATE"])
-        df["FINANCIAL_YEAR"] = df["DATE"].apply(calculate_fy)
-        # Create Month column for easy grouping
-        # Create Month column for easy grouping (MMM-YY)
-        df["MONTH"] = df["DATE"].dt.strftime("%b-%y").str.upper()
-
-    # 6. Ensure CITY column exists
-    if "CITY" not in df.columns:
-        df["CITY"] = "City Not Found"
-        
-    return df
+def load_customer_master():
+    """The standardized customer master, or None when the file is missing."""
+    if not os.path.exists(config.CUSTOMER_MASTER_FILE):
+        logging.warning("Customer Master file not found. Skipping merge.")
+        return None
+    return standardize(excel.read_excel(config.CUSTOMER_MASTER_FILE))
 
-def calculate_taxes(df):
-    """Calculates IGST, CGST, SGST, and Total Amount."""
-    pipeline_monitor.update_status("Transform", "Running", "Calculating Taxes...", 65)
-    
-    # Drop existing calc columns to be fresh (Aggressive Cleanup)
-    # The user explicitly wants to ignore raw tax/total columns and rely on AMOUNT
-    cols_to_drop = [
-        "TOTALAMOUNT", "TAX", "IGST", "CGST", "SGST", 
-        "IGST_RATE", "CGST_RATE", "SGST_RATE",
-        "GRAND_TOTAL", "NET_AMOUNT", "TOTAL_TAX",
-        "ROUND_OFF"
-    ]
-    df = df.drop(columns=cols_to_drop, errors="ignore")
-    
-    # Initialize columns
-    df["IGST"] = 0.0
-    df["CGST"] = 0.0
-    df["SGST"] = 0.0
-    df["TAX"] = 0.0
-    df["TOTALAMOUNT"] = 0.0
-    
-    if "AMOUNT" not in df.columns:
+def transform(df):
+    """Runs the shared ingest pipeline: standardize, customer master, state fallback, dates, material rules, taxes."""
+    if df is None or df.empty:
         return df
-        
-    logging.info("Recalculating Financials for all rows.")
-    company_state = "MAHARASHTRA"
-    
-    # Use the FINAL State column (after merge)
-    calc_state_series = df["STATE"].copy() if "STATE" in df.columns else pd.Series(["Unknown"] * len(df))
-    calc_state_series = calc_state_series.fillna("Unknown").str.upper().str.strip()
-    
-    # 18% Tax Rate
-    tax_rate = 0.18
-        
-    # Logic: If State is Company State OR Unknown -> CGST/SGST (Intra)
-    intra_state = calc_state_series.isin([company_state, "UNKNOWN", "MAHARASHTRA", "STATE NOT FOUND", "State Not Found"])
-    inter_state = ~intra_state
-        
-    # IGST
-    df.loc[inter_state, "IGST"] = df.loc[inter_state, "AMOUNT"] * tax_rate
-        
-    # CGST + SGST
-    df.loc[intra_state, "CGST"] = df.loc[intra_state, "AMOUNT"] * (tax_rate / 2)
-    df.loc[intra_state, "SGST"] = df.loc[intra_state, "AMOUNT"] * (tax_rate / 2)
-        
-    # Total Tax
-    df["TAX"] = df["IGST"] + df["CGST"] + df["SGST"]
-        
-    # Total Amount
-    df["TOTALAMOUNT"] = df["AMOUNT"] + df["TAX"]
-    
-    return df
 
-    # 6. Ensure CITY column exists
-    if "CITY" not in df.columns:
-        df["CITY"] = "City Not Found"
-        
+    steps = {
+        "standardize": ("Standardizing and cleaning data...", 50),
+        "enrich": ("Merging Customer Master...", 60),
+        "tax": ("Calculating Taxes...", 65),
+    }
+    pipe = ingest.sales_pipeline(master=load_customer_master())
+    df, stats = pipe.run(df, on_step=lambda step: pipeline_monitor.update_status("Transform", "Running", *steps[step]))
+    for s in stats:
+        logging.info(f"Stage {s['stage']}: {s['rows_in']} -> {s['rows_out']} rows in {s['seconds']:.3f}s")
     return df
 
 def merge_customer_master(sales_df):
-    """Merges sales data with customer master."""
+    """Merges sales data with customer master, then guesses missing states from the city."""
     pipeline_monitor.update_status("Reference", "Running", "Merging Customer Master...", 60)
-    
-    if not os.path.exists(config.CUSTOMER_MASTER_FILE):
-        logging.warning("Customer Master file not found. Skipping merge.")
-        # Ensure STATE exists even if master is missing
-        if "STATE" not in sales_df.columns:
-            sales_df["STATE"] = "State Not Found"
-        return sales_df
-
-    master_df = pd.read_excel(config.CUSTOMER_MASTER_FILE)
-    master_df = standardize(master_df)
-
-    # Ensure join key exists
-    if "CUSTOMER_NAME" in sales_df.columns and "CUSTOMER_NAME" in master_df.columns:
-        sales_df = pd.merge(sales_df, master_df, on="CUSTOMER_NAME", how="left")
-        
-        # Clean up Merge Suffixes (x/y)
-        # Prioritize Master (y) then Raw (x)
-        for col in ["STATE", "CITY"]:
-            if f"{col}_y" in sales_df.columns and f"{col}_x" in sales_df.columns:
-                sales_df[col] = sales_df[f"{col}_y"].fillna(sales_df[f"{col}_x"])
-                sales_df = sales_df.drop(columns=[f"{col}_y", f"{col}_x"])
-            elif f"{col}_y" in sales_df.columns:
-                 sales_df[col] = sales_df[f"{col}_y"]
-                 sales_df = sales_df.drop(columns=[f"{col}_y"])
-            elif f"{col}_x" in sales_df.columns:
-                 sales_df[col] = sales_df[f"{col}_x"]
-                 sales_df = sales_df.drop(columns=[f"{col}_x"])
-        
-        logging.info("Customer Master merged and columns cleaned.")
-    else:
-        logging.warning("CUSTOMER_NAME column missing in sales or master data.")
-
-    # ---------------------------------------------------------
-    # FALLBACK LOGIC: GUESS STATE FROM CITY IF STILL MISSING
-    # ---------------------------------------------------------
-    if "STATE" not in sales_df.columns:
-        sales_df["STATE"] = pd.NA
-        
-    CITY_STATE_MAP = {
-        "MUMBAI": "MAHARASHTRA",
-        "PUNE": "MAHARASHTRA",
-        "NAGPUR": "MAHARASHTRA",
-        "NASHIK": "MAHARASHTRA",
-        "THANE": "MAHARASHTRA",
-        "AURANGABAD": "MAHARASHTRA",
-        "DELHI": "DELHI",
-        "NEW DELHI": "DELHI",
-        "GURGAON": "HARYANA",
-        "NOIDA": "UTTAR PRADESH",
-        "BANGALORE": "KARNATAKA",
-        "BENGALURU": "KARNATAKA",
-        "CHENNAI": "TAMIL NADU",
-        "HYDERABAD": "TELANGANA",
-        "KOLKATA": "WEST BENGAL",
-        "AHMEDABAD": "GUJARAT",
-        "SURAT": "GUJARAT",
-        "VADODARA": "GUJARAT",
-        "JAIPUR": "RAJASTHAN",
-        "LUCKNOW": "UTTAR PRADESH",
-        "KANPUR": "UTTAR PRADESH",
-        "INDORE": "MADHYA PRADESH",
-        "BHOPAL": "MADHYA PRADESH",
-        "VAPI": "GUJARAT",
-        "CHANDIGARH": "CHANDIGARH",
-        "SECUNDERABAD": "TELANGANA",
-        "PANVEL": "MAHARASHTRA",
-        "BHIWANDI": "MAHARASHTRA",
-        "VASAI": "MAHARASHTRA",
-        "RAJKOT": "GUJARAT",
-        "HOSUR": "TAMIL NADU",
-        "BANGALORE": "KARNATAKA"
-    }
-
-    if "CITY" in sales_df.columns:
-        # Fill missing states by looking up the city (case-insensitive)
-        def guess_state(row):
-            if pd.isna(row.get("STATE")) or str(row.get("STATE")).strip() == "" or "NOT FOUND" in str(row.get("STATE")).upper():
-                city = str(row.get("CITY", "")).upper().strip()
-                return CITY_STATE_MAP.get(city, "State Not Found")
-            return row["STATE"]
-            
-        sales_df["STATE"] = sales_df.apply(guess_state, axis=1)
-    else:
-        sales_df["STATE"] = sales_df["STATE"].fillna("State Not Found")
+    sales_df = ingest.merge_customer_master(sales_df, load_customer_master())
+    return ingest.guess_state(ingest.ensure_geo(sales_df))
 
-    return sales_df
+def calculate_taxes(df):
+    """Calculates IGST, CGST, SGST, and Total Amount from AMOUNT and the final STATE."""
+    pipeline_monitor.update_status("Transform", "Running", "Calculating Taxes...", 65)
+    return ingest.calculate_taxes(df)
 
 def update_database(new_df, tenant_id="default_elettro"):
     """Updates the PostgreSQL database with new records for the specific tenant."""
@@ -318,9 +111,12 @@ def update_database(new_df, tenant_id="default_elettro"):
 
     # Inject multi-tenant ID
     new_df["tenant_id"] = tenant_id
+    # Multi-row INSERTs sized to Postgres' 65535 bind parameters per statement
+    chunksize = max(1, 65535 // len(new_df.columns) - 1)
 
     try:
-        with database.engine.connect() as conn:
+        # Duplicate check and insert in one transaction: the batch is stored completely or not at all
+        with database.engine.begin() as conn:
             # Check if table exists
             has_table = conn.execute(text(
                 "SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_schema = 'public' AND table_name = 'sales_master')"
@@ -330,17 +126,15 @@ def update_database(new_df, tenant_id="default_elettro"):
 
             if not has_table:
                 # First time creation
-                new_df.to_sql("sales_master", database.engine, if_exists="replace", index=False)
+                new_df.to_sql("sales_master", conn, if_exists="replace", index=False, method="multi", chunksize=chunksize)
                 new_records_count = len(new_df)
                 logging.info(f"Created new Postgres table with {new_records_count} records for tenant {tenant_id}.")
             else:
                 # Deduplication logic per tenant
-                existing_invoices = pd.read_sql(
-                    text("SELECT \"INVOICE_NO\" FROM sales_master WHERE tenant_id = :tid"), 
-                    conn, params={"tid": tenant_id}
-                )
-                existing_set = set(existing_invoices["INVOICE_NO"])
-                
+                existing_set = {row[0] for row in conn.execute(
+                    text("SELECT DISTINCT \"INVOICE_NO\" FROM sales_master WHERE tenant_id = :tid"), {"tid": tenant_id}
+                )}
+
                 if "INVOICE_NO" in new_df.columns:
                     to_insert = new_df[~new_df["INVOICE_NO"].isin(existing_set)]
                 else:
@@ -350,12 +144,12 @@ def update_database(new_df, tenant_id="default_elettro"):
                 new_records_count = len(to_insert)
 
                 if new_records_count > 0:
-                    to_insert.to_sql("sales_master", database.engine, if_exists="append", index=False)
+                    to_insert.to_sql("sales_master", conn, if_exists="append", index=False, method="multi", chunksize=chunksize)
                     logging.info(f"Appended {new_records_count} new records to Postgres for tenant {tenant_id}.")
                 else:
                     logging.info("No new records to append to Postgres DB.")
 
-            return new_records_count
+        return new_records_count
     except Exception as e:
         logging.error(f"Failed to update Postgres database: {e}")
         return 0
@@ -386,14 +180,8 @@ def run_pipeline(tenant_id="default_elettro"):
             pipeline_monitor.update_status("Done", "Completed", "No new data", 100)
             return
 
-        # 2. Transform
-        clean_df = clean_and_transform(raw_df)
-        
-        # 3. Merge Master
-        final_df = merge_customer_master(clean_df)
-        
-        # 3.5 Recalculate Taxes (After Merge to get correct State)
-        final_df = calculate_taxes(final_df)
+        # 2. Transform (standardize, merge master, enrich, taxes)
+        final_df = transform(raw_df)
 
         # 4. Update Database (Multi-Tenant Postgres)
         added_count = update_database(final_df, tenant_id)
@@ -401,7 +189,7 @@ def run_pipeline(tenant_id="default_elettro"):
         # 5. Update Excel Master (Optional, for backward compatibility)
         try:
             if os.path.exists(config.SALES_MASTER_FILE):
-                existing_master = pd.read_excel(config.SALES_MASTER_FILE)
+                existing_master = excel.read_excel(config.SALES_MASTER_FILE)
                 combined_master = pd.concat([existing_master, final_df], ignore_index=True).drop_duplicates(subset=["INVOICE_NO"])
                 
                 # Sort by Date Descending
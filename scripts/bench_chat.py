@@ -0,0 +1,63 @@
+"""
+Chat latency (backend/api/chatbot.py) as a tenant's frame grows.
+
+    python scripts/bench_chat.py [rows,rows,...] [customers]
+
+Per message, compares the old path (copy of the tenant frame, entity index rebuilt,
+frame copied again inside the engine) with a kept per-tenant engine answering a new
+question, and with a repeated question served from the answer cache.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+
+from api.chatbot import SalesQueryEngine  # noqa: E402
+
+QUESTIONS = ["total revenue", "top 5 customers", "total revenue in 2023", "quantity for maharashtra", "top 3 states"]
+
+
+def synthetic(rows: int, customers: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "DATE": pd.Timestamp("2021-04-01") + pd.to_timedelta(rng.integers(0, 1400, rows), unit="D"),
+        "INVOICE_NO": np.char.add("INV", np.arange(rows).astype(str)),
+        "CUSTOMER_NAME": np.char.add("CUSTOMER ", rng.integers(0, customers, rows).astype(str)),
+        "STATE": rng.choice(["MAHARASHTRA", "DELHI", "GUJARAT", "KARNATAKA", "TAMIL NADU"], rows),
+        "MATERIALGROUP": rng.choice(["CABLE TIE", "CONDUIT GLAND", "LUGS", "CLIPS", "TERMINALS"], rows),
+        "QTY": rng.integers(1, 100, rows),
+        "AMOUNT": np.round(rng.random(rows) * 10000, 2),
+    })
+
+
+def per_message(fn) -> float:
+    started = time.perf_counter()
+    for q in QUESTIONS:
+        fn(q)
+    return (time.perf_counter() - started) / len(QUESTIONS)
+
+
+def main(sizes, customers: int) -> None:
+    for rows in sizes:
+        df = synthetic(rows, customers)
+        print(f"\n{rows:,} rows, {customers:,} customers")
+        old = per_message(lambda q: SalesQueryEngine(df.copy()).process_query(q, df.copy()))
+        started = time.perf_counter()
+        engine = SalesQueryEngine(df)
+        build = time.perf_counter() - started
+        kept = per_message(lambda q: engine.process_query(q, engine.df))
+        answers = {q: engine.process_query(q) for q in QUESTIONS}
+        repeated = per_message(lambda q: answers[" ".join(q.lower().split())])
+        print(f"  old path (index rebuilt)   {old * 1000:8.1f} ms/message")
+        print(f"  kept engine, new question  {kept * 1000:8.1f} ms/message  (index built once: {build * 1000:.0f} ms)")
+        print(f"  repeated question (cache)  {repeated * 1000:8.3f} ms/message")
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [100_000, 1_000_000]
+    customers = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    main(sizes, customers)
@@ -0,0 +1,104 @@
+"""
+Excel parsing throughput: pd.read_excel (default openpyxl engine) against shared.excel with
+openpyxl read_only and with calamine, on synthetic sales-register workbooks.
+
+    python scripts/bench_excel.py [rows,rows,...] [repeats]
+
+Default sizes are 50k, 200k and 1M rows (9 columns, a title row above the header, like
+an ERP export). Workbooks are generated once into a temp dir and reused. Each size is
+also written split over 4 sheets to time read_sales_workbook reading the sheets one after
+another and in parallel worker processes. Reported: best-of-N seconds and rows/sec.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared import excel  # noqa: E402
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "elettro_bench_excel")
+SHEETS = 4
+
+
+def synthetic(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Date": (pd.Timestamp("2023-04-01") + pd.to_timedelta(rng.integers(0, 700, rows), unit="D")).to_pydatetime(),
+        "Invoice No": np.char.add("INV", (np.arange(rows) // 3).astype(str)),
+        "Party Name": np.char.add("CUSTOMER ", rng.integers(0, 2000, rows).astype(str)),
+        "City": rng.choice(["MUMBAI", "PUNE", "DELHI", "SURAT", "CHENNAI"], rows),
+        "State": rng.choice(["MAHARASHTRA", "DELHI", "GUJARAT", "TAMIL NADU"], rows),
+        "Item Name": np.char.add("ITEM ", rng.integers(0, 5000, rows).astype(str)),
+        "Material Group": rng.choice(["CABLE TIE", "GLAND", "LUGS", "CLIPS"], rows),
+        "Qty": rng.integers(1, 500, rows),
+        "Amount": np.round(rng.random(rows) * 10000, 2),
+    })
+
+
+def write_workbook(path: str, df: pd.DataFrame, sheets: int) -> None:
+    """openpyxl write_only, with a report title row above each header."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for i, part in enumerate(np.array_split(np.arange(len(df)), sheets)):
+        ws = wb.create_sheet(f"Sales {i + 1}")
+        ws.append(["ELETTRO Sales Register"])
+        ws.append(list(df.columns))
+        for row in df.iloc[part].itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(path)
+
+
+def workbook(rows: int, sheets: int) -> str:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = os.path.join(CACHE_DIR, f"sales_{rows}_{sheets}.xlsx")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        write_workbook(path, synthetic(rows), sheets)
+        print(f"  generated {os.path.basename(path)} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - start:.0f}s")
+    return path
+
+
+def best(fn, repeats: int):
+    times, out = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+
+def main(sizes, repeats: int) -> None:
+    print(f"engines: calamine {'installed' if excel.python_calamine else 'NOT installed'}, {excel.MAX_WORKERS} sheet workers")
+    for rows in sizes:
+        print(f"\n{rows:,} rows")
+        single = workbook(rows, 1)
+        split = workbook(rows, SHEETS)
+        cases = [
+            ("pd.read_excel (openpyxl)", lambda: pd.read_excel(single, header=1)),
+            ("excel openpyxl read_only", lambda: excel.read_excel(single, engine="openpyxl")),
+        ]
+        if excel.python_calamine:
+            cases.append(("excel calamine", lambda: excel.read_excel(single, engine="calamine")))
+        cases += [
+            (f"{SHEETS} sheets, sequential", lambda: excel.read_sales_workbook(split, max_workers=1)),
+            (f"{SHEETS} sheets, parallel", lambda: excel.read_sales_workbook(split)),
+        ]
+        base = None
+        for name, fn in cases:
+            # pandas' openpyxl path is slow enough that one run of 1M rows is plenty
+            seconds, df = best(fn, 1 if name.startswith("pd.") and rows >= 500_000 else repeats)
+            assert len(df) == rows, (name, len(df))
+            base = base or seconds
+            print(f"  {name:28s} {seconds:8.2f}s  {rows / seconds:12,.0f} rows/s  x{base / seconds:5.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [50_000, 200_000, 1_000_000]
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    main(sizes, repeats)
@@ -0,0 +1,90 @@
+"""
+Fuzzy customer-name matching (shared/fuzzy.py) against synthetic customer masters.
+
+    python scripts/bench_fuzzy.py [master_sizes] [queries]
+
+Default: masters of 10k and 100k names, 2000 queries (misspelt, abbreviated or
+re-punctuated master names, plus names not in the master). Reports index build time,
+lookup time cold and from the score cache, how many queries found their own customer,
+and the time to score a sample of queries against every master entry (no blocking),
+extrapolated to all queries.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from shared.fuzzy import FuzzyNameIndex, core_name, dice  # noqa: E402
+
+WORDS = [
+    "SHREE", "GANESH", "BHARAT", "ELETTRO", "POWER", "SWITCHGEAR", "CABLE", "WIRE", "LAXMI", "SAI", "OM",
+    "KRISHNA", "PATEL", "SHAH", "MEHTA", "INDO", "GLOBAL", "TECHNO", "ELECTRO", "CONTROLS", "SYSTEMS",
+    "AUTOMATION", "TRADING", "TRADERS", "AGENCIES", "SALES", "SERVICES", "SUPPLY", "INFRA", "PROJECTS",
+    "VIJAY", "RAJ", "MAHAVIR", "JAIN", "NATIONAL", "UNITED", "STAR", "SUN", "ROYAL", "MODERN",
+]
+SUFFIXES = ["PRIVATE LIMITED", "PVT LTD", "LIMITED", "ENTERPRISES", "INDUSTRIES", "ENGINEERING", "& CO", "LLP", ""]
+
+
+def master_names(size: int, rng) -> list:
+    names, seen = [], set()
+    while len(names) < size:
+        words = rng.choice(WORDS, rng.integers(2, 4), replace=False)
+        name = f"{' '.join(words)} {rng.integers(1, 999)} {rng.choice(SUFFIXES)}".strip()
+        if core_name(name) not in seen:
+            seen.add(core_name(name))
+            names.append(name)
+    return names
+
+
+def perturb(name: str, rng) -> str:
+    out = name.replace("PRIVATE LIMITED", "PVT. LTD.").replace("ENTERPRISES", "ENT.")
+    if rng.random() < 0.5:
+        i = int(rng.integers(0, len(out)))
+        if out[i].isalpha():
+            out = out[:i] + out[i + 1:]  # one dropped letter
+    return ("M/S " if rng.random() < 0.3 else "") + out.title()
+
+
+def main(sizes, queries: int) -> None:
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        names = master_names(size, rng)
+        picks = rng.integers(0, size, queries)
+        batch = [perturb(names[i], rng) for i in picks[: queries * 4 // 5]]
+        batch += [f"UNKNOWN CUSTOMER {i} STORES" for i in range(queries - len(batch))]
+        print(f"\nmaster {size:,} names, {queries:,} queries")
+
+        started = time.perf_counter()
+        index = FuzzyNameIndex(names)
+        print(f"  build index      {(time.perf_counter() - started) * 1000:9.1f} ms  ({len(index._postings):,} blocking keys)")
+
+        started = time.perf_counter()
+        found = index.match_many(batch)
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        index.match_many(batch)
+        warm = time.perf_counter() - started
+        known, expected = found[: queries * 4 // 5], picks[: queries * 4 // 5]
+        own = (known == expected).mean()
+        wrong = ((known >= 0) & (known != expected)).mean()
+        false = (found[queries * 4 // 5:] >= 0).mean()
+        print(f"  match cold       {cold * 1000:9.1f} ms  {cold / queries * 1e6:8.1f} us/query")
+        print(f"  match cached     {warm * 1000:9.1f} ms  {warm / queries * 1e6:8.1f} us/query")
+        print(f"  own customer found {own:.1%}, another customer {wrong:.1%}, unknown names matched {false:.1%}")
+
+        sample = [core_name(n) for n in batch[:20]]
+        cores = index.cores
+        started = time.perf_counter()
+        for q in sample:
+            max(range(len(cores)), key=lambda i: dice(q, cores[i]))
+        brute = (time.perf_counter() - started) / len(sample) * queries
+        print(f"  without blocking ~{brute * 1000:9.0f} ms for all queries (x{brute / cold:.0f})")
+
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000]
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(sizes, queries)
@@ -0,0 +1,155 @@
+"""
+Per-request overhead of the HTTP edge middleware: the previous stack (TimeoutMiddleware +
+CorsAllMiddleware as BaseHTTPMiddleware, CORSMiddleware, GZipMiddleware) against the
+single pure-ASGI EdgeMiddleware, both around the same bare app.
+
+    python scripts/bench_middleware.py [requests] [rows]
+
+Requests are driven as direct ASGI calls (no network, no HTTP client), so the numbers are
+handler time + middleware time. "overhead" is the difference to the bare app.
+/api/metrics/summary runs on a synthetic in-memory tenant frame; the response cache is
+left out of all variants so every request runs the handler.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend")))
+os.environ.setdefault("WORKER_PROCESSES", "0")
+
+from fastapi import FastAPI, HTTPException, Request  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.middleware.gzip import GZipMiddleware  # noqa: E402
+from starlette.responses import Response  # noqa: E402
+
+from api.edge import EdgeMiddleware  # noqa: E402
+from api.routes import router  # noqa: E402
+
+TENANT = "bench"
+
+
+class TimeoutMiddleware(BaseHTTPMiddleware):
+    """Previous main.py TimeoutMiddleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await asyncio.wait_for(call_next(request), timeout=60)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Request timed out.")
+
+
+class CorsAllMiddleware(BaseHTTPMiddleware):
+    """Previous main.py CorsAllMiddleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "OPTIONS":
+            return Response(status_code=200, headers={"Access-Control-Allow-Origin": "*"})
+        response = await call_next(request)
+        response.headers["Access-Control-Allow-Origin"] = "*"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "*"
+        return response
+
+
+def bare_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+
+    @app.get("/")
+    def root():
+        return {"status": "ok", "message": "ELETTRO Intelligence API is running."}
+
+    return app
+
+
+def old_stack() -> FastAPI:
+    app = bare_app()
+    app.add_middleware(GZipMiddleware, minimum_size=500)
+    app.add_middleware(CorsAllMiddleware)
+    app.add_middleware(TimeoutMiddleware)
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"], expose_headers=["Content-Disposition"])
+    return app
+
+
+def new_stack() -> FastAPI:
+    app = bare_app()
+    app.add_middleware(EdgeMiddleware)
+    return app
+
+
+def install_tenant(rows: int) -> None:
+    from api import db
+
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2023-04-01") + pd.to_timedelta(rng.integers(0, 900, rows), unit="D")
+    df = pd.DataFrame({
+        "DATE": dates,
+        "INVOICE_NO": np.char.add("INV", (np.arange(rows) // 3).astype(str)),
+        "CUSTOMER_NAME": np.char.add("CUST ", rng.integers(0, 300, rows).astype(str)),
+        "STATE": rng.choice(["MAHARASHTRA", "DELHI", "GUJARAT"], rows),
+        "CITY": rng.choice(["MUMBAI", "PUNE", "DELHI", "SURAT"], rows),
+        "MATERIALGROUP": rng.choice(["CABLE TIE", "GLAND", "LUGS", "CLIPS"], rows),
+        "QTY": rng.integers(1, 100, rows),
+        "AMOUNT": rng.random(rows) * 10000,
+    }).sort_values("DATE", ignore_index=True)
+    db.tenant_cache[(TENANT,)] = df
+
+
+async def call(app, path: str, query: bytes = b"") -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query, "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"bench"), (b"origin", b"http://localhost:3000"), (b"accept-encoding", b"gzip, deflate, br")],
+    }
+    status = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    await app(scope, receive, send)
+    return status["code"]
+
+
+async def measure(app, path: str, query: bytes, n: int) -> list:
+    for _ in range(min(50, n)):
+        await call(app, path, query)
+    times = []
+    for _ in range(n):
+        start = time.perf_counter()
+        code = await call(app, path, query)
+        times.append(time.perf_counter() - start)
+        assert code == 200, code
+    return times
+
+
+async def main(n: int, rows: int) -> None:
+    install_tenant(rows)
+    apps = {"bare": bare_app(), "old stack": old_stack(), "pure ASGI": new_stack()}
+    targets = [("/", b""), ("/api/metrics/summary", f"tenant_id={TENANT}".encode())]
+    for path, query in targets:
+        print(f"\n{path}  ({n} requests)")
+        medians = {}
+        for name, app in apps.items():
+            times = await measure(app, path, query, n)
+            med = statistics.median(times) * 1e6
+            medians[name] = med
+            p99 = sorted(times)[int(len(times) * 0.99) - 1] * 1e6
+            overhead = "" if name == "bare" else f"  overhead {med - medians['bare']:8.1f} us"
+            print(f"  {name:10s} median {med:9.1f} us  p99 {p99:9.1f} us{overhead}")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    asyncio.run(main(n, rows))
@@ -0,0 +1,87 @@
+"""
+Benchmark the shared RFM engine against the previous groupby/lambda + qcut implementation.
+
+    python scripts/bench_rfm.py [customers] [rows_per_customer]
+
+Defaults: 100,000 customers x 8 invoice lines.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import rfm as rfm_engine  # noqa: E402
+
+
+def make_frame(customers: int, per_customer: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = customers * per_customer
+    return pd.DataFrame({
+        "CUSTOMER_NAME": np.char.add("CUSTOMER ", rng.integers(0, customers, n).astype(str)),
+        "INVOICE_NO": np.char.add("INV", rng.integers(0, n // 3, n).astype(str)),
+        "DATE": pd.Timestamp("2022-04-01") + pd.to_timedelta(rng.integers(0, 1100, n), unit="D"),
+        "AMOUNT": rng.gamma(2.0, 5000.0, n),
+    })
+
+
+def baseline(df: pd.DataFrame) -> pd.DataFrame:
+    max_date = df["DATE"].max()
+    rfm = df.groupby("CUSTOMER_NAME").agg(
+        Recency=("DATE", lambda x: (max_date - x.max()).days),
+        Frequency=("INVOICE_NO", "nunique"),
+        Monetary=("AMOUNT", "sum"),
+    ).reset_index()
+    for col in ["Recency", "Frequency", "Monetary"]:
+        labels = [4, 3, 2, 1] if col == "Recency" else [1, 2, 3, 4]
+        try:
+            rfm[f"{col}_Score"] = pd.qcut(rfm[col], q=4, labels=labels, duplicates="drop").astype(int)
+        except ValueError:
+            # Tied quartile edges: the old code raised here
+            rfm[f"{col}_Score"] = pd.qcut(rfm[col].rank(method="first"), q=4, labels=labels).astype(int)
+    rfm["RFM_Score"] = rfm["Recency_Score"] + rfm["Frequency_Score"] + rfm["Monetary_Score"]
+
+    def segment(score):
+        if score >= 10: return "Champions"
+        elif score >= 8: return "Loyal"
+        elif score >= 6: return "Potential"
+        elif score >= 4: return "At Risk"
+        else: return "Lost"
+    rfm["Segment"] = rfm["RFM_Score"].apply(segment)
+    return rfm
+
+
+def engine(df: pd.DataFrame) -> pd.DataFrame:
+    rfm = rfm_engine.score(rfm_engine.rfm_table(df))
+    rfm["Segment"] = rfm_engine.score_segments(rfm["RFM_Score"])
+    return rfm
+
+
+def best_of(fn, df, repeat=3):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn(df)
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+
+if __name__ == "__main__":
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    per_customer = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    df = make_frame(customers, per_customer)
+    print(f"{len(df):,} rows, {df['CUSTOMER_NAME'].nunique():,} customers")
+
+    t_old, old = best_of(baseline, df, repeat=1)
+    t_new, new = best_of(engine, df)
+    same = (
+        old["CUSTOMER_NAME"].tolist() == new["CUSTOMER_NAME"].tolist()
+        and np.array_equal(old["Recency"].to_numpy(), new["Recency"].to_numpy())
+        and np.array_equal(old["Frequency"].to_numpy(), new["Frequency"].to_numpy())
+        and np.allclose(old["Monetary"].to_numpy(), new["Monetary"].to_numpy())
+    )
+    print(f"groupby + lambda + qcut : {t_old * 1000:9.1f} ms")
+    print(f"shared.rfm engine       : {t_new * 1000:9.1f} ms  ({t_old / t_new:.1f}x)")
+    print(f"metrics identical       : {same}")
@@ -0,0 +1 @@
+"""Python shared by the FastAPI backend and the legacy Streamlit app (keep free of framework imports)."""
@@ -0,0 +1,318 @@
+"""
+Fast Excel reader for sales uploads, the customer master and the legacy ETL.
+
+pd.read_excel with its default engine builds an openpyxl cell object for every cell of
+the workbook before pandas sees a value. This reader:
+
+- uses the Rust calamine parser (python-calamine) when it is installed, and otherwise
+  openpyxl in read_only mode, which streams rows as plain value tuples;
+- finds the header row itself (title/period lines above the table, as in ERP sales
+  registers, are skipped) instead of assuming row 0;
+- materializes only the wanted columns (usecols) and builds each column in one pass;
+- parses several sheets in parallel worker processes when a workbook is large enough
+  for that to pay off.
+
+The result matches pd.read_excel for ordinary sheets: mangled duplicate headers
+("A", "A.1"), "Unnamed: n" for blank headers, blank rows dropped, whole-number floats as
+ints, and Excel dates as datetime64. `.xls` files go through calamine, or pd.read_excel
+when calamine is missing.
+"""
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import python_calamine
+except ImportError:  # optional: openpyxl read_only is the fallback
+    python_calamine = None
+
+# "calamine" or "openpyxl" forces an engine; default: calamine when installed
+ENGINE = os.environ.get("EXCEL_ENGINE", "").strip().lower() or None
+# Rows scanned for the header; a header is a mostly-text row at least half as wide as the widest row seen
+HEADER_SCAN_ROWS = 30
+# Sheets are parsed in parallel processes only for files at least this large
+PARALLEL_MIN_BYTES = int(os.environ.get("EXCEL_PARALLEL_MIN_BYTES", str(4 * 1024 * 1024)))
+MAX_WORKERS = int(os.environ.get("EXCEL_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+Source = Union[str, os.PathLike, BinaryIO]
+UseCols = Optional[Union[Sequence[str], Callable[[str], bool]]]
+
+
+def default_engine() -> str:
+    if ENGINE in ("calamine", "openpyxl"):
+        return "calamine" if ENGINE == "calamine" and python_calamine is not None else "openpyxl"
+    return "calamine" if python_calamine is not None else "openpyxl"
+
+
+def _is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _is_xls(source) -> bool:
+    return _is_path(source) and os.fspath(source).lower().endswith(".xls")
+
+
+# ─── workbook access ───
+
+def _rewind(source) -> None:
+    if not _is_path(source) and hasattr(source, "seek"):
+        source.seek(0)
+
+
+def sheet_names(source: Source, engine: Optional[str] = None) -> List[str]:
+    engine = engine or default_engine()
+    _rewind(source)
+    if engine == "calamine":
+        wb = python_calamine.CalamineWorkbook.from_path(os.fspath(source)) if _is_path(source) else python_calamine.CalamineWorkbook.from_filelike(source)
+        return list(wb.sheet_names)
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def _sheet_rows(source: Source, sheet: Union[int, str], engine: str, max_rows: Optional[int] = None) -> List[Sequence]:
+    """Cell values of one sheet as a list of row sequences (blank cells: None or "")."""
+    _rewind(source)
+    if engine == "calamine":
+        wb = python_calamine.CalamineWorkbook.from_path(os.fspath(source)) if _is_path(source) else python_calamine.CalamineWorkbook.from_filelike(source)
+        ws = wb.get_sheet_by_index(sheet) if isinstance(sheet, int) else wb.get_sheet_by_name(sheet)
+        return ws.to_python(skip_empty_area=False, nrows=max_rows) if max_rows else ws.to_python(skip_empty_area=False)
+
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        # Exports often carry a wrong <dimension>; recompute it from the cells actually present
+        ws.reset_dimensions()
+        return list(ws.iter_rows(max_row=max_rows, values_only=True))
+    finally:
+        wb.close()
+
+
+# ─── rows -> DataFrame ───
+
+def _blank(v) -> bool:
+    return v is None or v == ""
+
+
+def detect_header(rows: Sequence[Sequence], scan: int = HEADER_SCAN_ROWS) -> int:
+    """Index of the header row among the first `scan` rows (0 when nothing looks like a header)."""
+    window = rows[:scan]
+    filled = [sum(1 for v in row if not _blank(v)) for row in window]
+    widest = max(filled, default=0)
+    for i, row in enumerate(window):
+        if filled[i] < max(2, widest / 2):
+            continue
+        texts = sum(1 for v in row if isinstance(v, str) and v.strip())
+        if texts >= 0.8 * filled[i]:
+            return i
+    return 0
+
+
+def _column_names(header_row: Sequence, width: int) -> List[str]:
+    names, seen = [], {}
+    for i in range(width):
+        v = header_row[i] if i < len(header_row) else None
+        name = f"Unnamed: {i}" if _blank(v) else v
+        # Same mangling as pandas: A, A.1, A.2
+        key = name
+        if key in seen:
+            seen[key] += 1
+            name = f"{key}.{seen[key]}"
+        else:
+            seen[key] = 0
+        names.append(name)
+    return names
+
+
+def _wanted(names: List, usecols: UseCols) -> List[int]:
+    if usecols is None:
+        return list(range(len(names)))
+    if callable(usecols):
+        return [i for i, n in enumerate(names) if usecols(str(n))]
+    want = {str(c).strip().upper() for c in usecols}
+    return [i for i, n in enumerate(names) if str(n).strip().upper() in want]
+
+
+def _convert(values: tuple) -> pd.Series:
+    """One column of raw cell values -> typed Series (float/int/datetime/str/object)."""
+    arr = np.array(values, dtype=object)
+    if len(arr):
+        arr[arr == ""] = None
+    s = pd.Series(arr, dtype=object)
+    kind = pd.api.types.infer_dtype(s, skipna=True)
+    if kind in ("date", "datetime", "datetime64"):
+        out = pd.to_datetime(s, errors="coerce")
+        # calamine hands midnight values back as date objects; keep the unit pandas uses for datetimes
+        return out.astype("datetime64[us]") if out.dt.unit == "s" else out
+    if kind in ("floating", "integer", "mixed-integer-float"):
+        s = pd.to_numeric(s)
+        if s.dtype.kind == "f" and not s.isna().any() and np.array_equal(s, np.floor(s)):
+            return s.astype("int64")
+        return s
+    if kind in ("mixed", "mixed-integer"):
+        # Text codes mixed with numbers (e.g. invoice numbers): whole floats read as ints, like pandas
+        return pd.Series([int(v) if isinstance(v, float) and v.is_integer() else v for v in arr], dtype=object)
+    return s.infer_objects()
+
+
+def frame_from_rows(rows: Sequence[Sequence], usecols: UseCols = None, header: Union[str, int, None] = "auto") -> pd.DataFrame:
+    """Build a DataFrame from sheet rows: header detection, usecols, column-at-a-time typing."""
+    if not rows:
+        return pd.DataFrame()
+    width = max(len(r) for r in rows)
+    if header is None:
+        names, body = list(range(width)), rows
+    else:
+        h = detect_header(rows) if header == "auto" else int(header)
+        names, body = _column_names(rows[h], width), rows[h + 1:]
+    keep = _wanted(names, usecols)
+
+    if body and any(len(r) != width for r in body):
+        body = [tuple(r) + (None,) * (width - len(r)) for r in body]
+    columns = list(zip(*body)) if body else [()] * width
+    df = pd.DataFrame({names[i]: _convert(columns[i]) for i in keep})
+    df = df.dropna(how="all").reset_index(drop=True)
+    if header is not None:
+        # Blank-headed columns with no data are formatting, not data
+        empty = [names[i] for i in keep if str(names[i]).startswith("Unnamed: ") and df[names[i]].isna().all()]
+        if empty:
+            df = df.drop(columns=empty)
+    return df
+
+
+def _read_sheet(source: Source, sheet: Union[int, str], usecols: UseCols, header, engine: str) -> pd.DataFrame:
+    return frame_from_rows(_sheet_rows(source, sheet, engine), usecols=usecols, header=header)
+
+
+# ─── public API ───
+
+def read_excel(
+    source: Source,
+    sheet_name: Union[int, str, List[Union[int, str]], None] = 0,
+    usecols: UseCols = None,
+    header: Union[str, int, None] = "auto",
+    engine: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> Union[pd.DataFrame, Dict[Union[int, str], pd.DataFrame]]:
+    """
+    Drop-in for pd.read_excel. sheet_name: one sheet (index or name) -> DataFrame; a list,
+    or None for every sheet -> {sheet: DataFrame}, parsed in parallel for large files.
+    usecols: column names (case-insensitive) or a predicate on the header text.
+    header: "auto" (detect), a row index, or None.
+    """
+    if _is_xls(source) and python_calamine is None:
+        return pd.read_excel(source, sheet_name=sheet_name, header=0 if header == "auto" else header,
+                             usecols=usecols if callable(usecols) or usecols is None else list(usecols))
+    engine = engine or default_engine()
+    if _is_xls(source):
+        engine = "calamine"
+    if isinstance(sheet_name, (int, str)):
+        return _read_sheet(source, sheet_name, usecols, header, engine)
+    sheets = sheet_names(source, engine) if sheet_name is None else list(sheet_name)
+    return dict(zip(sheets, _read_sheets(source, sheets, usecols, header, engine, max_workers)))
+
+
+def _read_sheets(source: Source, sheets: List, usecols: UseCols, header, engine: str, max_workers: Optional[int]) -> List[pd.DataFrame]:
+    workers = min(len(sheets), max_workers or MAX_WORKERS)
+    parallel = workers > 1 and _is_path(source) and os.path.getsize(source) >= PARALLEL_MIN_BYTES
+    if parallel:
+        try:
+            # spawn: safe to start from a threaded server process (no forked locks)
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                return list(pool.map(_read_sheet, [os.fspath(source)] * len(sheets), sheets,
+                                     [usecols] * len(sheets), [header] * len(sheets), [engine] * len(sheets)))
+        except (pickle.PicklingError, AttributeError, TypeError, OSError, BrokenProcessPool):
+            pass  # usecols not picklable, or no process support here: read sequentially
+    return [_read_sheet(source, s, usecols, header, engine) for s in sheets]
+
+
+def read_sales_workbook(source: Source, usecols: UseCols = None, engine: Optional[str] = None, max_workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    The first sheet, plus any later sheet whose header matches it (large exports are split
+    across sheets at Excel's row limit), concatenated. Matching sheets are parsed in parallel.
+    """
+    if _is_xls(source) and python_calamine is None:
+        return read_excel(source, usecols=usecols)
+    engine = "calamine" if _is_xls(source) else (engine or default_engine())
+    names = sheet_names(source, engine)
+    if len(names) <= 1:
+        return _read_sheet(source, 0, usecols, "auto", engine)
+
+    def header_of(sheet):
+        rows = _sheet_rows(source, sheet, engine, max_rows=HEADER_SCAN_ROWS)
+        if not rows:
+            return None
+        width = max(len(r) for r in rows)
+        return [n for n in _column_names(rows[detect_header(rows)], width) if not str(n).startswith("Unnamed: ")]
+
+    first = header_of(names[0])
+    sheets = [names[0]] + [s for s in names[1:] if first and header_of(s) == first]
+    frames = _read_sheets(source, sheets, usecols, "auto", engine, max_workers)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def read_table(source: Source, filename: Optional[str] = None, usecols: UseCols = None) -> pd.DataFrame:
+    """CSV or Excel by file name (path sources default to their own name); Excel via read_sales_workbook."""
+    name = (filename or (os.fspath(source) if _is_path(source) else "")).lower()
+    if name.endswith(".csv"):
+        return pd.read_csv(source, usecols=_csv_usecols(usecols))
+    return read_sales_workbook(source, usecols=usecols)
+
+
+def _read_file(path: str, usecols: UseCols):
+    """Worker: read_table that hands back the exception instead of failing the whole batch."""
+    try:
+        return read_table(path, usecols=usecols)
+    except Exception as e:
+        return e
+
+
+def read_files(paths: Sequence[str], usecols: UseCols = None, max_workers: Optional[int] = None) -> List[Union[pd.DataFrame, Exception]]:
+    """
+    read_table for several files, in parallel worker processes when the batch is large enough.
+    One result per path, in order: a DataFrame, or the exception that file raised.
+    """
+    paths = [os.fspath(p) for p in paths]
+    workers = min(len(paths), max_workers or MAX_WORKERS)
+    if workers > 1 and sum(os.path.getsize(p) for p in paths if os.path.exists(p)) >= PARALLEL_MIN_BYTES:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+                return list(pool.map(_read_file, paths, [usecols] * len(paths)))
+        except (pickle.PicklingError, AttributeError, TypeError, OSError, BrokenProcessPool):
+            pass
+    return [_read_file(p, usecols) for p in paths]
+
+
+def _csv_usecols(usecols: UseCols):
+    if usecols is None or callable(usecols):
+        return usecols
+    want = {str(c).strip().upper() for c in usecols}
+    return lambda name: str(name).strip().upper() in want
+
+
+def column_filter(keywords: Iterable[str]) -> Callable[[str], bool]:
+    """usecols predicate: headers containing any of the keywords (case-insensitive)."""
+    return _KeywordFilter(tuple(k.upper() for k in keywords))
+
+
+class _KeywordFilter:
+    """Picklable (module-level) so it can be sent to sheet worker processes."""
+
+    def __init__(self, keywords: tuple):
+        self.keywords = keywords
+
+    def __call__(self, name: str) -> bool:
+        upper = str(name).upper()
+        return any(k in upper for k in self.keywords)
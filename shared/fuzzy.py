@@ -0,0 +1,184 @@
+"""
+Fuzzy customer-name matching with a blocking index.
+
+ERP exports and the customer master spell the same customer differently ("K.N. ELETTRO
+PVT LTD" vs "KN ELETTRO PRIVATE LIMITED", "M/S Shree Ganesh Ent." vs "SHREE GANESH
+ENTERPRISES"). Names are first reduced to a core: upper-case, punctuation folded,
+common abbreviations expanded, legal-form words (PRIVATE, LIMITED, ...) dropped, tokens
+sorted. Two names with the same core match exactly; otherwise they are scored by the
+Dice coefficient of the core's character trigrams. Names whose numbers differ ("... UNIT 1"
+vs "... UNIT 2") are different customers (branches, plants) and never match.
+
+To avoid comparing every incoming name with every master entry, an inverted index maps
+blocking keys (core tokens and core trigrams) to master entries. A query only scores the
+entries sharing the most keys with it; keys that occur in more than MAX_BLOCK entries
+carry no signal and are skipped, so lookups stay cheap with 100k master entries. Results
+are cached per index (it lives as long as the tenant's master), so names seen in earlier
+uploads are not matched again.
+"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+FUZZY_MATCH_THRESHOLD = float(os.environ.get("FUZZY_MATCH_THRESHOLD", "0.85"))
+FUZZY_CACHE_SIZE = int(os.environ.get("FUZZY_CACHE_SIZE", "50000"))
+# Master entries scored per query, and the posting-list size above which a key is ignored
+MAX_CANDIDATES = 50
+MAX_BLOCK = 2000
+
+ABBREVIATIONS = {
+    "PVT": "PRIVATE", "PRIV": "PRIVATE", "LTD": "LIMITED", "LIM": "LIMITED", "CO": "COMPANY",
+    "CORP": "CORPORATION", "INC": "INCORPORATED", "MFG": "MANUFACTURING", "ENGG": "ENGINEERING",
+    "ENGRS": "ENGINEERS", "ENT": "ENTERPRISES", "ENTP": "ENTERPRISES", "ENTERPRISE": "ENTERPRISES",
+    "INDS": "INDUSTRIES", "INDUSTRY": "INDUSTRIES", "INTL": "INTERNATIONAL", "BROS": "BROTHERS",
+    "ELECT": "ELECTRICALS", "ELECTRICAL": "ELECTRICALS", "TECH": "TECHNOLOGIES", "SHRI": "SHREE", "SRI": "SHREE",
+}
+# Legal-form and filler words: not part of the core name
+NOISE = {"PRIVATE", "LIMITED", "COMPANY", "CORPORATION", "INCORPORATED", "LLP", "THE", "AND", "OF"}
+
+_PREFIX = re.compile(r"^\s*M\s*/\s*S\b\.?\s*")
+_JOINED = re.compile(r"[.'`]")
+_SEPARATORS = re.compile(r"[^A-Z0-9]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def _join_initials(tokens: List[str]) -> List[str]:
+    """"R K ENTERPRISES" -> "RK ENTERPRISES": runs of single letters are one token."""
+    out: List[str] = []
+    run = ""
+    for t in tokens + [""]:
+        if len(t) == 1:
+            run += t
+            continue
+        if run:
+            out.append(run)
+            run = ""
+        if t:
+            out.append(t)
+    return out
+
+
+def core_name(name) -> str:
+    """Canonical form used for matching: "K.N. Elettro Pvt. Ltd." -> "ELETTRO KN"."""
+    text = _PREFIX.sub("", str(name).upper().replace("&", " AND "))
+    tokens = [ABBREVIATIONS.get(t, t) for t in _join_initials(_SEPARATORS.split(_JOINED.sub("", text))) if t]
+    core = [t for t in tokens if t not in NOISE] or tokens
+    return " ".join(sorted(core))
+
+
+def _trigrams(core: str) -> set:
+    compact = "^" + core.replace(" ", "") + "$"
+    return {compact[i:i + 3] for i in range(len(compact) - 2)}
+
+
+def _keys(core: str) -> set:
+    return {"t:" + t for t in core.split() if len(t) > 1} | {"g:" + g for g in _trigrams(core)}
+
+
+def _numbers(core: str) -> List[str]:
+    return sorted(n.lstrip("0") or "0" for n in _NUMBER.findall(core))
+
+
+def dice(a: str, b: str) -> float:
+    """Dice coefficient of two cores' trigram sets (1.0 = same core)."""
+    if a == b:
+        return 1.0
+    ga, gb = _trigrams(a), _trigrams(b)
+    if not ga or not gb:
+        return 0.0
+    return 2 * len(ga & gb) / (len(ga) + len(gb))
+
+
+class FuzzyNameIndex:
+    """Blocking index over master names; match() returns (position, score) or (-1, best score)."""
+
+    def __init__(
+        self,
+        names: Sequence,
+        threshold: float = FUZZY_MATCH_THRESHOLD,
+        max_candidates: int = MAX_CANDIDATES,
+        max_block: int = MAX_BLOCK,
+        cache_size: int = FUZZY_CACHE_SIZE,
+    ):
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self.max_block = max_block
+        self.cache_size = cache_size
+        self.cores: List[str] = [core_name(n) for n in names]
+        # Exact core matches need no scoring (first master entry wins)
+        self._exact: Dict[str, int] = {}
+        postings: Dict[str, List[int]] = {}
+        for i, core in enumerate(self.cores):
+            if not core or core in self._exact:
+                continue
+            self._exact[core] = i
+            for key in _keys(core):
+                postings.setdefault(key, []).append(i)
+        self._postings = {k: np.asarray(v, dtype=np.int64) for k, v in postings.items()}
+        self._cache: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __len__(self) -> int:
+        return len(self.cores)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _candidates(self, core: str) -> Iterable[int]:
+        lists = [self._postings[k] for k in _keys(core) if k in self._postings]
+        if not lists:
+            return []
+        useful = [p for p in lists if len(p) <= self.max_block]
+        if not useful:
+            # Only very common keys: the rarest few still narrow it down
+            useful = sorted(lists, key=len)[:3]
+        counts = Counter(np.concatenate(useful).tolist())
+        return [i for i, _ in counts.most_common(self.max_candidates)]
+
+    def _score(self, core: str) -> Tuple[int, float]:
+        exact = self._exact.get(core)
+        if exact is not None:
+            return exact, 1.0
+        best, best_score = -1, 0.0
+        numbers = _numbers(core)
+        for i in self._candidates(core):
+            if _numbers(self.cores[i]) != numbers:
+                continue
+            score = dice(core, self.cores[i])
+            if score > best_score or (score == best_score and best >= 0 and i < best):
+                best, best_score = i, score
+        return (best if best_score >= self.threshold else -1), round(best_score, 4)
+
+    def match(self, name) -> Tuple[int, float]:
+        core = core_name(name)
+        if not core:
+            return -1, 0.0
+        with self._lock:
+            hit = self._cache.get(core)
+            if hit is not None:
+                self._cache.move_to_end(core)
+                self.cache_hits += 1
+                return hit
+        result = self._score(core)
+        with self._lock:
+            self.cache_misses += 1
+            self._cache[core] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def match_many(self, names: Sequence) -> np.ndarray:
+        """Master position per name (-1 where nothing scores above the threshold)."""
+        return np.fromiter((self.match(n)[0] for n in names), dtype=np.int64, count=len(names))
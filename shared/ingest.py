@@ -0,0 +1,504 @@
+"""
+Sales ingest pipeline: the transform chain between a parsed upload and the database.
+
+One ordered list of named, vectorized stages (DataFrame -> DataFrame) shared by the
+backend upload job, the backend batch upload and the legacy ETL, so the three can no
+longer drift apart. Pipeline.run() records rows in / rows out and seconds for every
+stage. Text columns with few distinct values (STATE, CITY, dates by month) are
+transformed once per unique value and mapped back with the factorize codes, instead of
+row by row; so are the material group rules, compiled into one matcher (MaterialRules).
+
+    pipe = sales_pipeline(master=CustomerIndex.from_frame(customer_master_df))
+    df, stats = pipe.run(df, on_step=lambda step: ...)
+"""
+import re
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .fuzzy import FuzzyNameIndex
+
+# Header keywords standardize() maps to CITY / STATE / CUSTOMER_NAME
+CITY_KEYWORDS = ["CITY", "TOWN", "DISTRICT", "LOCATION", "STATION", "DESTINATION", "PLACE"]
+STATE_KEYWORDS = ["STATE", "REGION", "PROVINCE", "TERRITORY", "POS", "SUPPLY"]
+CUSTOMER_KEYWORDS = ["CUSTOMER", "PARTY", "BILL TO", "BUYER", "DEBTOR"]
+ITEM_KEYWORDS = ["ITEM", "MATERIAL", "PRODUCT", "DESCRIPTION", "PART"]
+INVOICE_KEYWORDS = ["INVOICE", "BILL_NO", "DOC_NO", "VOUCHER"]
+MASTER_COLUMN_KEYWORDS = CITY_KEYWORDS + STATE_KEYWORDS + CUSTOMER_KEYWORDS
+
+# Keyword-based exclusion: row excluded if material group CONTAINS any of these (case-insensitive)
+EXCLUDE_KEYWORDS = [
+    "SERVICE", "AIR VENT", "PACKING", "RAW", "BRASS", "PANEL",
+    "SALES ACCOUNT", "MASTER BATCH", "SEMI", "PPCP", "FIXED",
+    "PROTECTION", "HIPS", "ABS", "INDIRECT", "NYLOAN", "PP BLACK",
+    "NASER MILES PARIS", "DOCUMENT HOLDER",
+    "SWISS MILITARY MODLE MAZE",
+    "SELF ADHESIVE TIE MOUNT", "SCREW TYPE TIE MOUNT",
+    "FINISHED GOOD",
+]
+
+# Rename mappings: regex pattern -> standardized name (applied before exclusion)
+MATERIAL_GROUP_MAPPINGS = {
+    r"CONDUIT.*GLAND": "POLYAMIDE CONDUIT GLAND",
+    r"REVER": "REVERSE FORWARD",
+    r"REVERSE FORWORD": "REVERSE FORWARD",
+}
+
+MATERIAL_GROUP_COLUMNS = [
+    "ITEM_NAME_GROUP", "MATERIALGROUP", "MATERIAL_GROUP", "PRODUCT_CATEGORY", "CATEGORY", "ITEM_GROUP",
+    "item_name_group", "materialgroup", "material_group", "product_category", "category", "item_group",
+]
+
+# Single canonical placeholders for missing geography
+STATE_PLACEHOLDER = "State Not Found"
+CITY_PLACEHOLDER = "City Not Found"
+
+# Fallback when neither the file nor the customer master gives a state
+CITY_STATE_MAP = {
+    "MUMBAI": "MAHARASHTRA", "PUNE": "MAHARASHTRA", "NAGPUR": "MAHARASHTRA", "NASHIK": "MAHARASHTRA",
+    "THANE": "MAHARASHTRA", "AURANGABAD": "MAHARASHTRA", "PANVEL": "MAHARASHTRA", "BHIWANDI": "MAHARASHTRA",
+    "VASAI": "MAHARASHTRA",
+    "DELHI": "DELHI", "NEW DELHI": "DELHI", "GURGAON": "HARYANA", "NOIDA": "UTTAR PRADESH",
+    "LUCKNOW": "UTTAR PRADESH", "KANPUR": "UTTAR PRADESH", "CHANDIGARH": "CHANDIGARH",
+    "BANGALORE": "KARNATAKA", "BENGALURU": "KARNATAKA", "CHENNAI": "TAMIL NADU", "HOSUR": "TAMIL NADU",
+    "HYDERABAD": "TELANGANA", "SECUNDERABAD": "TELANGANA", "KOLKATA": "WEST BENGAL",
+    "AHMEDABAD": "GUJARAT", "SURAT": "GUJARAT", "VADODARA": "GUJARAT", "VAPI": "GUJARAT", "RAJKOT": "GUJARAT",
+    "JAIPUR": "RAJASTHAN", "INDORE": "MADHYA PRADESH", "BHOPAL": "MADHYA PRADESH",
+}
+
+COMPANY_STATE = "MAHARASHTRA"
+TAX_RATE = 0.18
+# States taxed as intra-state (CGST + SGST); unknown states are treated as the company's own
+INTRA_STATES = [COMPANY_STATE, "UNKNOWN", "STATE NOT FOUND"]
+TAX_COLUMNS = [
+    "TOTALAMOUNT", "TAX", "IGST", "CGST", "SGST",
+    "IGST_RATE", "CGST_RATE", "SGST_RATE",
+    "GRAND_TOTAL", "NET_AMOUNT", "TOTAL_TAX", "ROUND_OFF",
+]
+
+FY_START_MONTH = 4
+_WHITESPACE = re.compile(r"\s+")
+_MONTH_ABBR = np.array(["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], dtype=object)
+
+
+# ─── vectorized helpers ───
+
+def _per_unique(values: pd.Series, fn: Callable[[pd.Series], np.ndarray], na_value=np.nan) -> np.ndarray:
+    """fn applied to the distinct non-null values only, mapped back to every row (nulls get na_value)."""
+    codes, uniques = pd.factorize(values)
+    out = np.asarray(fn(pd.Series(uniques)), dtype=object)
+    return np.where(codes >= 0, out[np.maximum(codes, 0)] if len(out) else na_value, na_value)
+
+
+def _missing_state(values: pd.Series) -> pd.Series:
+    """True for empty states and placeholders ("State Not Found", "NOT FOUND ...")."""
+    text = values.astype(str).str.strip()
+    return text.eq("") | text.str.upper().str.contains("NOT FOUND", regex=False)
+
+
+def material_group_column(df: pd.DataFrame) -> Optional[str]:
+    """The material group column name if present (any common casing)."""
+    return next((c for c in MATERIAL_GROUP_COLUMNS if c in df.columns), None)
+
+
+def fiscal_year(dates: pd.Series, start_month: int = FY_START_MONTH) -> pd.Series:
+    """"FY24-25" style labels (April start by default); "UNKNOWN" for missing dates."""
+    dates = pd.to_datetime(dates, errors="coerce")
+    valid = dates.notna().to_numpy()
+    year = dates.dt.year.to_numpy(dtype="float64")
+    start = np.where(dates.dt.month.to_numpy(dtype="float64") >= start_month, year, year - 1)
+    starts, codes = np.unique(start[valid].astype(np.int64), return_inverse=True)
+    labels = np.array([f"FY{y % 100}-{(y + 1) % 100}" for y in starts.tolist()], dtype=object)
+    out = np.full(len(dates), "UNKNOWN", dtype=object)
+    out[valid] = labels[codes]
+    return pd.Series(out, index=dates.index)
+
+
+def month_label(dates: pd.Series) -> pd.Series:
+    """"APR-24" style labels (upper-cased %b-%y); NaN for missing dates."""
+    dates = pd.to_datetime(dates, errors="coerce")
+    valid = dates.notna().to_numpy()
+    key = dates.dt.year.to_numpy(dtype="float64") * 12 + dates.dt.month.to_numpy(dtype="float64") - 1
+    keys, codes = np.unique(key[valid].astype(np.int64), return_inverse=True)
+    labels = np.array([f"{_MONTH_ABBR[k % 12]}-{(k // 12) % 100:02d}" for k in keys.tolist()], dtype=object)
+    out = np.full(len(dates), np.nan, dtype=object)
+    out[valid] = labels[codes]
+    return pd.Series(out, index=dates.index)
+
+
+# ─── stages (DataFrame -> DataFrame) ───
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit content hash per row of a parsed upload (values and column names; not the index or row order)."""
+    header = pd.util.hash_array(np.array(["\x1f".join(map(str, df.columns))], dtype=object))[0]
+    return pd.util.hash_pandas_object(df, index=False).to_numpy() ^ header
+
+
+def merge_files(frames: List[pd.DataFrame]) -> Tuple[pd.DataFrame, np.ndarray, List[int]]:
+    """
+    Concatenate standardized files; an INVOICE_NO already seen in an earlier file is dropped from
+    later ones (what loading the files one by one did). Returns (merged, file index per row, dropped per file).
+    """
+    sizes = [len(f) for f in frames]
+    merged = pd.concat(frames, ignore_index=True)
+    file_idx = np.repeat(np.arange(len(frames)), sizes)
+    dropped = [0] * len(frames)
+    if "INVOICE_NO" not in merged.columns or merged.empty:
+        return merged, file_idx, dropped
+    inv = merged["INVOICE_NO"]
+    codes, uniques = pd.factorize(inv.where(inv.isna(), inv.astype(str)))
+    first_file = np.full(len(uniques), len(frames), dtype=np.int64)
+    has = codes >= 0
+    np.minimum.at(first_file, codes[has], file_idx[has])
+    keep = ~has | (first_file[np.where(has, codes, 0)] == file_idx)
+    dropped = np.bincount(file_idx[~keep], minlength=len(frames)).tolist()
+    return merged[keep], file_idx[keep], dropped
+
+
+def standardize(df: pd.DataFrame) -> pd.DataFrame:
+    """Upper-case, SQL-safe column names, with synonyms mapped to CITY / STATE / CUSTOMER_NAME / ITEMNAME / INVOICE_NO."""
+    if df.empty:
+        return df
+    df.columns = df.columns.str.strip().str.upper()
+    df.columns = df.columns.str.replace(".", "", regex=False).str.replace(" ", "_")
+
+    for col in list(df.columns):
+        cu = col.upper()
+        if any(x in cu for x in CITY_KEYWORDS):
+            if "CITY" not in df.columns:
+                df.rename(columns={col: "CITY"}, inplace=True)
+        elif any(x in cu for x in STATE_KEYWORDS):
+            if "STATE" not in df.columns:
+                df.rename(columns={col: "STATE"}, inplace=True)
+        elif any(x in cu for x in CUSTOMER_KEYWORDS):
+            if "CUSTOMER_NAME" not in df.columns:
+                df.rename(columns={col: "CUSTOMER_NAME"}, inplace=True)
+        # ITEM synonyms, but not GROUP columns
+        elif any(x in cu for x in ITEM_KEYWORDS):
+            if "ITEMNAME" not in df.columns and "GROUP" not in cu:
+                df.rename(columns={col: "ITEMNAME"}, inplace=True)
+        elif cu in ("NO", "NO.") or any(x in cu for x in INVOICE_KEYWORDS):
+            if "INVOICE_NO" not in df.columns and "DATE" not in cu:
+                df.rename(columns={col: "INVOICE_NO"}, inplace=True)
+    return df
+
+
+def coalesce_state_region(df: pd.DataFrame) -> pd.DataFrame:
+    """One STATE column: REGION/PROVINCE/TERRITORY fill STATE where it is empty, then are dropped."""
+    if df.empty:
+        return df
+    region_cols = [c for c in ["REGION", "PROVINCE", "TERRITORY"] if c in df.columns]
+    if "STATE" not in df.columns:
+        df["STATE"] = df[region_cols[0]] if region_cols else STATE_PLACEHOLDER
+    state = df["STATE"].fillna("").astype(str).str.strip()
+    for rc in region_cols:
+        missing = _missing_state(state)
+        state = state.mask(missing, df[rc].fillna("").astype(str).str.strip())
+    df = df.drop(columns=region_cols)
+    df["STATE"] = state.mask(state.eq(""), STATE_PLACEHOLDER)
+    return df
+
+
+def customer_key(names: pd.Series) -> pd.Series:
+    """Normalized customer name used as the master key: upper-case, no dots/commas, single spaces."""
+    return (
+        names.astype(str)
+        .str.upper()
+        .str.replace(r"[.,]", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def _blank_to_none(value):
+    if isinstance(value, str):
+        return value.strip() or None
+    return None if pd.isna(value) else value
+
+
+class CustomerIndex:
+    """
+    Customer master as a hash index: normalized customer name -> STATE / CITY. Lookups
+    normalize only the distinct names of an upload and resolve them with one
+    Index.get_indexer call; rows are then enriched by code, without merging frames.
+    Names the hash index misses go to a fuzzy matcher (shared/fuzzy.py), built on first
+    use and kept with the index, so its score cache carries over between uploads.
+    """
+
+    COLUMNS = ("STATE", "CITY")
+
+    def __init__(self, keys: pd.Index, values: Dict[str, np.ndarray], fuzzy: bool = True):
+        self.keys = keys
+        self.values = values
+        self.fuzzy = fuzzy
+        self._fuzzy_index: Optional[FuzzyNameIndex] = None
+
+    @classmethod
+    def from_frame(cls, master: pd.DataFrame) -> Optional["CustomerIndex"]:
+        """From a standardized master (CUSTOMER_NAME plus STATE and/or CITY); first row wins per key. None if unusable."""
+        if master is None or master.empty or "CUSTOMER_NAME" not in master.columns:
+            return None
+        columns = [c for c in cls.COLUMNS if c in master.columns]
+        if not columns:
+            return None
+        keys = customer_key(master["CUSTOMER_NAME"].fillna(""))
+        keep = (keys != "").to_numpy() & ~keys.duplicated().to_numpy()
+        # Blank master cells count as missing, so the file's value is kept
+        values = {
+            col: np.array([_blank_to_none(v) for v in master[col].to_numpy(dtype=object)[keep]], dtype=object)
+            for col in columns
+        }
+        return cls(pd.Index(keys.to_numpy()[keep]), values)
+
+    def to_frame(self) -> pd.DataFrame:
+        """CUSTOMER_KEY plus one column per stored field (for persistence)."""
+        return pd.DataFrame({"CUSTOMER_KEY": self.keys.to_numpy(), **self.values})
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def fuzzy_index(self) -> FuzzyNameIndex:
+        if self._fuzzy_index is None:
+            self._fuzzy_index = FuzzyNameIndex(self.keys.to_numpy())
+        return self._fuzzy_index
+
+    def lookup(self, names: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """Row -> position in the index (-1 when the customer is not in the master), and whether it was a fuzzy hit."""
+        codes, uniques = pd.factorize(names)
+        if not len(uniques):
+            return np.full(len(names), -1, dtype=np.int64), np.zeros(len(names), dtype=bool)
+        ukeys = customer_key(pd.Series(uniques)).to_numpy()
+        found = self.keys.get_indexer(ukeys)
+        fuzzy = np.zeros(len(ukeys), dtype=bool)
+        missing = np.flatnonzero((found < 0) & (ukeys != ""))
+        if self.fuzzy and len(missing) and len(self.keys):
+            found[missing] = self.fuzzy_index().match_many(ukeys[missing])
+            fuzzy[missing] = found[missing] >= 0
+        safe = np.maximum(codes, 0)
+        return np.where(codes >= 0, found[safe], -1), (codes >= 0) & fuzzy[safe]
+
+    def positions(self, names: pd.Series) -> np.ndarray:
+        """Row -> position in the index (-1 when the customer is not in the master)."""
+        return self.lookup(names)[0]
+
+    def enrich(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Master STATE/CITY win over the file's values on an exact (normalized) name match; a fuzzy
+        match only fills values the file lacks (blank or placeholder), since STATE decides the tax split.
+        Customers not in the master keep theirs.
+        """
+        pos, fuzzy = self.lookup(df["CUSTOMER_NAME"])
+        hit = pos >= 0
+        if not hit.any():
+            return df
+        safe = np.maximum(pos, 0)
+        for col, stored in self.values.items():
+            master_values = stored[safe]
+            if col in df.columns:
+                current = df[col].to_numpy(dtype=object)
+                lacking = (pd.isna(df[col]) | _missing_state(df[col])).to_numpy()
+            else:
+                current = np.full(len(df), np.nan, dtype=object)
+                lacking = np.ones(len(df), dtype=bool)
+            use = hit & pd.notna(master_values) & (~fuzzy | lacking)
+            df[col] = np.where(use, master_values, current)
+        return df
+
+
+def merge_customer_master(df: pd.DataFrame, master) -> pd.DataFrame:
+    """Enrich STATE/CITY from the customer master (a CustomerIndex, or a standardized master frame)."""
+    if master is None or "CUSTOMER_NAME" not in df.columns or df.empty:
+        return df
+    if not isinstance(master, CustomerIndex):
+        master = CustomerIndex.from_frame(master)
+    return master.enrich(df) if master is not None and len(master) else df
+
+
+def ensure_geo(df: pd.DataFrame) -> pd.DataFrame:
+    """CITY and STATE columns always exist (placeholders when the file has neither)."""
+    if "CITY" not in df.columns:
+        df["CITY"] = CITY_PLACEHOLDER
+    if "STATE" not in df.columns:
+        df["STATE"] = STATE_PLACEHOLDER
+    return df
+
+
+def guess_state(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill missing/placeholder STATE from CITY_STATE_MAP (placeholder when the city is unknown too)."""
+    if df.empty or "STATE" not in df.columns:
+        return df
+    state = df["STATE"]
+    missing = state.isna().to_numpy() | _per_unique(state, lambda u: _missing_state(u).to_numpy(), False).astype(bool)
+    if not missing.any():
+        return df
+    if "CITY" in df.columns:
+        guessed = _per_unique(
+            df["CITY"], lambda u: u.astype(str).str.strip().str.upper().map(CITY_STATE_MAP).fillna(STATE_PLACEHOLDER).to_numpy(),
+            STATE_PLACEHOLDER,
+        )
+    else:
+        guessed = np.full(len(df), STATE_PLACEHOLDER, dtype=object)
+    df["STATE"] = np.where(missing, guessed, state.to_numpy(dtype=object))
+    return df
+
+
+def add_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """DATE parsed (unparseable -> NaT), plus FINANCIAL_YEAR and MONTH labels."""
+    if "DATE" not in df.columns:
+        return df
+    df["DATE"] = pd.to_datetime(df["DATE"], errors="coerce")
+    df["FINANCIAL_YEAR"] = fiscal_year(df["DATE"])
+    df["MONTH"] = month_label(df["DATE"])
+    return df
+
+
+class MaterialRules:
+    """
+    Material group mapping and exclusion rules compiled once. Mappings are checked with one
+    alternation regex (values no pattern touches skip the per-pattern pass, which keeps the
+    old in-order, last-match-wins semantics); exclusion keywords are one escaped alternation
+    searched in the normalized text. Evaluated per distinct value, never per row.
+    """
+
+    def __init__(self, mappings: Optional[Dict[str, str]] = None, exclude_keywords: Optional[Iterable[str]] = None):
+        mappings = MATERIAL_GROUP_MAPPINGS if mappings is None else mappings
+        keywords = list(EXCLUDE_KEYWORDS if exclude_keywords is None else exclude_keywords)
+        self.mappings = [(re.compile(p, re.IGNORECASE), r) for p, r in mappings.items()]
+        self._any_mapping = re.compile("|".join(f"(?:{p})" for p in mappings), re.IGNORECASE) if mappings else None
+        self._exclude = re.compile("|".join(re.escape(k) for k in keywords), re.IGNORECASE) if keywords else None
+
+    def map_value(self, value):
+        """Standard name for a material group (value unchanged when no pattern matches)."""
+        text = str(value)
+        if self._any_mapping is None or self._any_mapping.search(text) is None:
+            return value
+        for pattern, replacement in self.mappings:
+            if pattern.search(text):
+                value = text = replacement
+        return value
+
+    def excluded(self, value) -> bool:
+        """True when the (mapped) group contains an exclusion keyword, after NBSP/whitespace normalization."""
+        if self._exclude is None:
+            return False
+        text = _WHITESPACE.sub(" ", str(value)).strip()  # \s also matches NBSP
+        return self._exclude.search(text) is not None
+
+    def evaluate(self, values: pd.Series) -> Tuple[Optional[pd.Series], np.ndarray]:
+        """(mapped column, or None when nothing is renamed; boolean mask of rows to drop)."""
+        codes, uniques = pd.factorize(values)
+        uniques = list(uniques)
+        mapped = [self.map_value(u) for u in uniques]
+        changed = any(m is not u for m, u in zip(mapped, uniques))
+        excluded = np.fromiter((self.excluded(m) for m in mapped), dtype=bool, count=len(mapped))
+        new_values = None
+        if changed:
+            # Rebuilt from the mapped uniques by code (a take keeps the column's dtype, unlike mask())
+            try:
+                mapped_array = pd.array(mapped, dtype=values.dtype)
+            except (TypeError, ValueError):
+                mapped_array = pd.array(mapped, dtype=object)
+            new_values = pd.Series(mapped_array.take(codes, allow_fill=True), index=values.index, name=values.name)
+        drop = (codes >= 0) & excluded[np.maximum(codes, 0)] if excluded.any() else np.zeros(len(codes), dtype=bool)
+        return new_values, drop
+
+    def apply(self, df: pd.DataFrame, column: str) -> pd.DataFrame:
+        """Map df[column] and drop excluded rows; the rules run once per distinct value."""
+        new_values, drop = self.evaluate(df[column])
+        if new_values is not None:
+            df[column] = new_values
+        return df[~drop] if drop.any() else df
+
+
+DEFAULT_MATERIAL_RULES = MaterialRules()
+
+
+def apply_material_rules(df: pd.DataFrame, rules: Optional[MaterialRules] = None) -> pd.DataFrame:
+    """Rename material groups (MATERIAL_GROUP_MAPPINGS), then drop non-sales groups (EXCLUDE_KEYWORDS)."""
+    grp_col = material_group_column(df)
+    if df.empty or grp_col is None:
+        return df
+    return (rules or DEFAULT_MATERIAL_RULES).apply(df, grp_col)
+
+
+def calculate_taxes(df: pd.DataFrame) -> pd.DataFrame:
+    """IGST for other states, CGST + SGST within COMPANY_STATE (and unknown states); TAX and TOTALAMOUNT from AMOUNT."""
+    if df.empty or "AMOUNT" not in df.columns:
+        return df
+    df = df.drop(columns=[c for c in TAX_COLUMNS if c in df.columns])
+    if "STATE" in df.columns:
+        state = df["STATE"].fillna("Unknown")
+        intra = _per_unique(state, lambda u: u.astype(str).str.upper().str.strip().isin(INTRA_STATES).to_numpy(), True).astype(bool)
+    else:
+        intra = np.ones(len(df), dtype=bool)
+    amount = pd.to_numeric(df["AMOUNT"], errors="coerce").to_numpy(dtype="float64")
+    df["IGST"] = np.where(intra, 0.0, amount * TAX_RATE)
+    df["CGST"] = np.where(intra, amount * (TAX_RATE / 2), 0.0)
+    df["SGST"] = df["CGST"]
+    df["TAX"] = df["IGST"] + df["CGST"] + df["SGST"]
+    df["TOTALAMOUNT"] = amount + df["TAX"]
+    return df
+
+
+# ─── pipeline ───
+
+class Stage(NamedTuple):
+    name: str
+    fn: Callable[[pd.DataFrame], pd.DataFrame]
+    # Coarse step reported to on_step (upload job progress): "standardize", "enrich" or "tax"
+    step: str
+
+
+class Pipeline:
+    """Stages run in order; run() returns the frame and one stats dict per stage."""
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: List[Stage] = list(stages)
+
+    def run(self, df: pd.DataFrame, on_step: Optional[Callable[[str], None]] = None) -> Tuple[pd.DataFrame, List[dict]]:
+        stats, step = [], None
+        for stage in self.stages:
+            if on_step is not None and stage.step != step:
+                on_step(stage.step)
+            step = stage.step
+            rows_in = len(df)
+            started = time.perf_counter()
+            df = stage.fn(df)
+            stats.append({
+                "stage": stage.name,
+                "rows_in": rows_in,
+                "rows_out": len(df),
+                "seconds": round(time.perf_counter() - started, 4),
+            })
+        return df, stats
+
+    @property
+    def names(self) -> List[str]:
+        return [s.name for s in self.stages]
+
+
+def sales_pipeline(master=None) -> Pipeline:
+    """Parsed sales rows -> rows ready to insert. master: CustomerIndex or standardized master frame (STATE/CITY source)."""
+    stages = [
+        Stage("standardize", standardize, "standardize"),
+        Stage("coalesce_state", coalesce_state_region, "standardize"),
+    ]
+    if master is not None and not isinstance(master, CustomerIndex):
+        master = CustomerIndex.from_frame(master)
+    if master is not None:
+        stages.append(Stage("merge_master", lambda df: merge_customer_master(df, master), "enrich"))
+    stages += [
+        Stage("ensure_geo", ensure_geo, "enrich"),
+        Stage("guess_state", guess_state, "enrich"),
+        Stage("dates", add_dates, "enrich"),
+        Stage("material_rules", apply_material_rules, "enrich"),
+        Stage("taxes", calculate_taxes, "tax"),
+    ]
+    return Pipeline(stages)
+
+
+def summarize(stats: List[dict]) -> Dict[str, float]:
+    """Seconds per stage name (for logs and API responses)."""
+    return {s["stage"]: s["seconds"] for s in stats}
@@ -0,0 +1,123 @@
+"""
+Vectorized RFM (recency, frequency, monetary) engine.
+
+Customers are factorized once; last order date, distinct invoice count and revenue come
+from array reductions over the integer codes (no per-group Python lambdas). Scores are
+quantile cuts done with np.quantile + searchsorted, and segments are an np.select over
+the scores. Used by the backend /customers/rfm endpoint and the legacy Streamlit
+segmentation page, which only differ in segment labels.
+"""
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+def rfm_table(
+    df: pd.DataFrame,
+    reference_date: Optional[pd.Timestamp] = None,
+    customer_col: str = "CUSTOMER_NAME",
+    date_col: str = "DATE",
+    invoice_col: str = "INVOICE_NO",
+    amount_col: str = "AMOUNT",
+) -> pd.DataFrame:
+    """One row per customer: Recency (days before reference_date, default max DATE), Frequency (distinct invoices), Monetary."""
+    cols = [customer_col, "Recency", "Frequency", "Monetary"]
+    if df is None or df.empty or customer_col not in df.columns or date_col not in df.columns:
+        return pd.DataFrame(columns=cols)
+
+    codes, customers = pd.factorize(df[customer_col], sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+    n = len(customers)
+    if n == 0:
+        return pd.DataFrame(columns=cols)
+
+    dates = pd.to_datetime(df[date_col], errors="coerce").to_numpy(dtype="datetime64[ns]")[valid].view("int64")
+    last = np.full(n, np.iinfo(np.int64).min, dtype=np.int64)  # == NaT
+    np.maximum.at(last, codes, dates)
+    if reference_date is None:
+        ref = dates.max() if len(dates) else np.iinfo(np.int64).min
+    else:
+        ref = pd.Timestamp(reference_date).value
+    has_date = last != np.iinfo(np.int64).min
+    recency = np.full(n, np.nan)
+    if ref != np.iinfo(np.int64).min:
+        recency[has_date] = (ref - last[has_date]) // NS_PER_DAY
+
+    if invoice_col in df.columns:
+        inv_codes = pd.factorize(df[invoice_col])[0][valid]
+        has_inv = inv_codes >= 0
+        # Distinct (customer, invoice) pairs as one int64 key, then counted per customer
+        width = max(int(inv_codes.max()) + 1, 1)
+        pairs = np.unique(codes[has_inv].astype(np.int64) * width + inv_codes[has_inv])
+        frequency = np.bincount(pairs // width, minlength=n)
+    else:
+        frequency = np.bincount(codes, minlength=n)
+
+    if amount_col in df.columns:
+        amounts = pd.to_numeric(df[amount_col], errors="coerce").to_numpy(dtype="float64")[valid]
+        monetary = np.bincount(codes, weights=np.nan_to_num(amounts), minlength=n)
+    else:
+        monetary = np.zeros(n)
+
+    return pd.DataFrame({
+        customer_col: customers,
+        "Recency": recency if np.isnan(recency).any() else recency.astype(np.int64),
+        "Frequency": frequency.astype(np.int64),
+        "Monetary": monetary,
+    })
+
+
+def quantile_scores(values, q: int = 4, rank_first: bool = False, reverse: bool = False) -> np.ndarray:
+    """
+    Quantile bucket 1..q per value (same bins as pd.qcut, right-closed). Tied edges never
+    fail: values on a repeated edge land in the lowest bucket that contains them.
+    rank_first breaks ties by position first (like qcut on rank(method="first")).
+    reverse gives the lowest values the highest score (recency).
+    """
+    x = np.asarray(values, dtype="float64")
+    if rank_first:
+        x = pd.Series(x).rank(method="first").to_numpy()
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.int64)
+    finite = x[~np.isnan(x)]
+    if len(finite) == 0:
+        return np.ones(len(x), dtype=np.int64)
+    inner = np.quantile(finite, np.linspace(0, 1, q + 1)[1:-1])
+    scores = np.searchsorted(inner, x, side="left") + 1
+    scores = np.minimum(scores, q)
+    return (q + 1 - scores) if reverse else scores
+
+
+def score(rfm: pd.DataFrame, q: int = 4, rank_frequency: bool = False) -> pd.DataFrame:
+    """Add R/F/M quantile scores (1..q, higher is better) and their sum RFM_Score."""
+    rfm = rfm.copy()
+    rfm["Recency_Score"] = quantile_scores(rfm["Recency"], q, reverse=True)
+    rfm["Frequency_Score"] = quantile_scores(rfm["Frequency"], q, rank_first=rank_frequency)
+    rfm["Monetary_Score"] = quantile_scores(rfm["Monetary"], q)
+    rfm["RFM_Score"] = rfm["Recency_Score"] + rfm["Frequency_Score"] + rfm["Monetary_Score"]
+    return rfm
+
+
+def score_segments(rfm_score: pd.Series) -> np.ndarray:
+    """Backend labels from the summed score (3..12)."""
+    s = np.asarray(rfm_score)
+    return np.select(
+        [s >= 10, s >= 8, s >= 6, s >= 4],
+        ["Champions", "Loyal", "Potential", "At Risk"],
+        default="Lost",
+    )
+
+
+def account_segments(recency_score: Sequence[int], frequency_score: Sequence[int]) -> np.ndarray:
+    """Legacy app labels from recency and frequency quartiles (4 = most recent / most frequent)."""
+    r = np.asarray(recency_score)
+    f = np.asarray(frequency_score)
+    return np.select(
+        [r == 1, (r == 3) & (f >= 3), (r == 4) & (f == 3), (r == 4) & (f == 4)],
+        ["Inactive", "Retention Opportunities", "Consistent Buyers", "Strategic Accounts"],
+        default="Standard",
+    )
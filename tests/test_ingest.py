@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# shared/ lives at the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import ingest
+from shared.fuzzy import FuzzyNameIndex, core_name
+
+# Rows/sec the full sales pipeline (no customer master) must sustain; measured ~250k on one core
+MIN_ROWS_PER_SECOND = int(os.environ.get("INGEST_MIN_ROWS_PER_SECOND", "50000"))
+THROUGHPUT_ROWS = 200_000
+
+
+def _sales(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Date": pd.Timestamp("2022-01-01") + pd.to_timedelta(rng.integers(0, 1200, rows), unit="D"),
+        "Invoice No.": np.char.add("INV", np.arange(rows).astype(str)),
+        "Party Name": np.char.add("CUST ", rng.integers(0, 2000, rows).astype(str)),
+        "City": rng.choice(["MUMBAI", "PUNE", "DELHI", "SURAT", "NOWHERE"], rows),
+        "State": rng.choice(["MAHARASHTRA", "", "DELHI", "GUJARAT"], rows),
+        "Material Group": rng.choice(["CABLE TIE", "CONDUIT GLAND", "SERVICE", "LUGS"], rows),
+        "Amount": np.round(rng.random(rows) * 1000, 2),
+    })
+
+
+def test_fiscal_year_and_month_labels():
+    dates = pd.Series(pd.to_datetime(["2024-03-31", "2024-04-01", "2009-12-05", None]))
+    assert ingest.fiscal_year(dates).tolist() == ["FY23-24", "FY24-25", "FY9-10", "UNKNOWN"]
+    labels = ingest.month_label(dates)
+    assert labels[:3].tolist() == ["MAR-24", "APR-24", "DEC-09"]
+    assert pd.isna(labels[3])
+
+
+def test_guess_state_only_fills_missing():
+    df = pd.DataFrame({"CITY": [" pune", "MUMBAI", "NOWHERE", "DELHI"], "STATE": ["", "GUJARAT", None, "State Not Found"]})
+    out = ingest.guess_state(df)
+    assert out["STATE"].tolist() == ["MAHARASHTRA", "GUJARAT", ingest.STATE_PLACEHOLDER, "DELHI"]
+
+
+def test_pipeline_records_every_stage():
+    df, stats = ingest.sales_pipeline().run(_sales(1000))
+    assert [s["stage"] for s in stats] == ingest.sales_pipeline().names
+    assert stats[0]["rows_in"] == 1000
+    assert all(a["rows_out"] == b["rows_in"] for a, b in zip(stats, stats[1:]))
+    assert stats[-1]["rows_out"] == len(df)
+    # SERVICE rows are excluded, CONDUIT GLAND renamed, taxes added
+    assert not df["MATERIAL_GROUP"].str.contains("SERVICE").any()
+    assert "POLYAMIDE CONDUIT GLAND" in set(df["MATERIAL_GROUP"])
+    assert np.allclose(df["TOTALAMOUNT"], df["AMOUNT"] * (1 + ingest.TAX_RATE))
+
+
+def test_row_hashes_follow_content_not_position():
+    raw = _sales(100)
+    hashes = ingest.row_hashes(raw)
+    assert len(set(hashes)) == 100
+    assert (ingest.row_hashes(raw.iloc[::-1].reset_index(drop=True)) == hashes[::-1]).all()
+    edited = raw.copy()
+    edited.loc[5, "Amount"] += 1
+    assert (ingest.row_hashes(edited) != hashes).tolist() == [i == 5 for i in range(100)]
+    # Same values under another header are different rows
+    assert not np.isin(ingest.row_hashes(raw.rename(columns={"Amount": "Value"})), hashes).any()
+
+
+def test_merge_files_keeps_each_invoice_from_its_first_file():
+    a = pd.DataFrame({"INVOICE_NO": ["1", "1", "2"], "AMOUNT": [1, 2, 3]})
+    b = pd.DataFrame({"INVOICE_NO": ["2", "3", None], "AMOUNT": [4, 5, 6]})
+    merged, file_idx, dropped = ingest.merge_files([a, b])
+    assert merged["AMOUNT"].tolist() == [1, 2, 3, 5, 6]
+    assert file_idx.tolist() == [0, 0, 0, 1, 1]
+    assert dropped == [0, 1]
+
+
+def test_material_rules_match_per_row_passes():
+    """Compiled, per-distinct-value rules give the same result as one str.contains pass per rule over all rows."""
+    groups = pd.Series(
+        ["Conduit Gland", "REVERSE FORWORD", "rever", "AIR\u00a0 VENT", " raw  material", "CABLE TIE", None, "LUGS"] * 50,
+        name="MATERIAL_GROUP",
+    )
+    expected = groups.copy()
+    for pattern, replacement in ingest.MATERIAL_GROUP_MAPPINGS.items():
+        expected[expected.astype(str).str.contains(pattern, case=False, na=False)] = replacement
+    norm = expected.astype(str).str.replace("\u00a0", " ", regex=False).str.replace(r"\s+", " ", regex=True).str.strip()
+    excluded = pd.Series(False, index=expected.index)
+    for keyword in ingest.EXCLUDE_KEYWORDS:
+        excluded |= norm.str.contains(keyword, case=False, regex=False)
+
+    out = ingest.apply_material_rules(pd.DataFrame({"MATERIAL_GROUP": groups}))
+    assert out.index.tolist() == expected[~excluded].index.tolist()
+    assert out["MATERIAL_GROUP"].tolist() == expected[~excluded].tolist()
+    assert "POLYAMIDE CONDUIT GLAND" in set(out["MATERIAL_GROUP"])
+
+
+def test_customer_master_wins_without_duplicating_rows():
+    master = ingest.standardize(pd.DataFrame({
+        "Customer": ["CUST 1", "CUST 1"], "State": ["KARNATAKA", "KERALA"], "City": ["BANGALORE", "KOCHI"],
+    }))
+    sales = _sales(500)
+    df, stats = ingest.sales_pipeline(master).run(sales)
+    merge = next(s for s in stats if s["stage"] == "merge_master")
+    assert merge["rows_in"] == merge["rows_out"]
+    assert set(df.loc[df["CUSTOMER_NAME"] == "CUST 1", "STATE"]) <= {"KARNATAKA"}
+
+
+def test_customer_index_matches_normalized_names():
+    index = ingest.CustomerIndex.from_frame(pd.DataFrame({
+        "CUSTOMER_NAME": ["Acme  Corp.", "BETA LTD", ""], "STATE": ["KARNATAKA", " ", "GOA"], "CITY": ["BANGALORE", "DELHI", "PANJIM"],
+    }))
+    assert len(index) == 2
+    df = pd.DataFrame({"CUSTOMER_NAME": ["ACME CORP", "beta, ltd", "GAMMA", None], "STATE": ["X", "GUJARAT", "Y", "Z"]})
+    out = index.enrich(df)
+    # A blank master state keeps the file's value; CITY is added from the master
+    assert out["STATE"].tolist() == ["KARNATAKA", "GUJARAT", "Y", "Z"]
+    assert out["CITY"].tolist()[:2] == ["BANGALORE", "DELHI"]
+    assert pd.isna(out["CITY"][2])
+
+
+def test_fuzzy_customer_match():
+    master = pd.DataFrame({
+        "CUSTOMER_NAME": ["KN ELETTRO PRIVATE LIMITED", "SHREE GANESH ENTERPRISES", "BHARAT ELECTRONICS LTD",
+                          "PATEL SWITCHGEAR UNIT 1"],
+        "STATE": ["MAHARASHTRA", "GUJARAT", "KARNATAKA", "GUJARAT"],
+    })
+    index = ingest.CustomerIndex.from_frame(master)
+    names = ["K.N. ELETTRO PVT LTD", "M/S Shri Ganesh Ent.", "BHARAT ELECTRICALS", "ACME", "PATEL SWITCHGEAR UNIT 2"]
+    out = index.enrich(pd.DataFrame({"CUSTOMER_NAME": names}))
+    assert out["STATE"].tolist()[:2] == ["MAHARASHTRA", "GUJARAT"]
+    # Similar but different customers (incl. another branch/unit number) are not merged
+    assert out["STATE"][2:].isna().all()
+    exact_only = ingest.CustomerIndex(index.keys, index.values, fuzzy=False)
+    assert (exact_only.positions(pd.Series(names)) == -1).all()
+
+
+def test_fuzzy_match_only_fills_missing_state():
+    index = ingest.CustomerIndex.from_frame(pd.DataFrame({
+        "CUSTOMER_NAME": ["KN ELETTRO PRIVATE LIMITED"], "STATE": ["MAHARASHTRA"], "CITY": ["PUNE"],
+    }))
+    df = pd.DataFrame({
+        "CUSTOMER_NAME": ["K.N. ELETTRO PVT LTD", "K.N. ELETTRO PVT LTD", "KN ELETTRO PRIVATE LIMITED"],
+        "STATE": ["GUJARAT", ingest.STATE_PLACEHOLDER, "GUJARAT"],
+        "CITY": ["SURAT", None, "SURAT"],
+    })
+    out = index.enrich(df)
+    # Fuzzy: the file's state stays, blanks/placeholders are filled; exact: the master wins
+    assert out["STATE"].tolist() == ["GUJARAT", "MAHARASHTRA", "MAHARASHTRA"]
+    assert out["CITY"].tolist() == ["SURAT", "PUNE", "PUNE"]
+
+
+def test_fuzzy_index_blocks_and_caches():
+    names = [f"CUSTOMER {i} TRADERS PVT LTD" for i in range(20_000)] + ["KN ELETTRO PRIVATE LIMITED"]
+    fuzzy = FuzzyNameIndex(names)
+    assert core_name("K. N. Elettro Pvt. Ltd.") == core_name("KN ELETTRO PRIVATE LIMITED")
+    assert fuzzy.match("KN ELETTRO PVT. LTD")[0] == 20_000
+    assert fuzzy.match("CUSTOMR 1234 TRADERS")[0] == 1234
+    # Repeated names are answered from the cache
+    started = time.perf_counter()
+    for _ in range(1000):
+        fuzzy.match("CUSTOMR 1234 TRADERS")
+    assert fuzzy.cache_hits >= 1000
+    assert time.perf_counter() - started < 1.0
+
+
+def test_pipeline_throughput():
+    """Regression guard: row-wise apply() creeping back into a stage drops throughput by ~10x."""
+    raw = _sales(THROUGHPUT_ROWS)
+    pipe = ingest.sales_pipeline()
+    pipe.run(_sales(1000))  # warm-up
+    best = float("inf")
+    for _ in range(2):
+        started = time.perf_counter()
+        df, stats = pipe.run(raw.copy())
+        best = min(best, time.perf_counter() - started)
+    rate = THROUGHPUT_ROWS / best
+    slowest = max(stats, key=lambda s: s["seconds"])
+    assert rate >= MIN_ROWS_PER_SECOND, f"{rate:,.0f} rows/s; slowest stage {slowest['stage']} ({slowest['seconds']}s)"
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+
+# Cumulative `import main` budget (python -X importtime), in milliseconds
+IMPORT_BUDGET_MS = int(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "1000"))
+# Must not be imported until first use (data load, PDFs, exports, uploads)
+DEFERRED_MODULES = ["pandas", "numpy", "sqlalchemy", "psycopg2", "matplotlib", "fpdf", "pyarrow", "openpyxl"]
+
+
+def _import_main():
+    """Run `python -X importtime -c "import main"` in a fresh interpreter; return {module: cumulative_us}."""
+    env = {k: v for k, v in os.environ.items() if k != "DATABASE_URL"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@pytest.fixture(scope="module")
+def import_runs():
+    pytest.importorskip("fastapi")
+    return [_import_main() for _ in range(3)]
+
+
+def test_heavy_modules_are_deferred(import_runs):
+    """Importing the app must not pull in pandas, the DB driver or the report/export stacks."""
+    loaded = [m for m in DEFERRED_MODULES if m in import_runs[0]]
+    assert not loaded, f"imported at startup: {loaded}"
+
+
+def test_import_time_budget(import_runs):
+    """Best of three cold `import main` runs stays within the startup budget."""
+    best_ms = min(run["main"] for run in import_runs) / 1000
+    assert best_ms <= IMPORT_BUDGET_MS, f"import main took {best_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms)"